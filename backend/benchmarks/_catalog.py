@@ -0,0 +1,26 @@
+"""Helpers shared by the benchmark scripts"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILE = os.path.join(BACKEND_DIR, 'data', 'recipes.csv')
+
+# Cho phép chạy script trực tiếp: python benchmarks/<script>.py
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def synthetic_recipes(size: int, seed: int = 0) -> pd.DataFrame:
+    """Grow recipes.csv to `size` rows by cloning rows under unique names"""
+    base = pd.read_csv(DATA_FILE)
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(base), size=size)
+    df = base.iloc[picks].reset_index(drop=True)
+    df['recipe_name'] = [f"{name} {i}" for i, name in enumerate(df['recipe_name'])]
+    # Xáo trộn cột số để điểm gợi ý không bị trùng lặp hoàn toàn
+    df['cook_time'] = rng.integers(5, 240, size=size)
+    df['servings'] = rng.integers(1, 9, size=size)
+    return df
@@ -0,0 +1,71 @@
+"""Benchmark: a bulk question set sent as serial /chat calls vs one /chat/batch.
+
+Uses the offline fake model (services/fake_model.py), so no API quota is used.
+Messages repeat dishes, as menu-planning jobs do, so the batch can share
+tool calls. Caches are cleared before each run. Requires httpx.
+
+    python benchmarks/bench_chat_batch.py --messages 200 --latency 0.2
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import httpx
+
+from _catalog import BACKEND_DIR  # noqa: F401  (thêm backend vào sys.path)
+import main
+from services.fake_model import FakeModel
+
+TEMPLATES = [
+    "nguyên liệu {dish}",
+    "dinh dưỡng {dish}",
+    "thời gian nấu {dish}",
+    "cách nấu {dish}",
+    "món {dish} có ngon không?",
+]
+
+
+def question_set(size: int, dishes: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    names = rng.sample(list(main.cooking_tools.catalog.recipe_names), dishes)
+    return [rng.choice(TEMPLATES).format(dish=rng.choice(names)) for _ in range(size)]
+
+
+async def run(messages: list, batch: bool) -> float:
+    main.tool_cache.invalidate()
+    main.reply_cache.invalidate()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        start = time.perf_counter()
+        if batch:
+            response = await http.post("/chat/batch", json={"messages": messages})
+            assert response.status_code == 200, response.text
+        else:
+            for message in messages:
+                await http.post("/chat", json={"message": message})
+        return time.perf_counter() - start
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--dishes', type=int, default=20, help='distinct dishes in the question set')
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per fake model call')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    main.model = fake = FakeModel(args.latency, dishes=main.cooking_tools.catalog.recipe_names)
+    messages = question_set(args.messages, args.dishes)
+
+    print(f"{'mode':>8} {'seconds':>9} {'model calls':>12}")
+    for mode, batch in (("serial", False), ("batch", True)):
+        fake.calls = 0
+        elapsed = asyncio.run(run(messages, batch))
+        print(f"{mode:>8} {elapsed:>9.2f} {fake.calls:>12}")
+    print(f"(CHAT_BATCH_CONCURRENCY={main.CHAT_BATCH_CONCURRENCY})")
+
+
+if __name__ == '__main__':
+    main_cli()
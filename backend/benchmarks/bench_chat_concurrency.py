@@ -0,0 +1,86 @@
+"""Benchmark: /chat throughput under N concurrent clients with a fake model.
+
+The Gemini model is replaced by a fake whose calls take a configurable
+latency, so no API quota is used. With the async pipeline throughput should
+grow close to N x (1 / request latency); `--blocking` emulates the old
+synchronous generate_content call for comparison. Coalescing, the tool and
+reply caches and hedging are switched off (unless set in the environment) so
+every request makes its own model round-trips. Requires httpx.
+
+    python benchmarks/bench_chat_concurrency.py --latency 0.2 --clients 1 8 32
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import os
+import time
+
+import httpx
+
+from _catalog import BACKEND_DIR  # noqa: F401  (thêm backend vào sys.path)
+
+# Đo khả năng chạy đồng thời, không phải cache: mỗi request phải tự gọi model
+for name, value in (("COALESCE_ENABLED", "false"), ("TOOL_CACHE_SIZE", "0"),
+                    ("REPLY_CACHE_SIZE", "0"), ("LLM_HEDGE_QUANTILE", "0")):
+    os.environ.setdefault(name, value)
+import main  # noqa: E402
+from services.fake_model import FakeModel, FakeResponse
+
+
+class BlockingFakeModel(FakeModel):
+    """Fake model whose async call blocks the event loop, like the old synchronous client"""
+
+    async def generate_content_async(self, prompt: str, stream: bool = False) -> FakeResponse:
+        return self.generate_content(prompt)
+
+
+async def run_clients(clients: int, requests_per_client: int, message: str) -> dict:
+    transport = httpx.ASGITransport(app=main.app)
+    statuses = collections.Counter()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        async def client(client_id: int):
+            for i in range(requests_per_client):
+                response = await http.post("/chat", json={
+                    "message": message,
+                    "session_id": f"bench-{client_id}",
+                })
+                statuses[response.status_code] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(c) for c in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    total = clients * requests_per_client
+    return {"elapsed": elapsed, "throughput": total / elapsed, "statuses": dict(statuses)}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds per fake model call')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16, 32])
+    parser.add_argument('--requests', type=int, default=4, help='requests per client')
+    parser.add_argument('--blocking', action='store_true', help='emulate the old blocking model call')
+    parser.add_argument('--message', default='Phở bò nấu với những gì?',
+                        help='chat message (templated ones skip the analysis call)')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    model_class = BlockingFakeModel if args.blocking else FakeModel
+    main.model = fake = model_class(args.latency, dishes=main.cooking_tools.catalog.recipe_names)
+
+    # Số lượt gọi model cố định của một request không cache: trả lời (fast-path) hoặc phân tích + trả lời
+    round_trips = 1 if main.intent_router.route(args.message) is not None else 2
+    print(f"{'clients':>8} {'req/s':>8} {'ideal':>8} {'calls/req':>10} {'statuses':>20}")
+    for clients in args.clients:
+        fake.calls = 0
+        result = asyncio.run(run_clients(clients, args.requests, args.message))
+        ideal = min(clients, main.CHAT_MAX_CONCURRENCY) / (round_trips * args.latency)
+        calls_per_request = fake.calls / (clients * args.requests)
+        print(f"{clients:>8} {result['throughput']:>8.1f} {ideal:>8.1f} {calls_per_request:>10.2f} "
+              f"{str(result['statuses']):>20}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,60 @@
+"""Benchmark: a burst of concurrent questions about a few trending dishes.
+
+Sends --requests /chat calls at once, spread over --dishes dishes and two
+phrasings each, with the offline fake model. Prints model calls, latency and
+the per-stage coalescing counters; run with COALESCE_ENABLED=false to compare.
+
+    python benchmarks/bench_coalescing.py --requests 200 --dishes 3
+    COALESCE_ENABLED=false python benchmarks/bench_coalescing.py --requests 200 --dishes 3
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+
+from _catalog import BACKEND_DIR  # noqa: F401  (thêm backend vào sys.path)
+
+os.environ.setdefault("MODEL_BACKEND", "fake")
+os.environ.setdefault("FAKE_MODEL_LATENCY", "0.3")
+import main  # noqa: E402
+
+TEMPLATES = ["{dish} có ngon không?", "kể cho tôi về món {dish}"]
+
+
+async def run(messages: list) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        async def ask(message):
+            start = time.perf_counter()
+            response = await http.post("/chat", json={"message": message})
+            return response.status_code, (time.perf_counter() - start) * 1e3
+        return await asyncio.gather(*(ask(message) for message in messages))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--dishes', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    dishes = list(main.cooking_tools.catalog.recipe_names)[:args.dishes]
+    messages = [TEMPLATES[i % 2].format(dish=dishes[i // 2 % len(dishes)]) for i in range(args.requests)]
+
+    results = asyncio.run(run(messages))
+    latencies = sorted(ms for _, ms in results)
+    errors = sum(1 for status, _ in results if status != 200)
+    print(f"COALESCE_ENABLED={main.COALESCE_ENABLED}: {len(results)} requests, {errors} errors, "
+          f"{main.get_model().calls} model calls")
+    print(f"latency p50 {latencies[len(latencies) // 2]:.0f}ms, max {latencies[-1]:.0f}ms")
+    for stage, flight in main.flights.items():
+        stats = flight.stats()
+        print(f"{stage:>9}: {stats['leaders']} leaders, {stats['followers']} followers "
+              f"({stats['coalesced_ratio']:.0%} coalesced)")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,59 @@
+"""Benchmark: recipe data cold start, CSV parse vs memory-mapped snapshot.
+
+Each measurement runs in a fresh interpreter so import cost and peak RSS are
+those a new worker would see. Run from the backend directory:
+
+    python benchmarks/bench_cold_start.py --sizes 1000 100000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from _catalog import BACKEND_DIR, synthetic_recipes
+from tools.recipe_catalog import build_snapshot
+
+# VmHWM (Linux) là đỉnh RSS của chính tiến trình; ru_maxrss bị kế thừa từ tiến trình cha
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{setup}
+elapsed = (time.perf_counter() - start) * 1e3
+rss = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM')) / 1024
+print(f"{{elapsed:.1f}} {{rss:.1f}}")
+"""
+
+MODES = {
+    'pandas': "import pandas as pd\ndf = pd.read_csv(sys.argv[1])",
+    'csv': "from tools.recipe_catalog import RecipeCatalog\nc = RecipeCatalog.from_csv(sys.argv[1])",
+    'snapshot': "from tools.recipe_catalog import RecipeCatalog\nc = RecipeCatalog.load(sys.argv[1])",
+}
+
+
+def probe(setup: str, csv_path: str):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(setup=setup), csv_path],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return float(output[-2]), float(output[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'mode':>9} {'load ms':>9} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            csv_path = os.path.join(tmp, f'recipes_{size}.csv')
+            synthetic_recipes(size).to_csv(csv_path, index=False)
+            build_snapshot(csv_path)
+            for mode, setup in MODES.items():
+                elapsed, rss = probe(setup, csv_path)
+                print(f"{size:>8} {mode:>9} {elapsed:>9.1f} {rss:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
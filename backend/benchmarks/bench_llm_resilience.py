@@ -0,0 +1,70 @@
+"""Benchmark: tail latency of model calls with and without hedging, and failing fast in an outage.
+
+Drives the offline fake model through `LLMClient` with a heavy-tailed
+latency distribution and prints p50/p95/p99 and the extra upstream calls
+hedging costs. Then simulates an outage (every call fails) and compares how
+long requests take to fail with the circuit breaker and without it.
+
+    python benchmarks/bench_llm_resilience.py --requests 1000 --latency lognormal:0.4,0.8
+"""
+import argparse
+import asyncio
+import time
+
+from _catalog import BACKEND_DIR  # noqa: F401  (thêm backend vào sys.path)
+from services.fake_model import FakeModel
+from services.llm_client import CircuitBreaker, LLMClient
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def drive(client: LLMClient, model: FakeModel, requests: int, concurrency: int):
+    """Send distinct prompts through the client; return per-call latencies and failure count"""
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(i: int) -> float:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.call("final", lambda: model.generate_content_async(f"User query: câu hỏi {i}"))
+            except Exception:
+                failures += 1
+            return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', default='lognormal:0.4,0.8', help='fake model latency distribution')
+    parser.add_argument('--outage-requests', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'mode':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'upstream calls':>15}")
+    for mode, quantile in (("no hedging", None), ("hedged p95", 0.95)):
+        model = FakeModel(args.latency, seed=1)
+        client = LLMClient(deadline=30, hedge_quantile=quantile)
+        latencies, _ = asyncio.run(drive(client, model, args.requests, args.concurrency))
+        print(f"{mode:>12} {percentile(latencies, 0.5) * 1e3:>8.0f} {percentile(latencies, 0.95) * 1e3:>8.0f} "
+              f"{percentile(latencies, 0.99) * 1e3:>8.0f} {max(latencies) * 1e3:>8.0f} {model.calls:>15}")
+
+    print(f"\nOutage ({args.outage_requests} requests, every upstream call fails after the usual latency):")
+    print(f"{'mode':>12} {'p50 ms':>8} {'p99 ms':>8} {'upstream calls':>15}")
+    for mode, threshold in (("no breaker", 10 ** 9), ("breaker", 5)):
+        model = FakeModel(args.latency, error_rate=1.0, seed=1)
+        client = LLMClient(deadline=30, breaker=CircuitBreaker(failure_threshold=threshold))
+        latencies, _ = asyncio.run(drive(client, model, args.outage_requests, args.concurrency))
+        print(f"{mode:>12} {percentile(latencies, 0.5) * 1e3:>8.0f} {percentile(latencies, 0.99) * 1e3:>8.0f} "
+              f"{model.calls:>15}")
+
+
+if __name__ == '__main__':
+    main_cli()
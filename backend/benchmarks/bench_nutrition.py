@@ -0,0 +1,67 @@
+"""Micro-benchmark: nutrition constraint search and meal totals as the catalogue grows.
+
+Compares re-parsing the 'calories:450;protein:35g;...' strings on every
+query (the old per-request parsing) with `NutritionTable`, which masks and
+sums the matrix parsed at load. Run from the backend directory:
+
+    python benchmarks/bench_nutrition.py
+"""
+import argparse
+import time
+
+import numpy as np
+
+from _catalog import synthetic_recipes
+from tools.nutrition import NutritionTable, parse_constraints
+from tools.recipe_catalog import RecipeCatalog
+
+QUERIES = ["calories<500, protein>=30", "calo<=300", "carbs:40-60, fat<20", "protein>40, sort:-calories"]
+MENU_SIZE = 20
+
+
+def parse_each(text: str) -> dict:
+    return {key: float(value.rstrip('g')) for key, value in (item.split(':') for item in text.split(';'))}
+
+
+def string_search(column, ranges, k: int = 5):
+    """The per-row approach: parse every nutrition string and test the ranges"""
+    matches = []
+    for position, text in enumerate(column):
+        values = parse_each(text)
+        if all(low <= values.get(name, float('nan')) <= high for name, (low, high) in ranges.items()):
+            matches.append(position)
+    return matches[:k], len(matches)
+
+
+def time_ms(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    queries = [parse_constraints(query) for query in QUERIES]
+    print(f"{'rows':>10} {'strings ms':>11} {'search ms':>10} {'meal ms':>8}")
+    for size in args.sizes:
+        df = synthetic_recipes(size)
+        table = NutritionTable.from_catalog(RecipeCatalog.from_dataframe(df))
+        column = df['nutrition'].tolist()
+        menu = [(int(position), 2) for position in np.random.default_rng(0).integers(0, size, MENU_SIZE)]
+
+        # Cách cũ chỉ đo một lượt: ở 1M dòng mỗi truy vấn mất vài giây
+        strings_ms = time_ms(lambda: [string_search(column, ranges) for ranges, _ in queries], 1) / len(queries)
+        search_ms = time_ms(
+            lambda: [table.search(ranges, 5, options.get('sort')) for ranges, options in queries], args.repeat
+        ) / len(queries)
+        meal_ms = time_ms(lambda: table.meal(menu), args.repeat)
+        print(f"{size:>10} {strings_ms:>11.1f} {search_ms:>10.2f} {meal_ms:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
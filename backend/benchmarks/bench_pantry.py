@@ -0,0 +1,59 @@
+"""Micro-benchmark: "what can I cook with these" ranking as the catalogue grows.
+
+Compares a substring scan over the raw ingredient strings (the old
+`str.contains` search, once per pantry item) with
+`IngredientIndex.match_pantry`. Run from the backend directory:
+
+    python benchmarks/bench_pantry.py
+"""
+import argparse
+import time
+
+from _catalog import synthetic_recipes
+from tools.ingredient_index import IngredientIndex
+from tools.recipe_catalog import RecipeCatalog
+
+PANTRIES = [
+    ['trứng', 'cà chua', 'thịt heo'],
+    ['cá lóc'],
+    ['nước mắm', 'ớt', 'tỏi', 'tiêu', 'hành'],
+    ['eggs', 'tomatoes', 'onion'],
+]
+
+
+def time_per_call(func, pantries, repeat: int) -> float:
+    """Return the mean wall time of func(pantry) in microseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for pantry in pantries:
+            func(pantry)
+    return (time.perf_counter() - start) / (repeat * len(pantries)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'build ms':>10} {'scan us':>12} {'index us':>10}")
+    for size in args.sizes:
+        df = synthetic_recipes(size)
+        catalog = RecipeCatalog.from_dataframe(df)
+
+        start = time.perf_counter()
+        index = IngredientIndex(catalog)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        def scan(pantry):
+            column = df['ingredients'].str.lower()
+            matched = sum(column.str.contains(item, regex=False).astype(int) for item in pantry)
+            return matched.nlargest(5)
+
+        scan_us = time_per_call(scan, PANTRIES, 1)
+        index_us = time_per_call(index.match_pantry, PANTRIES, args.repeat)
+        print(f"{size:>10} {build_ms:>10.1f} {scan_us:>12.1f} {index_us:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
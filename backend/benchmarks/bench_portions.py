@@ -0,0 +1,63 @@
+"""Micro-benchmark: scaling a catering menu to many servings.
+
+Compares the old approach (a regex over every ingredient string of every
+dish, then merging lines in a dict) with `QuantityTable.shopping_list`,
+which gathers, scales and sums the pre-parsed quantity arrays at once.
+Run from the backend directory:
+
+    python benchmarks/bench_portions.py
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+
+from _catalog import synthetic_recipes
+from tools.quantities import QuantityTable
+from tools.recipe_catalog import RecipeCatalog
+
+
+def regex_shopping_list(catalog: RecipeCatalog, menu):
+    """The per-string approach: parse and scale each ingredient on every call"""
+    totals = {}
+    for position, servings in menu:
+        multiplier = servings / max(int(catalog.servings[position]), 1)
+        for ingredient in catalog.ingredients[position]:
+            name, _, quantity = ingredient.partition(':')
+            match = re.search(r'(\d+\.?\d*)\s*(.*)', quantity)
+            if match:
+                key = (name.strip().lower(), match.group(2).strip())
+                totals[key] = totals.get(key, 0.0) + float(match.group(1)) * multiplier
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100_000, help='recipes in the catalogue')
+    parser.add_argument('--menus', type=int, nargs='+', default=[1, 10, 100, 1_000, 10_000])
+    parser.add_argument('--servings', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    catalog = RecipeCatalog.from_dataframe(synthetic_recipes(args.size))
+    start = time.perf_counter()
+    table = QuantityTable(catalog)
+    print(f"{args.size} recipes, {len(table)} ingredient rows parsed in "
+          f"{(time.perf_counter() - start) * 1e3:.0f}ms")
+
+    rng = np.random.default_rng(0)
+    print(f"{'dishes':>8} {'regex ms':>10} {'arrays ms':>10} {'speedup':>8}")
+    for dishes in args.menus:
+        menu = [(int(position), args.servings) for position in rng.integers(0, len(catalog), size=dishes)]
+        timings = []
+        for func in (lambda: regex_shopping_list(catalog, menu), lambda: table.shopping_list(menu)):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                func()
+            timings.append((time.perf_counter() - start) / args.repeat * 1e3)
+        print(f"{dishes:>8} {timings[0]:>10.2f} {timings[1]:>10.2f} {timings[0] / timings[1]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
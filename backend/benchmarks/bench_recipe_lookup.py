@@ -0,0 +1,59 @@
+"""Micro-benchmark: recipe-name lookup cost as the catalogue grows.
+
+Compares the old full-column scan (`str.lower() == query`) with
+`RecipeIndex.lookup`, and times `NameMatcher.search` on misspelled names
+(one character dropped). Run from the backend directory:
+
+    python benchmarks/bench_recipe_lookup.py
+"""
+import argparse
+import random
+import time
+
+from _catalog import synthetic_recipes
+from tools.recipe_catalog import RecipeCatalog
+from tools.name_matcher import NameMatcher
+from tools.recipe_index import RecipeIndex
+
+
+def time_per_call(func, queries) -> float:
+    """Return the mean wall time of func(query) in microseconds"""
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'build ms':>10} {'scan us':>12} {'index us':>10} {'fuzzy build ms':>15} {'fuzzy us':>10}")
+    for size in args.sizes:
+        df = synthetic_recipes(size)
+        names = df['recipe_name'].tolist()
+        queries = [random.choice(names).upper() for _ in range(args.queries)]
+        typos = [query[:i] + query[i + 1:] for query in queries for i in [random.randrange(len(query))]]
+
+        catalog = RecipeCatalog.from_dataframe(df)
+        start = time.perf_counter()
+        index = RecipeIndex(catalog)
+        build_ms = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        matcher = NameMatcher(catalog)
+        fuzzy_build_ms = (time.perf_counter() - start) * 1e3
+
+        def scan(query):
+            matches = df[df['recipe_name'].str.lower() == query.lower()]
+            return None if matches.empty else matches.iloc[0]
+
+        scan_us = time_per_call(scan, queries[:20])
+        index_us = time_per_call(index.lookup, queries)
+        fuzzy_us = time_per_call(matcher.search, typos)
+        print(f"{size:>10} {build_ms:>10.1f} {scan_us:>12.1f} {index_us:>10.2f} {fuzzy_build_ms:>15.1f} {fuzzy_us:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark: recipe_recommender scoring, legacy row loop vs vectorized top-k.
+
+The legacy path reproduces the old `iterrows` loop (per-row scaler call,
+per-row difficulty map, score column written into the DataFrame). Run from
+the backend directory:
+
+    python benchmarks/bench_recommender.py
+    python benchmarks/bench_recommender.py --sizes 100 10000 --legacy-limit 10000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from _catalog import synthetic_recipes
+from tools.recipe_catalog import RecipeCatalog
+from tools.recommender import RecipeRecommender
+
+PREFERENCES = {'time': 45.0, 'difficulty': 'medium', 'servings': 4}
+
+
+def legacy_top5(df, prefs):
+    """Old CookingTools.recipe_recommender scoring loop"""
+    low, high = df['cook_time'].min(), df['cook_time'].max()
+    df['normalized_time'] = (df['cook_time'] - low) / ((high - low) or 1)
+    scores = []
+    for _, recipe in df.iterrows():
+        score = 0
+        normalized_desired_time = (np.array([[prefs['time']]]) - low) / ((high - low) or 1)
+        score += 1 - abs(recipe['normalized_time'] - normalized_desired_time[0][0])
+        difficulty_map = {'easy': 1, 'medium': 2, 'hard': 3}
+        if prefs['difficulty'] in difficulty_map and recipe['difficulty'].lower() == prefs['difficulty']:
+            score += 1
+        if recipe['servings'] == prefs['servings']:
+            score += 1
+        elif abs(recipe['servings'] - prefs['servings']) <= 2:
+            score += 0.5
+        scores.append(score)
+    df['match_score'] = scores
+    return df.nlargest(5, 'match_score').index.to_numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10_000, 1_000_000])
+    parser.add_argument('--legacy-limit', type=int, default=1_000_000,
+                        help='skip the legacy loop above this many rows')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy ms':>12} {'vector ms':>10} {'speedup':>9} {'same top5':>10}")
+    for size in args.sizes:
+        df = synthetic_recipes(size)
+        engine = RecipeRecommender.from_catalog(RecipeCatalog.from_dataframe(df))
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            top = engine.top_k(5, **PREFERENCES)
+        vector_ms = (time.perf_counter() - start) / args.repeat * 1e3
+
+        if size > args.legacy_limit:
+            print(f"{size:>10} {'skipped':>12} {vector_ms:>10.2f} {'-':>9} {'-':>10}")
+            continue
+
+        start = time.perf_counter()
+        legacy = legacy_top5(df.copy(), PREFERENCES)
+        legacy_ms = (time.perf_counter() - start) * 1e3
+        same = bool(np.array_equal(legacy, top))
+        print(f"{size:>10} {legacy_ms:>12.1f} {vector_ms:>10.2f} {legacy_ms / vector_ms:>8.0f}x {str(same):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark: /chat latency while the recipe catalogue is reloaded.
+
+Points the app at a synthetic recipes.csv, sends routed queries (no model
+latency) from several clients, and rewrites the file halfway through so
+/admin/catalog/reload rebuilds it. Reports latency before and during the
+rebuild, which runs in a worker thread.
+
+    python benchmarks/bench_reload.py --recipes 100000 --clients 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+from _catalog import synthetic_recipes  # thêm backend vào sys.path
+
+os.environ.setdefault("MODEL_BACKEND", "fake")
+os.environ.setdefault("FAKE_MODEL_LATENCY", "0")
+import main  # noqa: E402
+
+
+def percentile_ms(values: list, q: float) -> float:
+    return values[min(int(len(values) * q / 100), len(values) - 1)]
+
+
+async def run(args, csv_path: str, df) -> None:
+    transport = httpx.ASGITransport(app=main.app)
+    samples = []
+    stop = asyncio.Event()
+    reload_window = []
+
+    async def client(http, worker):
+        i = worker
+        while not stop.is_set():
+            name = df['recipe_name'][i % len(df)]
+            start = time.perf_counter()
+            response = await http.post("/chat", json={"message": f"nguyên liệu {name}"})
+            samples.append((start, (time.perf_counter() - start) * 1e3, response.status_code))
+            i += args.clients
+
+    async def reloader(http):
+        await asyncio.sleep(args.seconds / 2)
+        df.loc[0, 'cook_time'] = int(df['cook_time'][0]) + 1
+        df.to_csv(csv_path, index=False)
+        start = time.perf_counter()
+        response = await http.post("/admin/catalog/reload")
+        reload_window.extend([start, time.perf_counter()])
+        print(f"reload: {response.json()['last_reload_ms']:.0f}ms, version {response.json()['version']}")
+        await asyncio.sleep(args.seconds / 2)
+        stop.set()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        await asyncio.gather(reloader(http), *(client(http, w) for w in range(args.clients)))
+
+    begin, end = reload_window
+    windows = {
+        "before": [ms for t, ms, _ in samples if t < begin],
+        "during": [ms for t, ms, _ in samples if begin <= t < end],
+        "after": [ms for t, ms, _ in samples if t >= end],
+    }
+    errors = sum(1 for _, _, status in samples if status != 200)
+    print(f"{'window':>8} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, values in windows.items():
+        values.sort()
+        if values:
+            print(f"{name:>8} {len(values):>9} {percentile_ms(values, 50):>8.1f} "
+                  f"{percentile_ms(values, 99):>8.1f} {values[-1]:>8.1f}")
+    print(f"errors: {errors}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=100_000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'recipes.csv')
+        df = synthetic_recipes(args.recipes)
+        df.to_csv(csv_path, index=False)
+        main.cooking_tools.data_file = csv_path
+        main.cooking_tools.reload(force=True)
+        asyncio.run(run(args, csv_path, df))
+
+
+if __name__ == '__main__':
+    main_cli()
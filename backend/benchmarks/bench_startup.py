@@ -0,0 +1,108 @@
+"""Benchmark: worker startup, import time and time-to-first-response.
+
+Import cost comes from `python -X importtime -c "import main"` in a fresh
+interpreter. Time-to-first-response starts uvicorn and polls GET /stats until
+it answers. Thresholds make the script exit non-zero on a regression:
+
+    python benchmarks/bench_startup.py --runs 5 --max-import-ms 1000 --max-ttfr-ms 2000
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from _catalog import BACKEND_DIR
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def import_times() -> dict:
+    """Cumulative import time (ms) of main and of each module it imports directly"""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stderr
+
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Mỗi cấp import lồng nhau thụt thêm 2 khoảng trắng
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            times[name.strip()] = times.get(name.strip(), 0) + int(cumulative) / 1e3
+    return times
+
+
+def time_to_first_response(timeout: float) -> tuple:
+    """Start uvicorn and return (ms until /stats answers, startup stats it reports)"""
+    port = free_port()
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/stats', timeout=1) as response:
+                    body = json.load(response)
+                return (time.perf_counter() - start) * 1e3, body.get('startup', {})
+            except (urllib.error.URLError, ConnectionError):
+                if server.poll() is not None:
+                    raise RuntimeError('uvicorn exited before answering')
+                time.sleep(0.01)
+        raise RuntimeError(f'no response within {timeout}s')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='heaviest direct imports to list')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--max-import-ms', type=float, help='fail if import main is slower')
+    parser.add_argument('--max-ttfr-ms', type=float, help='fail if time-to-first-response is slower')
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    import_ms = statistics.median(run['main'] for run in runs)
+    modules = {name: statistics.median(run.get(name, 0) for run in runs) for name in runs[0]}
+
+    print(f"import main (median of {args.runs}): {import_ms:.0f} ms")
+    for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {ms:>8.1f} ms  {name}")
+
+    ttfr = [time_to_first_response(args.timeout) for _ in range(args.runs)]
+    ttfr_ms = statistics.median(ms for ms, _ in ttfr)
+    print(f"time to first response (median of {args.runs}): {ttfr_ms:.0f} ms")
+    phases = ttfr[-1][1]
+    if phases:
+        print(f"  startup phases: {phases.get('phases_ms')} ready {phases.get('ready_ms')} ms")
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"❌ import time {import_ms:.0f} ms exceeds {args.max_import_ms:.0f} ms")
+        failed = True
+    if args.max_ttfr_ms is not None and ttfr_ms > args.max_ttfr_ms:
+        print(f"❌ time to first response {ttfr_ms:.0f} ms exceeds {args.max_ttfr_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark: memory per worker and throughput as the worker count grows.
+
+For each worker count, starts the server as a separate process group with
+the fake model and the SQLite session store, drives it with the loadtest
+query mix, and reads RSS and PSS of every worker from /proc (Linux only).
+PSS splits shared pages between the processes that map them, so it shows
+what the pre-fork launcher (serve.py) saves compared with
+`uvicorn --workers`, where every worker loads the data itself.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --launcher serve uvicorn
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from _catalog import BACKEND_DIR
+from loadtest import build_queries, drive
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """Rss and Pss of a process from /proc/<pid>/smaps_rollup"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def workers_of(pid: int) -> List[int]:
+    """Worker processes under a launcher, skipping multiprocessing helpers
+
+    With one worker uvicorn serves from the launcher process itself.
+    """
+    result = []
+    for child in os.popen(f"ps -o pid= --ppid {pid}").read().split():
+        with open(f"/proc/{child}/cmdline", "rb") as f:
+            cmdline = f.read().replace(b"\0", b" ")
+        if b"resource_tracker" not in cmdline:
+            result.append(int(child))
+    return result or [pid]
+
+
+def start(launcher: str, workers: int, port: int, env: dict) -> subprocess.Popen:
+    if launcher == "serve":
+        cmd = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers),
+               "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+async def wait_ready(url: str, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/stats")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+async def measure(url: str, queries: List[dict], concurrency: int) -> float:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+        await drive(client, queries[:concurrency], concurrency)  # khởi động
+        samples, duration = await drive(client, queries, concurrency)
+    return len(samples) / duration
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--launcher', nargs='+', choices=['serve', 'uvicorn'], default=['serve', 'uvicorn'])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', default='fixed:0.02', help='fake model latency')
+    parser.add_argument('--port', type=int, default=8790)
+    args = parser.parse_args()
+
+    queries = build_queries(args.requests, seed=0, sessions=100)
+    print(f"{'launcher':>8} {'workers':>8} {'req/s':>8} {'RSS MB/worker':>14} {'PSS MB/worker':>14} {'PSS MB total':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for launcher in args.launcher:
+            for workers in args.workers:
+                env = dict(os.environ, MODEL_BACKEND="fake", FAKE_MODEL_LATENCY=args.latency,
+                           SESSION_BACKEND="sqlite", SESSION_DB_PATH=os.path.join(tmp, f"{launcher}-{workers}.db"))
+                url = f"http://127.0.0.1:{args.port}"
+                server = start(launcher, workers, args.port, env)
+                try:
+                    asyncio.run(wait_ready(url))
+                    throughput = asyncio.run(measure(url, queries, args.concurrency))
+                    memory = [memory_kb(pid) for pid in workers_of(server.pid)]
+                finally:
+                    os.killpg(server.pid, signal.SIGTERM)
+                    server.wait()
+                rss = sum(m["Rss"] for m in memory) / len(memory) / 1024
+                pss = sum(m["Pss"] for m in memory) / 1024
+                print(f"{launcher:>8} {workers:>8} {throughput:>8.1f} {rss:>14.1f} {pss / len(memory):>14.1f} {pss:>13.1f}")
+
+
+if __name__ == '__main__':
+    main_cli()
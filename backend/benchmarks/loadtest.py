@@ -0,0 +1,231 @@
+"""Load test: drive /chat with a realistic query mix and record latency percentiles.
+
+Runs in-process by default with MODEL_BACKEND=fake, so no Gemini quota is
+used and results do not depend on the network. --url targets a running
+server instead (start it with MODEL_BACKEND=fake for reproducible numbers).
+Queries are built from recipes.csv with a fixed seed. Results are written as
+JSON that can be diffed between versions:
+
+    python benchmarks/loadtest.py --requests 500 --concurrency 32 --out benchmarks/results/base.json
+    python benchmarks/loadtest.py --requests 500 --concurrency 32 --compare benchmarks/results/base.json
+
+--pipeline functions runs the native function-calling flow instead of the
+analysis + final prompt pair, so both can be compared on the same queries.
+"""
+import argparse
+import asyncio
+import collections
+import csv
+import json
+import logging
+import os
+import random
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from _catalog import BACKEND_DIR, DATA_FILE
+
+# (loại câu hỏi, trọng số, các mẫu câu); {dish} là tên món, {items} là vài nguyên liệu
+QUERY_MIX = [
+    ("recipe", 20, ["cách nấu {dish}", "how to make {dish}", "tôi muốn nấu {dish}"]),
+    ("ingredients", 15, ["nguyên liệu {dish}", "ingredients for {dish}"]),
+    ("nutrition", 10, ["dinh dưỡng {dish}", "{dish} bao nhiêu calo"]),
+    ("timer", 5, ["thời gian nấu {dish}", "how long to cook {dish}"]),
+    ("freeform", 20, ["{dish} có ngon không?", "hôm nay mình thèm {dish} quá", "kể cho tôi về món {dish}"]),
+    ("compound", 10, ["cho mình nguyên liệu và dinh dưỡng của {dish} nhé", "{dish} nấu bao lâu, cần nguyên liệu gì"]),
+    ("pantry", 10, ["tôi có {items} thì nấu gì", "nhà còn có {items}, nấu món gì được"]),
+    ("recommend", 5, ["gợi ý món nấu nhanh cho 4 người", "nên ăn gì tối nay, tầm 30 phút"]),
+    ("unknown", 5, ["cách nấu bánh quy sô cô la", "công thức pizza hải sản phô mai"]),
+]
+
+
+def load_recipes(path: str) -> Tuple[List[str], List[str]]:
+    """Dish names and distinct ingredient names from recipes.csv"""
+    dishes, ingredients = [], set()
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            dishes.append(row['recipe_name'])
+            ingredients.update(item.split(':')[0].strip() for item in row['ingredients'].split(';'))
+    return dishes, sorted(ingredients)
+
+
+def build_queries(count: int, seed: int, sessions: int, path: str = DATA_FILE) -> List[dict]:
+    """Deterministic list of (kind, message, session_id) requests"""
+    rng = random.Random(seed)
+    dishes, ingredients = load_recipes(path)
+    kinds = [kind for kind, _, _ in QUERY_MIX]
+    weights = [weight for _, weight, _ in QUERY_MIX]
+    templates = {kind: options for kind, _, options in QUERY_MIX}
+
+    queries = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        message = rng.choice(templates[kind]).format(
+            dish=rng.choice(dishes),
+            items=", ".join(rng.sample(ingredients, 3)),
+        )
+        queries.append({"kind": kind, "message": message, "session_id": f"load-{rng.randrange(sessions)}"})
+    return queries
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(samples: List[Tuple[str, int, float]], duration: float) -> dict:
+    def stats(rows):
+        latencies = sorted(latency for _, _, latency in rows)
+        errors = sum(1 for _, status, _ in rows if status != 200)
+        return {
+            "requests": len(rows),
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 1),
+                "p95": round(percentile(latencies, 95), 1),
+                "p99": round(percentile(latencies, 99), 1),
+                "mean": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+                "max": round(latencies[-1], 1) if latencies else 0.0,
+            },
+        }
+
+    by_kind = collections.defaultdict(list)
+    for sample in samples:
+        by_kind[sample[0]].append(sample)
+    summary = stats(samples)
+    summary["duration_s"] = round(duration, 3)
+    summary["throughput_rps"] = round(len(samples) / duration, 2) if duration else 0.0
+    summary["statuses"] = dict(sorted(collections.Counter(str(status) for _, status, _ in samples).items()))
+    return {"summary": summary, "by_kind": {kind: stats(rows) for kind, rows in sorted(by_kind.items())}}
+
+
+async def drive(client: httpx.AsyncClient, queries: List[dict], concurrency: int) -> Tuple[list, float]:
+    """Closed loop: `concurrency` clients send the queries back to back"""
+    samples = []
+    pending = iter(queries)
+
+    async def worker():
+        for query in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={
+                    "message": query["message"], "session_id": query["session_id"],
+                })
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            samples.append((query["kind"], status, (time.perf_counter() - start) * 1e3))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: dict, new: dict) -> None:
+    """Print headline metrics of two result files side by side"""
+    rows = [("throughput_rps", old["summary"]["throughput_rps"], new["summary"]["throughput_rps"]),
+            ("error_rate", old["summary"]["error_rate"], new["summary"]["error_rate"])]
+    rows += [(f"latency {name} ms", old["summary"]["latency_ms"][name], new["summary"]["latency_ms"][name])
+             for name in ("p50", "p95", "p99")]
+    print(f"\n{'metric':<18} {'old':>10} {'new':>10} {'change':>9}")
+    for name, before, after in rows:
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "-"
+        print(f"{name:<18} {before:>10} {after:>10} {change:>9}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--sessions', type=int, default=50, help='distinct session ids')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', default='lognormal:0.4,0.5',
+                        help='fake model latency distribution (in-process mode)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fake model failure rate (in-process mode)')
+    parser.add_argument('--pipeline', choices=['prompt', 'functions'], default='prompt',
+                        help='CHAT_PIPELINE of the in-process app')
+    parser.add_argument('--url', help='target a running server instead of the in-process app')
+    parser.add_argument('--out', default=os.path.join(BACKEND_DIR, 'benchmarks', 'results', 'loadtest.json'))
+    parser.add_argument('--compare', help='previous result file to compare against')
+    args = parser.parse_args()
+
+    queries = build_queries(args.requests, args.seed, args.sessions)
+    config: Dict[str, object] = {
+        "requests": args.requests, "concurrency": args.concurrency,
+        "sessions": args.sessions, "seed": args.seed, "git": git_revision(),
+    }
+
+    if args.url:
+        config["target"] = args.url
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+        app = None
+    else:
+        # Phải đặt trước khi import main
+        os.environ["MODEL_BACKEND"] = "fake"
+        os.environ["FAKE_MODEL_LATENCY"] = args.latency
+        os.environ["FAKE_MODEL_ERROR_RATE"] = str(args.error_rate)
+        os.environ["FAKE_MODEL_SEED"] = str(args.seed)
+        os.environ["CHAT_PIPELINE"] = args.pipeline
+        import main as app
+        logging.getLogger().setLevel(logging.WARNING)
+        config["target"] = "in-process"
+        config["fake_model"] = {"latency": args.latency, "error_rate": args.error_rate}
+        config["pipeline"] = args.pipeline
+        config["limits"] = {
+            "chat_max_concurrency": app.CHAT_MAX_CONCURRENCY,
+            "tool_cache_size": app.TOOL_CACHE_SIZE,
+            "reply_cache_size": app.REPLY_CACHE_SIZE,
+        }
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app),
+                                   base_url="http://loadtest", timeout=None)
+
+    async def run():
+        async with client:
+            return await drive(client, queries, args.concurrency)
+
+    samples, duration = asyncio.run(run())
+    result = {"config": config, **summarize(samples, duration)}
+    if app is not None:
+        result["model_calls"] = app.get_model().calls
+        result["router"] = {"hit_rate": round(app.intent_router.stats()["hit_rate"], 4)}
+        # Token ước lượng (prompt/completion) trên mọi lời gọi model
+        result["llm_tokens"] = {kind: int(value) for kind, value in sorted(app.llm_tokens.totals("kind").items())}
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+
+    summary = result["summary"]
+    print(f"{summary['requests']} requests in {summary['duration_s']}s: "
+          f"{summary['throughput_rps']} req/s, error rate {summary['error_rate']}")
+    print(f"{'kind':<12} {'requests':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for kind, stats in [("all", summary)] + list(result["by_kind"].items()):
+        latency = stats["latency_ms"]
+        print(f"{kind:<12} {stats['requests']:>9} {latency['p50']:>9} {latency['p95']:>9} "
+              f"{latency['p99']:>9} {stats['error_rate']:>7}")
+    if "llm_tokens" in result:
+        print(f"model calls: {result['model_calls']}, estimated tokens: {result['llm_tokens']}")
+    print(f"results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), result)
+
+
+if __name__ == '__main__':
+    main_cli()
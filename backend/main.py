@@ -1,16 +1,43 @@
-from fastapi import FastAPI
+import time
+# Mốc đo thời gian khởi động, đặt trước mọi import nặng
+STARTUP_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
+import asyncio
+import datetime
 import json
 import logging
-from typing import Dict, List, Optional
+import tempfile
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
-from models.tool import Tool
+from models.tool import Tool, ToolArg, ToolCall, ToolInputError, ToolRegistry
+from services.cache import TTLCache
+from services.concurrency import ConcurrencyLimiter, OverloadedError
+from services.function_calling import (
+    completion_text, contents_tokens, function_calls, function_declarations,
+    function_response_content, history_contents, response_text,
+)
+from services.intent_router import IntentRouter
+from services.llm_client import CircuitBreaker, CircuitOpenError, LLMClient, is_unavailable
+from services.metrics import MetricsRegistry, span, start_trace
+from services.profiler import SamplingProfiler
+from services.prompt_compiler import CompiledPrompt, PromptCompiler, estimate_tokens
+from services.session_store import SessionStore, SQLiteSessionStore
+from services.single_flight import SingleFlight
+from services.startup import StartupTimer
 from tools.cooking_tools import CookingTools
+from tools.recipe_catalog import fold_text
+
+startup = StartupTimer(STARTUP_STARTED)
+startup.mark("imports")
 
 # Cấu hình logging
 logging.basicConfig(
@@ -20,16 +47,160 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 # Load environment variables
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# "gemini" hoặc "fake" (model giả chạy offline, dùng cho load test, không tốn quota)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini").lower()
+FAKE_MODEL_LATENCY = os.getenv("FAKE_MODEL_LATENCY", "lognormal:0.4,0.5")
+FAKE_MODEL_ERROR_RATE = float(os.getenv("FAKE_MODEL_ERROR_RATE", "0"))
+FAKE_MODEL_SEED = int(os.getenv("FAKE_MODEL_SEED", "0"))
+# Tạo model Gemini ngay khi khởi động (chạy nền) thay vì ở request đầu tiên
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "false").lower() == "true"
+
+# Cách xử lý /chat: "prompt" (prompt phân tích trả JSON rồi prompt trả lời riêng) hoặc
+# "functions" (tool được khai báo cho model dưới dạng function calling, trong cùng một hội thoại)
+CHAT_PIPELINE = os.getenv("CHAT_PIPELINE", "prompt").lower()
+if CHAT_PIPELINE not in ("prompt", "functions"):
+    raise ValueError(f"Unknown CHAT_PIPELINE: {CHAT_PIPELINE}")
+# Số vòng gọi hàm tối đa mỗi lượt ở chế độ "functions" trước khi buộc model trả lời
+FUNCTION_MAX_ROUNDS = int(os.getenv("FUNCTION_MAX_ROUNDS", "2"))
+
+# Giới hạn số request /chat xử lý đồng thời và số request được phép xếp hàng
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "32"))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "64"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "10"))
+
+# /chat/batch: số câu hỏi tối đa mỗi batch và số lời gọi model song song trong một batch
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+
+# Cache kết quả tool (tầng 1) và câu trả lời cuối của LLM (tầng 2)
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "2048"))
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "3600"))
+REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "1024"))
+REPLY_CACHE_TTL = float(os.getenv("REPLY_CACHE_TTL", "900"))
+
+# Gộp các lời gọi LLM/tool giống hệt nhau đang chạy đồng thời thành một lời gọi dùng chung
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+# Thời gian tối đa (giây) mỗi request chờ một bước LLM, kể cả khi dùng chung với request khác
+LLM_WAIT_TIMEOUT = float(os.getenv("LLM_WAIT_TIMEOUT", "30"))
+
+# Lời gọi LLM: hạn chót (giây) cho cả lời gọi kể cả thử lại, số lần thử và thời gian chờ cơ sở giữa các lần
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "20"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.2"))
+# Gửi thêm một bản khi lời gọi chậm hơn phân vị này của call site (0 = tắt), tối đa LLM_HEDGE_MAX_RATIO số lời gọi
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.2"))
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+# Circuit breaker: mở sau số lỗi liên tiếp này, thử lại upstream sau số giây này
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# Số tool tối đa mỗi lượt và thời gian chờ mặc định (giây) của một tool
+TOOL_MAX_CALLS = int(os.getenv("TOOL_MAX_CALLS", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "5"))
+
+# Giới hạn bộ nhớ hội thoại: số phiên, thời gian rảnh tối đa (giây), số lượt giữ lại mỗi phiên
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "5"))
+# "memory" (trong tiến trình) hoặc "sqlite" (file dùng chung, bắt buộc khi chạy nhiều worker)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.db"))
+
+# Ngân sách token cho prompt phân tích và cache phần prompt tĩnh phía Gemini
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+PROMPT_MAX_MESSAGE_TOKENS = int(os.getenv("PROMPT_MAX_MESSAGE_TOKENS", "200"))
+PROMPT_PREFIX_CACHE = os.getenv("PROMPT_PREFIX_CACHE", "false").lower() == "true"
+PROMPT_PREFIX_CACHE_TTL = int(os.getenv("PROMPT_PREFIX_CACHE_TTL", "3600"))
+
+# Ghi log kết quả tool: "full", "truncated" (200 ký tự đầu) hoặc "off"
+LOG_TOOL_OUTPUT = os.getenv("LOG_TOOL_OUTPUT", "truncated").lower()
 
-# Configure Gemini
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
+# Profiler lấy mẫu, bật cho từng request bằng header X-Profile: 1
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "cooking-profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+
+# Chu kỳ (giây) kiểm tra recipes.csv thay đổi để nạp lại; 0 = chỉ nạp lại qua /admin/catalog/reload
+CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "0"))
+
+# Token cho các endpoint quản trị; để trống thì không kiểm tra
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Tăng khi sửa create_final_prompt để không trả lại câu trả lời đã cache theo prompt cũ
+PROMPT_VERSION = "1"
+
+startup.mark("config")
+
+# Gemini SDK import rất chậm nên chỉ tạo model khi cần lần đầu
+model: Optional[Any] = None
+model_lock = threading.Lock()
+
+def create_model() -> Any:
+    """Create the configured model backend"""
+    if MODEL_BACKEND == "fake":
+        from services.fake_model import FakeModel
+        logger.info(f"🧪 Using fake model (latency {FAKE_MODEL_LATENCY}, error rate {FAKE_MODEL_ERROR_RATE})")
+        return FakeModel(FAKE_MODEL_LATENCY, FAKE_MODEL_ERROR_RATE, FAKE_MODEL_SEED,
+                         cooking_tools.catalog.recipe_names)
+    if MODEL_BACKEND != "gemini":
+        raise ValueError(f"Unknown MODEL_BACKEND: {MODEL_BACKEND}")
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    logger.info(f"🤖 Gemini model {GEMINI_MODEL} ready")
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+def get_model() -> Any:
+    """Return the model, creating it on first use; tests may assign main.model directly"""
+    global model
+    if model is None:
+        with model_lock:
+            if model is None:
+                with startup.phase("model"):
+                    model = create_model()
+    return model
+
+async def load_model() -> Any:
+    """get_model() without blocking the event loop on the first, slow SDK import"""
+    if model is not None:
+        return model
+    return await run_in_threadpool(get_model)
+
+# Model riêng cho chế độ function calling: chỉ dẫn đầu bếp nằm trong system instruction
+function_model: Optional[Any] = None
+
+def create_function_model() -> Any:
+    """Create a Gemini model carrying FUNCTION_SYSTEM_PROMPT as its system instruction"""
+    import google.generativeai as genai
+    get_model()  # cấu hình API key
+    return genai.GenerativeModel(GEMINI_MODEL, system_instruction=FUNCTION_SYSTEM_PROMPT)
+
+async def load_function_model() -> Any:
+    """Model used by the "functions" pipeline; other backends reuse the main model"""
+    global function_model
+    if MODEL_BACKEND != "gemini":
+        return await load_model()
+    if function_model is None:
+        function_model = await run_in_threadpool(create_function_model)
+    return function_model
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup = asyncio.create_task(load_model()) if MODEL_WARMUP else None
+    watcher = asyncio.create_task(watch_catalog()) if CATALOG_RELOAD_INTERVAL > 0 else None
+    yield
+    for task in (warmup, watcher):
+        if task is not None:
+            task.cancel()
 
 # Initialize FastAPI app
-app = FastAPI(title="Cooking Assistant")
+app = FastAPI(title="Cooking Assistant", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -43,63 +214,117 @@ class Message(BaseModel):
     message: str
     session_id: Optional[str] = None
 
+class BatchRequest(BaseModel):
+    messages: List[str]
+    stream: bool = False
+
 # Initialize cooking tools
 cooking_tools = CookingTools()
+startup.mark("catalog")
 
 # Initialize conversation memory
-conversation_memory: Dict[str, List[dict]] = {}
+if SESSION_BACKEND == "sqlite":
+    session_store = SQLiteSessionStore(SESSION_DB_PATH, SESSION_MAX_COUNT, SESSION_TTL, SESSION_MAX_TURNS)
+elif SESSION_BACKEND == "memory":
+    session_store = SessionStore(SESSION_MAX_COUNT, SESSION_TTL, SESSION_MAX_TURNS)
+else:
+    raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
+
+async def session_call(method: Callable[..., T], *args: Any) -> T:
+    """Call a session store method; the SQLite store blocks on disk and locks, so it runs in the threadpool"""
+    if SESSION_BACKEND == "sqlite":
+        return await run_in_threadpool(method, *args)
+    return method(*args)
+
+# Bounded concurrency for the chat pipeline
+chat_limiter = ConcurrencyLimiter(CHAT_MAX_CONCURRENCY, CHAT_MAX_QUEUE, CHAT_QUEUE_TIMEOUT)
+
+# Local intent router: bỏ qua lượt LLM phân tích với các câu hỏi theo mẫu
+# Chỉ tra tên chính xác: tên gần đúng/mơ hồ để LLM hỏi lại hoặc tool gợi ý
+intent_router = IntentRouter(cooking_tools.find_exact)
+
+# Tool outputs are deterministic for (tool, normalized input)
+tool_cache = TTLCache(TOOL_CACHE_SIZE, TOOL_CACHE_TTL)
+reply_cache = TTLCache(REPLY_CACHE_SIZE, REPLY_CACHE_TTL)
 
 # Define tools
 tools = [
     Tool(
         name="recipe_finder",
         description="Use when user asks for a specific recipe. Input: dish name (e.g. 'pho', 'pasta'). Returns full recipe with steps.",
-        func=cooking_tools.recipe_finder
+        func=cooking_tools.recipe_finder,
+        args=(ToolArg("dish"),)
     ),
     Tool(
         name="recipe_recommender",
-        description="Use when user needs dish suggestions. Input: cooking time (minutes), difficulty (1-5), servings. Returns suitable recipes.",
-        func=cooking_tools.recipe_recommender
+        description="Use when user needs dish suggestions. Input: 'time:30, difficulty:dễ, servings:4' (optional k:N for number of results). Returns suitable recipes.",
+        func=cooking_tools.recipe_recommender,
+        args=(ToolArg("preferences"),)
     ),
     Tool(
         name="ingredient_substitute",
         description="Use when user asks about ingredient replacements. Input: ingredient name. Returns possible substitutes.",
-        func=cooking_tools.ingredient_substitute
+        func=cooking_tools.ingredient_substitute,
+        args=(ToolArg("ingredient"),)
     ),
     Tool(
         name="portion_calculator",
         description="Use when user wants to adjust recipe portions. Input: 'dish_name,servings'. Returns adjusted ingredients.",
-        func=cooking_tools.portion_calculator
+        func=cooking_tools.portion_calculator,
+        args=(ToolArg("dish"), ToolArg("servings", int))
     ),
     Tool(
         name="cooking_timer",
         description="Use when user asks about cooking duration. Input: dish name. Returns cooking time breakdown.",
-        func=cooking_tools.cooking_timer
+        func=cooking_tools.cooking_timer,
+        args=(ToolArg("dish"),)
     ),
     Tool(
         name="nutrition_info",
         description="Use when user asks about nutritional values. Input: dish name. Returns nutrition facts per serving.",
-        func=cooking_tools.nutrition_info
+        func=cooking_tools.nutrition_info,
+        args=(ToolArg("dish"),)
     ),
     Tool(
         name="list_ingredients",
         description="Use when user asks what ingredients are needed. Input: dish name. Returns complete ingredient list.",
-        func=cooking_tools.list_ingredients
+        func=cooking_tools.list_ingredients,
+        args=(ToolArg("dish"),)
+    ),
+    Tool(
+        name="pantry_recipes",
+        description="Use when user lists ingredients they have and asks what to cook. Input: comma-separated ingredients (e.g. 'trứng, cà chua, thịt heo'). Returns best-matching recipes with missing ingredients.",
+        func=cooking_tools.pantry_recipes,
+        args=(ToolArg("ingredients"),)
+    ),
+    Tool(
+        name="shopping_list",
+        description="Use when user plans a menu and asks what to buy for several dishes or many people. Input: 'dish:servings' items separated by commas (e.g. 'phở bò:20, chả giò:30'). Returns one merged shopping list with scaled quantities.",
+        func=cooking_tools.shopping_list,
+        args=(ToolArg("menu"),)
+    ),
+    Tool(
+        name="meal_nutrition",
+        description="Use when user asks for the total nutrition of a meal or menu with several dishes. Input: 'dish:servings' items separated by commas (e.g. 'phở bò:2, chả giò:1'). Returns nutrition per dish and totals.",
+        func=cooking_tools.meal_nutrition,
+        args=(ToolArg("menu"),)
+    ),
+    Tool(
+        name="nutrition_search",
+        description="Use when user wants dishes matching nutrition limits per serving. Input: conditions on calories, protein, carbs, fat with <, <=, >, >= (e.g. 'calories<500, protein>=30'), optional k:N and sort:protein / sort:-calories. Returns matching recipes.",
+        func=cooking_tools.nutrition_search,
+        args=(ToolArg("constraints"),)
     )
 ]
+tool_registry = ToolRegistry(tools)
+# Khai báo hàm gửi kèm mỗi lời gọi ở chế độ CHAT_PIPELINE=functions
+FUNCTION_TOOLS = [{"function_declarations": function_declarations(tool_registry)}]
 
-def create_cooking_prompt(query: str, context: List[dict] = None) -> str:
-    """Create prompt for the cooking assistant with conversation context"""
-    tools_desc = "\n".join([f"- {tool.name}: {tool.description}" for tool in tools])
-    
-    context_str = ""
-    if context:
-        context_str = "\nConversation history:\n" + "\n".join([
-            f"{'User' if msg.get('isUser') else 'Chef'}: {msg.get('text', '')}"
-            for msg in context[-5:]  # Only keep last 5 messages
-        ])
-    
-    return f"""You are a professional and enthusiastic Chef. Always provide concise, focused responses without unnecessary details.
+# Phần tĩnh của prompt phân tích, chỉ render một lần cho mỗi bộ tool
+COOKING_PROMPT_TEMPLATE = """You are a professional and enthusiastic Chef. Always provide concise, focused responses without unnecessary details.
+
+AVAILABLE TOOLS:
+{tools}
 
 RESPONSE RULES:
 1. Keep responses short and focused (2-3 sentences per point)
@@ -141,6 +366,20 @@ REQUEST HANDLING RULES:
    - DO NOT call list_ingredients for nutrition queries
    - Keep nutrition information clear and concise
 
+6. When user lists ingredients they already have ("tôi có X, Y", "còn X và Y nấu gì"):
+   - ALWAYS call pantry_recipes with the listed ingredients
+
+7. When user plans a menu or asks what to buy ("đi chợ", "cần mua gì") for one or more dishes:
+   - ALWAYS call shopping_list once with every dish and its servings, never portion_calculator per dish
+
+8. For nutrition of a whole meal or menu ("thực đơn", "tổng dinh dưỡng" of several dishes):
+   - ALWAYS call meal_nutrition once with every dish and its servings
+   - When user asks for dishes under/over nutrition limits ("dưới 500 calo", "nhiều protein"): call nutrition_search with the limits
+
+9. When one question needs several tools (e.g. ingredients AND nutrition):
+   - Return ALL the calls at once as a JSON list, never one after another
+   - Only include the tools the question actually needs
+
 QUERY ANALYSIS EXAMPLES:
 "want to cook pho" -> Return:
 {{"tool": "recipe_finder", "input": "pho"}}
@@ -154,6 +393,24 @@ QUERY ANALYSIS EXAMPLES:
 "dinh dưỡng phở bò" -> Return:
 {{"tool": "nutrition_info", "input": "phở bò"}}
 
+"tôi có trứng, cà chua và hành lá thì nấu món gì" -> Return:
+{{"tool": "pantry_recipes", "input": "trứng, cà chua, hành lá"}}
+
+"nguyên liệu và dinh dưỡng phở bò" -> Return:
+[{{"tool": "list_ingredients", "input": "phở bò"}}, {{"tool": "nutrition_info", "input": "phở bò"}}]
+
+"phở bò cho 4 người" -> Return:
+{{"tool": "portion_calculator", "input": "phở bò, 4"}}
+
+"đi chợ nấu phở bò cho 20 người và chả giò cho 30 người" -> Return:
+{{"tool": "shopping_list", "input": "phở bò:20, chả giò:30"}}
+
+"món nào dưới 500 calo mà có ít nhất 30g protein" -> Return:
+{{"tool": "nutrition_search", "input": "calories<500, protein>=30"}}
+
+"tổng dinh dưỡng bữa trưa 2 tô phở bò và 1 đĩa bánh xèo" -> Return:
+{{"tool": "meal_nutrition", "input": "phở bò:2, bánh xèo:1"}}
+
 GOOD RESPONSE EXAMPLES:
 - "Sorry, I don't have this recipe. Would you like me to suggest something else?"
 - "For pho, you need: beef bones 2kg, beef 500g, rice noodles 1kg, and seasonings"
@@ -165,10 +422,6 @@ BAD RESPONSE EXAMPLES:
 - "To make delicious pho, you need these ingredients. Beef bones are the soul..." (unnecessary details)
 - "Let me check the nutritional database..." (mentioning tool usage)
 
-{context_str}
-
-User query: {query}
-
 Thinking steps:
 1. Check if query matches cooking patterns
 2. If yes -> ALWAYS call recipe_finder, NO EXCEPTIONS
@@ -177,72 +430,119 @@ Thinking steps:
 
 Note: Final response to user MUST be in Vietnamese with correct grammar and spelling."""
 
-def execute_tool(tool_name: str, tool_input: str) -> str:
-    """Execute a cooking tool"""
-    logger.info(f"🔧 Executing tool: {tool_name}")
-    logger.info(f"📥 Tool input: {tool_input}")
-    
-    for tool in tools:
-        if tool.name == tool_name:
-            # Special handling for portion calculator which needs two parameters
-            if tool.name == "portion_calculator" and "," in tool_input:
-                recipe, servings = tool_input.split(",")
-                result = tool.func(recipe.strip(), int(servings.strip()))
-                logger.info(f"📤 Tool output: {result}")
-                return result
-            result = tool.func(tool_input)
-            logger.info(f"📤 Tool output: {result}")
-            return result
-    
-    error_msg = f"Không tìm thấy công cụ {tool_name}"
-    logger.error(f"❌ {error_msg}")
-    return error_msg
+# Chỉ dẫn cho chế độ function calling: tool đã được khai báo riêng nên không cần mô tả định dạng JSON
+FUNCTION_SYSTEM_PROMPT = """You are a professional and enthusiastic Chef. Always provide concise, focused responses without unnecessary details.
 
-@app.post("/chat")
-async def chat(msg: Message):
-    try:
-        logger.info(f"📝 Received message: {msg.message}")
-        
-        # Get or create conversation history
-        session_id = msg.session_id or "default"
-        if session_id not in conversation_memory:
-            conversation_memory[session_id] = []
-        
-        # Add user message to history
-        conversation_memory[session_id].append({
-            "isUser": True,
-            "text": msg.message
-        })
-        
-        # Đầu tiên, phân tích xem câu hỏi có cần dùng tool không
-        analysis_prompt = create_cooking_prompt(
-            msg.message,
-            context=conversation_memory[session_id][-5:]  # Truyền 5 tin nhắn gần nhất
-        )
-        
-        initial_response = model.generate_content(analysis_prompt)
-        initial_text = initial_response.text.strip()
-        logger.info(f"🤖 Initial AI response: {initial_text}")
-        
-        try:
-            # Kiểm tra xem response có chứa JSON không
-            json_start = initial_text.find("{")
-            json_end = initial_text.rfind("}") + 1
-            
-            if json_start != -1 and json_end != 0:
-                json_str = initial_text[json_start:json_end]
-                regular_text = (initial_text[:json_start] + initial_text[json_end:]).strip()
-                
-                logger.info(f"🔍 Detected tool call in response: {json_str}")
-                
-                # Parse JSON để sử dụng tool
-                tool_call = json.loads(json_str)
-                if "tool" in tool_call and "input" in tool_call:
-                    tool_result = execute_tool(tool_call["tool"], tool_call["input"])
-                    
-                    final_prompt = f"""With your role as a friendly chef, please respond based on this information:
-
-Question: {msg.message}
+Call the available functions to look up recipes, ingredients, cooking times, nutrition, portions and suggestions. Never invent recipe data.
+
+REQUEST HANDLING RULES:
+1. "want to cook X", "how to make X", "recipe for X", "cook X": call recipe_finder with the dish name.
+2. Ingredient questions: call list_ingredients. Nutrition questions ("dinh dưỡng", "calories", "protein"): call nutrition_info, not list_ingredients.
+3. Recipe suggestions: ask only for cooking time, difficulty and number of servings, then call recipe_recommender.
+4. The user lists ingredients they have ("tôi có X, Y thì nấu gì"): call pantry_recipes with those ingredients.
+5. The user plans a menu or asks what to buy ("đi chợ", "cần mua gì"): call shopping_list once with every dish and its servings.
+6. Total nutrition of a meal with several dishes: call meal_nutrition once. Dishes under/over nutrition limits ("dưới 500 calo", "ít nhất 30g protein"): call nutrition_search.
+7. A question that needs several functions (e.g. ingredients AND nutrition): call them all at once.
+8. When a function reports that the dish is not in the database, say briefly that you don't have this recipe and offer a suggestion. Do not give cooking tips without data.
+
+WHEN ANSWERING:
+- Respond naturally as in a conversation, DO NOT mention lookups or functions.
+- Keep it short (2-3 sentences per point), friendly and cheerful; add a useful tip when appropriate.
+
+Note: Response MUST be in Vietnamese with correct grammar and spelling."""
+FUNCTION_PROMPT_TOKENS = estimate_tokens(FUNCTION_SYSTEM_PROMPT + json.dumps(FUNCTION_TOOLS, ensure_ascii=False))
+
+prompt_compiler = PromptCompiler(
+    COOKING_PROMPT_TEMPLATE,
+    token_budget=PROMPT_TOKEN_BUDGET,
+    max_message_tokens=PROMPT_MAX_MESSAGE_TOKENS,
+)
+
+# Lời gọi đang chạy theo từng bước, để request trùng khóa chờ chung thay vì gọi lại
+flights = {stage: SingleFlight() for stage in ("analysis", "tool", "final")}
+
+# Mọi lời gọi model đi qua đây: hạn chót, hedging, thử lại có jitter và circuit breaker dùng chung
+llm_client = LLMClient(
+    deadline=LLM_DEADLINE,
+    max_attempts=LLM_MAX_ATTEMPTS,
+    backoff=LLM_RETRY_BACKOFF,
+    hedge_quantile=LLM_HEDGE_QUANTILE or None,
+    hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+    hedge_max_ratio=LLM_HEDGE_MAX_RATIO,
+    breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET),
+)
+# Trả lời khi không có kết quả tool nào để trả thẳng và upstream đang lỗi
+LLM_UNAVAILABLE_REPLY = "Xin lỗi, trợ lý đang tạm thời gián đoạn. Bạn thử hỏi trực tiếp tên món (vd. \"nguyên liệu phở bò\") hoặc thử lại sau ít phút nhé!"
+
+# Metrics xuất ra /metrics theo định dạng Prometheus
+metrics = MetricsRegistry()
+chat_requests = metrics.counter("chat_requests_total", "Chat requests by endpoint and status", ("endpoint", "status"))
+chat_seconds = metrics.histogram("chat_request_seconds", "Chat request latency", ("endpoint",))
+stage_seconds = metrics.histogram("chat_stage_seconds", "Time spent in each chat pipeline stage", ("stage",))
+tool_seconds = metrics.histogram("tool_duration_seconds", "Tool execution time", ("tool",))
+tool_calls_total = metrics.counter("tool_calls_total", "Tool calls by tool and result", ("tool", "result"))
+llm_requests = metrics.counter("llm_requests_total", "LLM calls by call site and outcome", ("call", "outcome"))
+llm_seconds = metrics.histogram("llm_request_seconds", "LLM call latency", ("call",))
+llm_tokens = metrics.counter("llm_tokens_total", "Estimated LLM tokens by call site and kind", ("call", "kind"))
+llm_degraded = metrics.counter("llm_degraded_total", "Turns answered without the LLM (raw tool result or fallback text)", ("call",))
+caches = {"tool": tool_cache, "reply": reply_cache}
+metrics.gauge("cache_entries", "Entries held per cache tier", ("tier",),
+              lambda: [({"tier": tier}, cache.stats()["size"]) for tier, cache in caches.items()])
+metrics.gauge("cache_hits_total", "Cache hits per tier", ("tier",),
+              lambda: [({"tier": tier}, cache.stats()["hits"]) for tier, cache in caches.items()], kind="counter")
+metrics.gauge("cache_misses_total", "Cache misses per tier", ("tier",),
+              lambda: [({"tier": tier}, cache.stats()["misses"]) for tier, cache in caches.items()], kind="counter")
+metrics.gauge("sessions_active", "Live chat sessions", (),
+              lambda: [({}, session_store.stats()["sessions"])])
+metrics.gauge("sessions_bytes", "Approximate memory held by session history", (),
+              lambda: [({}, session_store.stats()["approx_bytes"])])
+metrics.gauge("chat_inflight_requests", "Chat requests being processed or queued", ("state",),
+              lambda: [({"state": state}, chat_limiter.stats()[state]) for state in ("active", "waiting")])
+metrics.gauge("catalog_version", "Version of the recipe catalogue in use (bumped on every reload)", (),
+              lambda: [({}, cooking_tools.version)])
+metrics.gauge("catalog_recipes", "Recipes in the catalogue in use", (),
+              lambda: [({}, len(cooking_tools.catalog))])
+metrics.gauge("catalog_reloads_total", "Catalogue reloads by outcome", ("outcome",),
+              lambda: [({"outcome": "ok"}, cooking_tools.reloads),
+                       ({"outcome": "error"}, cooking_tools.reload_failures)], kind="counter")
+metrics.gauge("catalog_last_reload_seconds", "Duration of the last catalogue rebuild", (),
+              lambda: [({}, (cooking_tools.last_reload_ms or 0.0) / 1e3)])
+metrics.gauge("coalesced_calls_total", "Calls per stage that started work (leader) or joined one in flight (follower)",
+              ("stage", "role"),
+              lambda: [({"stage": stage, "role": role}, getattr(flight, role + "s"))
+                       for stage, flight in flights.items() for role in ("leader", "follower")], kind="counter")
+for name, attribute, help in (
+    ("llm_hedges_total", "hedges", "Duplicate LLM requests sent after the hedge threshold"),
+    ("llm_hedge_wins_total", "hedge_wins", "Hedged LLM requests that answered before the original"),
+    ("llm_retries_total", "retries", "LLM retries after a transient failure"),
+    ("llm_deadline_exceeded_total", "deadlines", "LLM calls that ran out of their deadline"),
+    ("llm_breaker_rejected_total", "rejected", "LLM calls failed fast by the open circuit breaker"),
+):
+    metrics.gauge(name, help, ("call",),
+                  lambda attribute=attribute: [({"call": call}, count) for call, count in getattr(llm_client, attribute).items()],
+                  kind="counter")
+metrics.gauge("llm_hedge_delay_seconds", "Current hedge threshold per call site", ("call",),
+              lambda: [({"call": call}, delay) for call, delay in llm_client.stats()["hedge_delay"].items() if delay is not None])
+metrics.gauge("llm_breaker_state", "LLM circuit breaker state (0 closed, 1 half-open, 2 open)", (),
+              lambda: [({}, (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN).index(llm_client.breaker.state))])
+metrics.gauge("llm_breaker_opens_total", "Times the LLM circuit breaker opened", (),
+              lambda: [({}, llm_client.breaker.opens)], kind="counter")
+metrics.gauge("router_routed_total", "Queries answered by the local intent router", (),
+              lambda: [({}, intent_router.stats()["routed"])], kind="counter")
+metrics.gauge("router_fallbacks_total", "Queries the intent router passed to the LLM", (),
+              lambda: [({}, intent_router.stats()["fallbacks"])], kind="counter")
+
+startup.mark("services")
+
+def create_cooking_prompt(query: str, context: List[dict] = None) -> CompiledPrompt:
+    """Create prompt for the cooking assistant with conversation context"""
+    return prompt_compiler.render(tool_registry, query, context)
+
+def create_final_prompt(question: str, tool_result: str) -> str:
+    """Create prompt that turns a tool result into a friendly reply"""
+    return f"""With your role as a friendly chef, please respond based on this information:
+
+Question: {question}
 Tool result: {tool_result}
 
 REQUIREMENTS:
@@ -256,40 +556,480 @@ REQUIREMENTS:
 Note: Response MUST be in Vietnamese with correct grammar and spelling.
 
 Response:"""
-                    
-                    final_response = model.generate_content(final_prompt)
-                    final_text = final_response.text.strip()
-                    logger.info(f"🎯 Final response: {final_text}")
-                    
-                    # Add bot response to history
-                    conversation_memory[session_id].append({
-                        "isUser": False,
-                        "text": final_text
-                    })
-                    
-                    return {"reply": final_text}
-                
-            # Nếu không có JSON hoặc không parse được, trả về text thường
-            logger.info("📢 No tool call needed, returning direct response")
-            
-            # Add bot response to history
-            conversation_memory[session_id].append({
-                "isUser": False,
-                "text": initial_text
-            })
-            
-            return {"reply": initial_text}
-            
+
+def log_tool_output(result: str) -> None:
+    """Log a tool result according to LOG_TOOL_OUTPUT"""
+    if LOG_TOOL_OUTPUT == "full":
+        logger.info(f"📤 Tool output: {result}")
+    elif LOG_TOOL_OUTPUT == "truncated":
+        logger.info(f"📤 Tool output ({len(result)} chars): {result[:200]}")
+
+def _execute_tool(tool_name: str, tool_input: str) -> Tuple[str, str]:
+    tool = tool_registry.get(tool_name)
+    if tool is None:
+        error_msg = f"Không tìm thấy công cụ {tool_name}"
+        logger.error(f"❌ {error_msg}")
+        return error_msg, "unknown"
+
+    # Phiên bản catalogue nằm trong khóa để kết quả cũ không được dùng sau khi reload.
+    # Khóa giữ dấu: "cá" và "cà" là hai nguyên liệu khác nhau
+    cache_key = (tool_name, fold_text(tool_input), cooking_tools.version)
+    cached = tool_cache.get(cache_key)
+    if cached is not None:
+        logger.info("💾 Tool cache hit")
+        return cached, "cached"
+
+    try:
+        # Đầu vào được tách và ép kiểu theo schema tham số của tool
+        result = tool.execute(tool_input)
+    except ToolInputError as e:
+        logger.error(f"❌ Invalid tool input: {str(e)}")
+        return f"Đầu vào không hợp lệ cho công cụ {tool_name}: {tool_input}", "invalid"
+    log_tool_output(result)
+    tool_cache.set(cache_key, result)
+    return result, "ok"
+
+def tool_label(tool_name: str) -> str:
+    """Metrics label of a tool name"""
+    # Tên tool do LLM tự đặt không được thành nhãn metrics, tránh bùng nổ số chuỗi
+    return tool_name if tool_name in tool_registry else "unknown"
+
+def execute_tool(tool_name: str, tool_input: str) -> str:
+    """Execute a cooking tool"""
+    logger.info(f"🔧 Executing tool: {tool_name}")
+    logger.info(f"📥 Tool input: {tool_input}")
+    label = tool_label(tool_name)
+    with span(tool_seconds, tool=label):
+        result, outcome = _execute_tool(tool_name, tool_input)
+    tool_calls_total.inc(tool=label, result=outcome)
+    return result
+
+async def coalesce(stage: str, key: Any, call: Callable[[], Awaitable[T]], timeout: Optional[float]) -> T:
+    """Await call(), sharing it with concurrent requests of the same stage and key.
+
+    Each caller waits at most `timeout` seconds; an error reaches everyone
+    sharing the call. With COALESCE_ENABLED=false every caller runs its own.
+    """
+    if not COALESCE_ENABLED:
+        return await asyncio.wait_for(call(), timeout)
+    return await flights[stage].do(key, call, timeout)
+
+async def run_tool(tool_name: str, tool_input: str) -> str:
+    """Run a tool in the threadpool so it does not block the event loop, bounded by its timeout"""
+    tool = tool_registry.get(tool_name)
+    timeout = tool.timeout if tool is not None and tool.timeout is not None else TOOL_TIMEOUT
+    key = (tool_name, fold_text(tool_input), cooking_tools.version)
+    try:
+        return await coalesce("tool", key, lambda: run_in_threadpool(execute_tool, tool_name, tool_input), timeout)
+    except asyncio.TimeoutError:
+        # Luồng của tool vẫn chạy tiếp nhưng lượt chat không phải chờ nữa
+        logger.error(f"⏱️ Tool {tool_name} timed out after {timeout}s")
+        tool_calls_total.inc(tool=tool_label(tool_name), result="timeout")
+        return f"Công cụ {tool_name} không phản hồi kịp, vui lòng thử lại sau."
+
+async def run_tools(calls: List[ToolCall]) -> List[str]:
+    """Run the tools of one turn concurrently, results in call order"""
+    return await asyncio.gather(*(run_tool(call.tool, call.input) for call in calls))
+
+def merge_tool_results(calls: List[ToolCall], results: List[str]) -> str:
+    """Combine the results of a turn's tool calls for the final prompt"""
+    if len(results) == 1:
+        return results[0]
+    return "\n\n".join(
+        f"[{call.tool}: {call.input}]\n{result}" for call, result in zip(calls, results)
+    )
+
+def reply_cache_key(calls: List[ToolCall]) -> tuple:
+    """Key of a rendered reply in the reply cache"""
+    return (
+        tuple(call.tool for call in calls),
+        tuple(fold_text(call.input) for call in calls),
+        PROMPT_VERSION,
+        cooking_tools.version,
+    )
+
+async def observe_llm(call: str, prompt_tokens: int, request, cached_tokens: int = 0):
+    """Await one model call, recording its latency, outcome and estimated tokens"""
+    start = time.perf_counter()
+    try:
+        response = await request
+    except Exception:
+        llm_requests.inc(call=call, outcome="error")
+        raise
+    finally:
+        llm_seconds.observe(time.perf_counter() - start, call=call)
+    llm_requests.inc(call=call, outcome="ok")
+    llm_tokens.inc(prompt_tokens, call=call, kind="prompt")
+    llm_tokens.inc(estimate_tokens(completion_text(response)), call=call, kind="completion")
+    if cached_tokens:
+        llm_tokens.inc(cached_tokens, call=call, kind="cached")
+    return response
+
+async def answer_with_tools(question: str, calls: List[ToolCall]) -> str:
+    """Run a turn's tools off the event loop and render their merged results with the model"""
+    cache_key = reply_cache_key(calls)
+    cached = reply_cache.get(cache_key)
+    if cached is not None:
+        logger.info("💾 Reply cache hit")
+        return cached
+    # Câu hỏi khác chữ nhưng cùng lời gọi tool dùng chung một câu trả lời, như reply cache
+    return await coalesce("final", cache_key, lambda: render_reply(question, calls, cache_key), LLM_WAIT_TIMEOUT)
+
+async def render_reply(question: str, calls: List[ToolCall], cache_key: tuple) -> str:
+    with span(stage_seconds, stage="tools"):
+        tool_result = merge_tool_results(calls, await run_tools(calls))
+
+    final_prompt = create_final_prompt(question, tool_result)
+    llm = await load_model()
+    try:
+        with span(stage_seconds, stage="final"):
+            final_response = await llm_client.call("final", lambda: observe_llm(
+                "final", estimate_tokens(final_prompt), llm.generate_content_async(final_prompt)
+            ))
+    except Exception as e:
+        # Upstream lỗi, quá hạn hoặc breaker đang mở: trả thẳng kết quả tool thay vì lỗi 500, không cache.
+        # Lỗi khác (lỗi code của mình, 400 từ API) không được che thành "LLM không khả dụng"
+        if not is_unavailable(e):
+            raise
+        logger.warning(f"⚠️ LLM unavailable for the final answer, returning tool result: {str(e) or type(e).__name__}")
+        llm_degraded.inc(call="final")
+        return tool_result
+    final_text = final_response.text.strip()
+    logger.info(f"🎯 Final response: {final_text}")
+    reply_cache.set(cache_key, final_text)
+    return final_text
+
+# Model gắn với prefix đã cache phía Gemini: prefix -> (model hoặc None, hạn dùng)
+prefix_models: Dict[str, Tuple[Optional[Any], float]] = {}
+prefix_models_lock = asyncio.Lock()
+
+def create_prefix_model(prefix: str) -> Optional[Any]:
+    """Create a model bound to a server-side cached copy of the static prompt prefix"""
+    try:
+        import google.generativeai as genai
+        from google.generativeai import caching
+        get_model()  # cấu hình API key
+        cached_content = caching.CachedContent.create(
+            model=GEMINI_MODEL,
+            system_instruction=prefix,
+            ttl=datetime.timedelta(seconds=PROMPT_PREFIX_CACHE_TTL),
+        )
+        logger.info(f"🗂️ Cached prompt prefix as {cached_content.name}")
+        return genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+    except Exception as e:
+        # SDK cũ không có caching, hoặc prefix ngắn hơn mức tối thiểu của Gemini
+        logger.warning(f"⚠️ Prompt prefix caching unavailable, sending full prompts: {str(e)}")
+        return None
+
+async def get_prefix_model(prefix: str) -> Optional[Any]:
+    """Return the cached-prefix model for a prefix, creating it when missing or expired"""
+    loop = asyncio.get_running_loop()
+    async with prefix_models_lock:
+        entry = prefix_models.get(prefix)
+        if entry is None or entry[1] <= loop.time():
+            prefix_model = await run_in_threadpool(create_prefix_model, prefix)
+            # Làm mới trước khi cache phía Gemini hết hạn
+            entry = prefix_models[prefix] = (prefix_model, loop.time() + 0.9 * PROMPT_PREFIX_CACHE_TTL)
+        return entry[0]
+
+async def generate_analysis(prompt: CompiledPrompt):
+    """Run the analysis call, sending the static prefix as cached content when possible"""
+    if PROMPT_PREFIX_CACHE and MODEL_BACKEND == "gemini":
+        prefix_model = await get_prefix_model(prompt.prefix)
+        if prefix_model is not None:
+            prompt_compiler.record(prompt.suffix_tokens, prompt.prefix_tokens)
+            try:
+                return await llm_client.call("analysis", lambda: observe_llm(
+                    "analysis", prompt.suffix_tokens,
+                    prefix_model.generate_content_async(prompt.suffix), cached_tokens=prompt.prefix_tokens,
+                ))
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Cached-prefix call failed, retrying with full prompt: {str(e)}")
+                prefix_models.pop(prompt.prefix, None)
+
+    prompt_compiler.record(prompt.tokens)
+    logger.info(f"🧾 Prompt tokens sent: {prompt.tokens}")
+    llm = await load_model()
+    return await llm_client.call(
+        "analysis", lambda: observe_llm("analysis", prompt.tokens, llm.generate_content_async(prompt.text))
+    )
+
+def extract_json(text: str) -> Any:
+    """Return the first JSON list or object embedded in a model reply, or None"""
+    # Thử lần lượt danh sách và object theo vị trí xuất hiện trong câu trả lời
+    candidates = [(text.find(opener), closer) for opener, closer in (("[", "]"), ("{", "}"))]
+    for json_start, closer in sorted(candidate for candidate in candidates if candidate[0] != -1):
+        json_end = text.rfind(closer) + 1
+        if json_end <= json_start:
+            continue
+        json_str = text[json_start:json_end]
+        try:
+            payload = json.loads(json_str)
         except json.JSONDecodeError as e:
             logger.error(f"❌ JSON parse error: {str(e)}")
-            
-            # Add bot response to history even if there's an error
-            conversation_memory[session_id].append({
-                "isUser": False,
-                "text": initial_text
-            })
-            
-            return {"reply": initial_text}
+            continue
+        logger.info(f"🔍 Detected tool call in response: {json_str}")
+        return payload
+    return None
+
+def parse_tool_calls(text: str) -> List[ToolCall]:
+    """Extract the tool calls of a model reply: one {"tool", "input"} object or a list of them"""
+    payload = extract_json(text)
+    items = payload if isinstance(payload, list) else [payload]
+
+    calls: List[ToolCall] = []
+    for item in items:
+        if not (isinstance(item, dict) and "tool" in item and "input" in item):
+            continue
+        try:
+            call = tool_registry.validate(str(item["tool"]), item["input"])
+        except ToolInputError as e:
+            # Giữ nguyên lời gọi: execute_tool sẽ trả về thông báo lỗi cho bước trả lời cuối
+            logger.warning(f"⚠️ Invalid tool call: {str(e)}")
+            call = ToolCall(str(item["tool"]), str(item["input"]))
+        if call not in calls:
+            calls.append(call)
+
+    if len(calls) > TOOL_MAX_CALLS:
+        logger.warning(f"⚠️ Dropping {len(calls) - TOOL_MAX_CALLS} tool calls over the per-turn limit")
+    return calls[:TOOL_MAX_CALLS]
+
+async def plan_turn(message: str, history: List[dict]) -> Tuple[List[ToolCall], str, str]:
+    """Decide how to answer a message.
+
+    Returns (tool_calls, direct_text, source): the local intent router is
+    tried first and the LLM analysis call only runs when it has no answer.
+    An empty tool_calls list means direct_text is the reply.
+    """
+    # Câu hỏi theo mẫu với tên món đã biết thì gọi tool trực tiếp
+    with span(stage_seconds, stage="route"):
+        routed_call = intent_router.route(message)
+    if routed_call is not None:
+        logger.info(f"⚡ Fast-path route: {routed_call.tool}({routed_call.input})")
+        return [routed_call], "", "router"
+
+    # Nếu không, phân tích xem câu hỏi có cần dùng tool không
+    with span(stage_seconds, stage="prompt"):
+        analysis_prompt = create_cooking_prompt(message, context=history)
+    try:
+        with span(stage_seconds, stage="analysis"):
+            initial_response = await coalesce(
+                "analysis", analysis_prompt.text, lambda: generate_analysis(analysis_prompt), LLM_WAIT_TIMEOUT
+            )
+    except Exception as e:
+        # Không có kết quả tool nào để trả thẳng: upstream không khỏe thì báo gián đoạn thay vì lỗi 500
+        if not is_unavailable(e):
+            raise
+        logger.warning(f"⚠️ LLM unavailable for analysis: {str(e) or type(e).__name__}")
+        llm_degraded.inc(call="analysis")
+        return [], LLM_UNAVAILABLE_REPLY, "degraded"
+    initial_text = initial_response.text.strip()
+    logger.info(f"🤖 Initial AI response: {initial_text}")
+    with span(stage_seconds, stage="parse"):
+        tool_calls = parse_tool_calls(initial_text)
+    return tool_calls, initial_text, "llm"
+
+async def run_function_calls(requested: List[Tuple[str, dict]]) -> Tuple[List[ToolCall], List[str]]:
+    """Run the functions a model response asked for; every request gets a result, in order"""
+    calls: List[ToolCall] = []
+    results: List[Optional[str]] = []
+    for name, args in requested:
+        if len(calls) >= TOOL_MAX_CALLS:
+            results.append(f"Chỉ được gọi tối đa {TOOL_MAX_CALLS} công cụ mỗi lượt.")
+            continue
+        try:
+            calls.append(tool_registry.validate(name, args))
+            results.append(None)
+        except ToolInputError as e:
+            logger.warning(f"⚠️ Invalid function call: {str(e)}")
+            results.append(f"Đầu vào không hợp lệ cho công cụ {name}: {str(e)}")
+
+    with span(stage_seconds, stage="tools"):
+        outputs = iter(await run_tools(calls))
+    return calls, [result if result is not None else next(outputs) for result in results]
+
+async def answer_with_functions(message: str, history: List[dict]) -> str:
+    """Answer a turn through native function calling (CHAT_PIPELINE=functions).
+
+    Templated queries still take the intent router's fast path. Otherwise
+    the tools go to the model as function declarations, the functions it
+    asks for run locally and their results continue the same conversation,
+    so there is no second prompt and no JSON to scrape. After
+    FUNCTION_MAX_ROUNDS rounds of calls the model must answer in text.
+    """
+    with span(stage_seconds, stage="route"):
+        routed_call = intent_router.route(message)
+    if routed_call is not None:
+        logger.info(f"⚡ Fast-path route: {routed_call.tool}({routed_call.input})")
+        return await answer_with_tools(message, [routed_call])
+
+    llm = await load_function_model()
+    contents = history_contents(history, PROMPT_MAX_MESSAGE_TOKENS)
+    contents.append({"role": "user", "parts": [{"text": message}]})
+    answered: List[ToolCall] = []
+    results: List[str] = []
+    for round_number in range(FUNCTION_MAX_ROUNDS + 1):
+        mode = "NONE" if round_number == FUNCTION_MAX_ROUNDS else "AUTO"
+        # Chụp lại danh sách hiện tại: lời gọi thử lại/hedge phải gửi đúng nội dung của vòng này
+        request_contents = list(contents)
+        try:
+            with span(stage_seconds, stage="analysis" if round_number == 0 else "final"):
+                response = await llm_client.call("functions", lambda: observe_llm(
+                    "functions", FUNCTION_PROMPT_TOKENS + contents_tokens(request_contents),
+                    llm.generate_content_async(
+                        request_contents, tools=FUNCTION_TOOLS,
+                        tool_config={"function_calling_config": {"mode": mode}},
+                    ),
+                ))
+        except Exception as e:
+            # Đã chạy hàm ở vòng trước thì trả thẳng kết quả; chưa có gì thì chỉ hạ cấp khi upstream không khỏe
+            if not results and not is_unavailable(e):
+                raise
+            logger.warning(f"⚠️ LLM unavailable in function calling: {str(e) or type(e).__name__}")
+            llm_degraded.inc(call="functions")
+            return merge_tool_results(answered, results) if results else LLM_UNAVAILABLE_REPLY
+        requested = function_calls(response)
+        if not requested:
+            break
+        logger.info(f"🧩 Function calls: {requested}")
+        _, results = await run_function_calls(requested)
+        answered = [ToolCall(name, ", ".join(str(value) for value in args.values())) for name, args in requested]
+        contents.append(response.candidates[0].content)
+        contents.append(function_response_content([(name, result) for (name, _), result in zip(requested, results)]))
+    return response_text(response).strip()
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject admin calls without the configured token"""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.get("/stats")
+async def stats():
+    """Expose router and limiter counters"""
+    return {
+        "router": intent_router.stats(),
+        "limiter": chat_limiter.stats(),
+        "sessions": await session_call(session_store.stats),
+        "prompt": prompt_compiler.stats(),
+        "startup": startup.stats(),
+        "catalog": cooking_tools.reload_stats(),
+        "coalescing": {stage: flight.stats() for stage, flight in flights.items()},
+        "llm": llm_client.stats(),
+        "cache": {
+            "tool": tool_cache.stats(),
+            "reply": reply_cache.stats(),
+        },
+    }
+
+@app.post("/admin/cache/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_cache(tier: Optional[str] = None, tool: Optional[str] = None):
+    """Clear one cache tier ('tool' or 'reply') or both, optionally for a single tool"""
+    tiers = {"tool": tool_cache, "reply": reply_cache}
+    if tier is not None and tier not in tiers:
+        raise HTTPException(status_code=400, detail=f"Unknown cache tier: {tier}")
+
+    # Khóa cache tool là (tool, input); khóa cache câu trả lời bắt đầu bằng bộ các tool
+    predicate = (lambda key: key[0] == tool or (isinstance(key[0], tuple) and tool in key[0])) if tool else None
+    removed = {
+        name: cache.invalidate(predicate)
+        for name, cache in tiers.items()
+        if tier is None or tier == name
+    }
+    logger.info(f"🧹 Cache invalidated: {removed}")
+    return {"removed": removed}
+
+async def reload_catalog(force: bool = False) -> bool:
+    """Rebuild the recipe data in a worker thread and swap it in if recipes.csv changed"""
+    changed = await run_in_threadpool(cooking_tools.reload, force)
+    if changed:
+        # Khóa cache đã chứa phiên bản nên mục cũ không còn được đọc; xóa để giải phóng bộ nhớ
+        tool_cache.invalidate()
+        reply_cache.invalidate()
+        logger.info(f"🔄 Recipe catalog now at version {cooking_tools.version}")
+    return changed
+
+async def watch_catalog():
+    """Poll recipes.csv every CATALOG_RELOAD_INTERVAL seconds and reload it when it changes"""
+    while True:
+        await asyncio.sleep(CATALOG_RELOAD_INTERVAL)
+        try:
+            await reload_catalog()
+        except Exception as e:
+            logger.error(f"❌ Catalog reload failed, keeping version {cooking_tools.version}: {str(e)}")
+
+@app.post("/admin/catalog/reload", dependencies=[Depends(require_admin)])
+async def admin_reload_catalog(force: bool = False):
+    """Reload recipes.csv now; force=true rebuilds even when the file is unchanged"""
+    try:
+        changed = await reload_catalog(force)
+    except Exception as e:
+        logger.error(f"❌ Catalog reload failed, keeping version {cooking_tools.version}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Reload failed: {str(e)}")
+    return {"reloaded": changed, **cooking_tools.reload_stats()}
+
+def overloaded_response(e: OverloadedError) -> JSONResponse:
+    """Response for a request shed by the concurrency limiter"""
+    logger.warning(f"🚦 Request shed ({e.status_code}): {e.detail}")
+    return JSONResponse(
+        status_code=e.status_code,
+        headers={"Retry-After": "1"},
+        content={
+            "error": "Hệ thống đang quá tải, vui lòng thử lại sau giây lát!"
+        }
+    )
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Expose latency histograms and counters in Prometheus text format"""
+    # Các gauge phiên đọc SQLite: render trong threadpool để không chặn event loop
+    return PlainTextResponse(await session_call(metrics.render), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/chat")
+async def chat(msg: Message, response: Response):
+    trace = start_trace()
+    start = time.perf_counter()
+    try:
+        async with chat_limiter.slot():
+            result = await _chat(msg)
+    except OverloadedError as e:
+        result = overloaded_response(e)
+
+    status = result.status_code if isinstance(result, Response) else 200
+    chat_requests.inc(endpoint="chat", status=str(status))
+    chat_seconds.observe(time.perf_counter() - start, endpoint="chat")
+    # Thời gian từng bước hiện trong tab Network của trình duyệt
+    timing = trace.server_timing()
+    if timing:
+        (result if isinstance(result, Response) else response).headers["Server-Timing"] = timing
+        logger.info(f"⏱️ Stage timings: {trace.summary()}")
+    return result
+
+async def _chat(msg: Message):
+    try:
+        logger.info(f"📝 Received message: {msg.message}")
+        
+        # Client không gửi session_id sẽ nhận một phiên mới thay vì dùng chung "default"
+        session_id = msg.session_id or session_store.new_session_id()
+        await session_call(session_store.append, session_id, True, msg.message)
+        history = await session_call(session_store.history, session_id, 5)  # Truyền 5 tin nhắn gần nhất
+        
+        if CHAT_PIPELINE == "functions":
+            # Lịch sử đã gồm tin nhắn hiện tại ở cuối
+            reply = await answer_with_functions(msg.message, history[:-1])
+        else:
+            tool_calls, reply, _ = await plan_turn(msg.message, history)
+            if tool_calls:
+                reply = await answer_with_tools(msg.message, tool_calls)
+            else:
+                # Nếu không có JSON hoặc không parse được, trả về text thường
+                logger.info("📢 No tool call needed, returning direct response")
+        
+        # Add bot response to history
+        await session_call(session_store.append, session_id, False, reply)
+        
+        return {"reply": reply, "session_id": session_id}
 
     except Exception as e:
         error_msg = f"🔥 Backend error: {str(e)}"
@@ -299,4 +1039,277 @@ Response:"""
             content={
                 "error": "Xin lỗi, đã có lỗi xảy ra. Vui lòng thử lại sau!"
             }
-        )
\ No newline at end of file
+        )
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_model_text(prompt: str) -> AsyncIterator[str]:
+    """Yield reply chunks from the model's streaming API.
+
+    Generation runs in its own task; closing this iterator (for example when
+    the client disconnects) cancels the task and with it the upstream call.
+    """
+    chunks: asyncio.Queue = asyncio.Queue()
+    end = object()
+
+    async def produce():
+        start = time.perf_counter()
+        completion_tokens = 0
+        try:
+            llm = await load_model()
+            # Hạn chót bao cả stream: mỗi chunk chỉ chờ phần thời gian còn lại; không hedge lời gọi stream
+            async for chunk in llm_client.stream(
+                "final_stream", lambda: llm.generate_content_async(prompt, stream=True)
+            ):
+                completion_tokens += estimate_tokens(chunk.text)
+                await chunks.put(chunk.text)
+        except Exception as e:
+            llm_requests.inc(call="final_stream", outcome="error")
+            await chunks.put(e)
+        else:
+            llm_requests.inc(call="final_stream", outcome="ok")
+            llm_tokens.inc(estimate_tokens(prompt), call="final_stream", kind="prompt")
+            llm_tokens.inc(completion_tokens, call="final_stream", kind="completion")
+            await chunks.put(end)
+        finally:
+            llm_seconds.observe(time.perf_counter() - start, call="final_stream")
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await chunks.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+
+async def _chat_events(msg: Message, request: Request) -> AsyncIterator[str]:
+    trace = start_trace()
+    start = time.perf_counter()
+    status = 200
+    try:
+        async with chat_limiter.slot():
+            logger.info(f"📝 Received streaming message: {msg.message}")
+            session_id = msg.session_id or session_store.new_session_id()
+            history = await session_call(session_store.history, session_id, 4) + [
+                {"isUser": True, "text": msg.message}
+            ]
+
+            tool_calls, reply, source = await plan_turn(msg.message, history)
+            yield sse_event("routing", {
+                "source": source,
+                "tool": tool_calls[0].tool if tool_calls else None,
+                "input": tool_calls[0].input if tool_calls else None,
+                "calls": [call._asdict() for call in tool_calls],
+            })
+
+            if tool_calls:
+                with span(stage_seconds, stage="tools"):
+                    results = await run_tools(tool_calls)
+                for call, result in zip(tool_calls, results):
+                    yield sse_event("tool_result", {"tool": call.tool, "input": call.input, "result": result})
+                tool_result = merge_tool_results(tool_calls, results)
+
+                cache_key = reply_cache_key(tool_calls)
+                reply = reply_cache.get(cache_key)
+                if reply is not None:
+                    logger.info("💾 Reply cache hit")
+                    yield sse_event("token", {"text": reply})
+                else:
+                    parts = []
+                    try:
+                        with span(stage_seconds, stage="final"):
+                            async for text in stream_model_text(create_final_prompt(msg.message, tool_result)):
+                                if await request.is_disconnected():
+                                    logger.info("🔌 Client disconnected, cancelling generation")
+                                    status = 499
+                                    return
+                                parts.append(text)
+                                yield sse_event("token", {"text": text})
+                    except Exception as e:
+                        # Chưa gửi token nào thì vẫn trả được kết quả tool; đã gửi dở thì báo lỗi như cũ
+                        if parts or not is_unavailable(e):
+                            raise
+                        logger.warning(f"⚠️ LLM unavailable for the streamed answer, returning tool result: {str(e) or type(e).__name__}")
+                        llm_degraded.inc(call="final_stream")
+                        parts.append(tool_result)
+                        yield sse_event("token", {"text": tool_result})
+                    else:
+                        reply_cache.set(cache_key, "".join(parts).strip())
+                    reply = "".join(parts).strip()
+            else:
+                yield sse_event("token", {"text": reply})
+
+            # Chỉ lưu lượt hội thoại khi đã stream xong
+            await session_call(session_store.append, session_id, True, msg.message)
+            await session_call(session_store.append, session_id, False, reply)
+            logger.info(f"🎯 Streamed response: {reply}")
+            logger.info(f"⏱️ Stage timings: {trace.summary()}")
+            # Header đã gửi trước khi stream nên thời gian từng bước đi kèm sự kiện done
+            yield sse_event("done", {
+                "reply": reply,
+                "session_id": session_id,
+                "timings_ms": {name: round(seconds * 1e3, 1) for name, seconds in trace.spans},
+            })
+
+    except OverloadedError as e:
+        status = e.status_code
+        logger.warning(f"🚦 Stream shed ({e.status_code}): {e.detail}")
+        yield sse_event("error", {"status": e.status_code, "error": "Hệ thống đang quá tải, vui lòng thử lại sau giây lát!"})
+    except Exception as e:
+        status = 500
+        logger.error(f"🔥 Backend stream error: {str(e)}")
+        yield sse_event("error", {"status": 500, "error": "Xin lỗi, đã có lỗi xảy ra. Vui lòng thử lại sau!"})
+    finally:
+        chat_requests.inc(endpoint="chat_stream", status=str(status))
+        chat_seconds.observe(time.perf_counter() - start, endpoint="chat_stream")
+
+@app.post("/chat/stream")
+async def chat_stream(msg: Message, request: Request):
+    """Stream a chat turn as Server-Sent Events: routing, tool_result, token..., done"""
+    try:
+        # Từ chối sớm với mã 429 khi hàng đợi đã đầy, trước khi mở stream
+        chat_limiter.check()
+    except OverloadedError as e:
+        return overloaded_response(e)
+
+    return StreamingResponse(
+        _chat_events(msg, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class ChatBatch:
+    def __init__(self, concurrency: int):
+        """Answer independent messages concurrently, sharing identical work within the batch"""
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.items: Dict[str, asyncio.Task] = {}
+        self.replies: Dict[tuple, asyncio.Task] = {}
+
+    async def _limited(self, awaitable):
+        # Giới hạn số lời gọi model đang chạy của cả batch
+        async with self.semaphore:
+            return await awaitable
+
+    async def _answer(self, message: str) -> str:
+        tool_calls, reply, _ = await self._limited(plan_turn(message, []))
+        if not tool_calls:
+            return reply
+
+        # Các câu hỏi dẫn tới cùng các lời gọi tool dùng chung kết quả tool và câu trả lời
+        key = reply_cache_key(tool_calls)
+        task = self.replies.get(key)
+        if task is None:
+            task = self.replies[key] = asyncio.create_task(
+                self._limited(answer_with_tools(message, tool_calls))
+            )
+        return await asyncio.shield(task)
+
+    def submit(self, message: str) -> asyncio.Task:
+        """Schedule one message; identical messages in the batch share a task"""
+        key = fold_text(message)
+        task = self.items.get(key)
+        if task is None:
+            task = self.items[key] = asyncio.create_task(self._answer(message))
+        return task
+
+    def cancel(self) -> None:
+        for task in list(self.items.values()) + list(self.replies.values()):
+            task.cancel()
+
+async def batch_result(index: int, task: asyncio.Task) -> dict:
+    """Wait for one batch item and report its reply or error"""
+    try:
+        reply = await asyncio.shield(task)
+        return {"index": index, "reply": reply}
+    except Exception as e:
+        logger.error(f"🔥 Batch item {index} failed: {str(e)}")
+        return {"index": index, "error": "Xin lỗi, đã có lỗi xảy ra. Vui lòng thử lại sau!"}
+
+async def _batch_events(batch: ChatBatch, messages: List[str]) -> AsyncIterator[str]:
+    try:
+        async with chat_limiter.slot():
+            tasks = [batch.submit(message) for message in messages]
+            failed = 0
+            for result in asyncio.as_completed([batch_result(i, task) for i, task in enumerate(tasks)]):
+                result = await result
+                failed += "error" in result
+                yield sse_event("result", result)
+            yield sse_event("done", {"count": len(tasks), "failed": failed})
+    except OverloadedError as e:
+        logger.warning(f"🚦 Batch shed ({e.status_code}): {e.detail}")
+        yield sse_event("error", {"status": e.status_code, "error": "Hệ thống đang quá tải, vui lòng thử lại sau giây lát!"})
+    finally:
+        batch.cancel()
+
+@app.post("/chat/batch")
+async def chat_batch(req: BatchRequest):
+    """Answer a list of independent messages concurrently.
+
+    Results keep input order, each with either "reply" or "error". With
+    stream=true each result is sent as a Server-Sent Event as soon as it
+    completes. The whole batch takes one slot of the chat limiter.
+    """
+    if not req.messages:
+        raise HTTPException(status_code=400, detail="messages must not be empty")
+    if len(req.messages) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {CHAT_BATCH_MAX_ITEMS} messages per batch")
+    try:
+        chat_limiter.check()
+    except OverloadedError as e:
+        return overloaded_response(e)
+
+    logger.info(f"📦 Received batch of {len(req.messages)} messages")
+    batch = ChatBatch(CHAT_BATCH_CONCURRENCY)
+
+    if req.stream:
+        return StreamingResponse(
+            _batch_events(batch, req.messages),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        async with chat_limiter.slot():
+            tasks = [batch.submit(message) for message in req.messages]
+            results = await asyncio.gather(*(batch_result(i, task) for i, task in enumerate(tasks)))
+    except OverloadedError as e:
+        return overloaded_response(e)
+    finally:
+        batch.cancel()
+
+    return {"results": results}
+
+async def profile_requests(request: Request, call_next):
+    """Sample the stacks of a request sent with `X-Profile: 1` and save them as a flamegraph input"""
+    if request.headers.get("x-profile") != "1":
+        return await call_next(request)
+    if ADMIN_TOKEN and request.headers.get("x-admin-token") != ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"detail": "Forbidden"})
+
+    # Với response dạng stream, chỉ lấy mẫu tới khi header được gửi
+    profiler = SamplingProfiler(PROFILE_INTERVAL).start()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop()
+    path = await run_in_threadpool(profiler.write, PROFILE_DIR)
+    logger.info(f"🔬 Profile of {request.url.path} ({profiler.samples} samples) written to {path}")
+    response.headers["X-Profile-File"] = path
+    return response
+
+# Profiler chỉ được gắn khi bật rõ ràng, để request thường không tốn thêm gì
+if PROFILING_ENABLED:
+    app.middleware("http")(profile_requests)
+
+startup.mark("app")
+logger.info(
+    f"🚀 Startup finished in {startup.ready():.0f}ms ("
+    + ", ".join(f"{name} {ms:.0f}ms" for name, ms in startup.phases.items()) + ")"
+)
@@ -1,12 +1,103 @@
-from typing import Callable
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+class ToolInputError(ValueError):
+    """Raised when a tool input does not match the tool's argument schema"""
+
+class ToolArg(NamedTuple):
+    """One typed argument of a tool"""
+    name: str
+    type: type = str
 
 class Tool:
-    def __init__(self, name: str, description: str, func: Callable):
-        """Initialize a tool with name, description and function"""
+    def __init__(self, name: str, description: str, func: Callable,
+                 args: Sequence[ToolArg] = (ToolArg("query"),), timeout: Optional[float] = None):
+        """Initialize a tool with name, description, function and argument schema.
+
+        The raw input is a string; tools with several arguments take them
+        comma-separated in schema order, e.g. 'Phở Bò, 4'.
+        """
         self.name = name
         self.description = description
         self.func = func
+        self.args = tuple(args)
+        self.timeout = timeout
+
+    @property
+    def signature(self) -> str:
+        """Call signature shown to the model, e.g. portion_calculator(recipe_name: str, servings: int)"""
+        params = ", ".join(f"{arg.name}: {arg.type.__name__}" for arg in self.args)
+        return f"{self.name}({params})"
 
-    def execute(self, input_data: str) -> str:
+    def parse_input(self, input_data: Any) -> Tuple:
+        """Split and convert a raw input into the tool's typed arguments"""
+        if isinstance(input_data, dict):
+            missing = [arg.name for arg in self.args if arg.name not in input_data]
+            if missing:
+                raise ToolInputError(f"{self.name}: missing {', '.join(missing)}")
+            values = [input_data[arg.name] for arg in self.args]
+        elif len(self.args) == 1:
+            # Tham số duy nhất nhận nguyên chuỗi, kể cả dấu phẩy (vd. danh sách nguyên liệu)
+            values = [input_data]
+        else:
+            # Tách từ phải sang để tên món có dấu phẩy vẫn nằm trọn trong tham số đầu
+            values = str(input_data).rsplit(",", len(self.args) - 1)
+            if len(values) != len(self.args):
+                raise ToolInputError(f"{self.name}: expected {self.signature}")
+
+        parsed = []
+        for arg, value in zip(self.args, values):
+            value = str(value).strip()
+            if not value:
+                raise ToolInputError(f"{self.name}: {arg.name} is empty")
+            try:
+                parsed.append(arg.type(value))
+            except ValueError:
+                raise ToolInputError(f"{self.name}: {arg.name} must be {arg.type.__name__}, got {value!r}")
+        return tuple(parsed)
+
+    def format_input(self, input_data: Any) -> str:
+        """Canonical string form of an input, used in tool calls and cache keys"""
+        return ", ".join(str(value) for value in self.parse_input(input_data))
+
+    def execute(self, input_data: Any) -> str:
         """Execute the tool's function with given input"""
-        return self.func(input_data) 
\ No newline at end of file
+        return self.func(*self.parse_input(input_data))
+
+class ToolCall(NamedTuple):
+    """A resolved request to run one tool with a raw string input"""
+    tool: str
+    input: str
+
+class ToolRegistry:
+    def __init__(self, tools: Sequence[Tool] = ()):
+        """Map tool names to tools for O(1) dispatch"""
+        self._tools: Dict[str, Tool] = {}
+        for tool in tools:
+            self.register(tool)
+
+    def register(self, tool: Tool) -> None:
+        if tool.name in self._tools:
+            raise ValueError(f"Tool {tool.name} is already registered")
+        self._tools[tool.name] = tool
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def validate(self, name: str, input_data: Any) -> ToolCall:
+        """Check a requested call against the registry and return it in canonical form"""
+        tool = self._tools.get(name)
+        if tool is None:
+            raise ToolInputError(f"Unknown tool: {name}")
+        return ToolCall(tool.name, tool.format_input(input_data))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self) -> Iterator[Tool]:
+        return iter(self._tools.values())
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def names(self) -> List[str]:
+        return list(self._tools)
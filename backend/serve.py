@@ -0,0 +1,117 @@
+"""Production launcher: load the app once, then fork worker processes.
+
+`uvicorn --workers N` starts every worker from scratch, so each one parses
+the recipe data and builds its indexes again. Here the parent imports main
+(catalogue, indexes, tools, app), freezes the heap with gc.freeze() so the
+collector does not touch those objects and their pages stay shared
+copy-on-write, and forks N workers that all accept on one listening socket.
+Sessions go to the SQLite store so a conversation can continue on any
+worker. Dead workers are restarted; SIGTERM/SIGINT stop them all.
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+logger = logging.getLogger("serve")
+
+
+def run_worker(sock: socket.socket, args) -> None:
+    import uvicorn
+    import main
+
+    # Worker chỉ cần tự tắt khi nhận SIGTERM/SIGINT; uvicorn cài handler riêng
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(main.app, log_level=args.log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(sock, args)
+        except BaseException:
+            logger.exception("💥 Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--log-level', default='warning')
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if not hasattr(os, 'fork'):
+            sys.exit("serve.py needs os.fork(); use `uvicorn main:app` with one worker on this platform")
+        # Phiên hội thoại phải nằm ngoài tiến trình để mọi worker cùng thấy
+        os.environ.setdefault("SESSION_BACKEND", "sqlite")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import main  # noqa: F401  (nạp dữ liệu và chỉ mục một lần trước khi fork)
+    if args.workers > 1 and main.SESSION_BACKEND != "sqlite":
+        logger.warning("⚠️ SESSION_BACKEND is not sqlite: conversations will not survive switching workers")
+
+    # Đưa mọi đối tượng hiện có vào thế hệ vĩnh viễn: GC của worker không ghi vào các trang dùng chung
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers: Dict[int, float] = {spawn(sock, args): time.monotonic() for _ in range(args.workers)}
+    logger.warning(f"🚀 Serving on {args.host}:{args.port} with {args.workers} workers: {sorted(workers)}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning(f"⚠️ Worker {pid} exited with status {status}, restarting")
+        # Worker chết ngay sau khi khởi động thì chờ một chút để không fork liên tục
+        if time.monotonic() - started < 1:
+            time.sleep(1)
+        workers[spawn(sock, args)] = time.monotonic()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+    main_cli()
@@ -0,0 +1,67 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed instead of being queued"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        """Bound in-flight requests and the number of requests waiting for a slot"""
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def check(self) -> None:
+        """Raise OverloadedError(429) if a new request would find the wait queue full"""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError(429, "too many queued requests")
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one concurrency slot for the duration of the block.
+
+        Raises OverloadedError(429) when the wait queue is already full and
+        OverloadedError(503) when no slot frees up within queue_timeout.
+        """
+        self.check()
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise OverloadedError(503, "timed out waiting for a free slot")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Return current queue depth and shed-request counters"""
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
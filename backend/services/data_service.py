@@ -1,34 +1,51 @@
-import pandas as pd
+import math
 import os
-from typing import Dict, Any, List, Sequence
+from typing import Dict, Any, List, Optional, Sequence
+
+from tools.ingredient_index import IngredientIndex
+from tools.recipe_catalog import NUTRIENTS, RecipeCatalog
+from tools.recipe_index import RecipeIndex
 
 class DataService:
-    def __init__(self):
+    def __init__(self, catalog: Optional[RecipeCatalog] = None):
         self.data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-        self.recipes_df = pd.read_csv(os.path.join(self.data_dir, 'recipes.csv'))
+        # Dùng chung catalog với CookingTools nếu được truyền vào, tránh parse CSV lần nữa
+        self.catalog = catalog or RecipeCatalog.load(os.path.join(self.data_dir, 'recipes.csv'))
+        self.index = RecipeIndex(self.catalog)
+        self.ingredient_index = IngredientIndex(self.catalog)
         
     def get_recipe(self, name: str) -> Dict[str, Any]:
         """Get recipe by name"""
-        recipe = self.recipes_df[self.recipes_df['name'].str.lower() == name.lower()]
-        if not recipe.empty:
-            return recipe.iloc[0].to_dict()
+        recipe = self.index.lookup(name)
+        if recipe is not None:
+            return recipe._asdict()
         return {}
 
     def search_recipes(self, query: str, by: str = 'ingredients') -> Sequence[Dict[str, Any]]:
         """Search recipes by ingredients or cuisine"""
         if by == 'ingredients':
-            matches = self.recipes_df[self.recipes_df['ingredients'].str.contains(query, case=False, na=False)]
+            # Tra chỉ mục ngược theo tên nguyên liệu, không quét chuỗi con
+            positions = self.ingredient_index.recipes_with(query).tolist()
         elif by == 'cuisine':
-            matches = self.recipes_df[self.recipes_df['cuisine'].str.contains(query, case=False, na=False)]
+            query = query.lower()
+            positions = [
+                position for position, cuisine in enumerate(self.catalog.cuisines)
+                if query in cuisine.lower()
+            ]
         else:
             return []
         
-        return matches.to_dict('records')
+        return [self.catalog.record(position)._asdict() for position in positions]
 
     def get_nutrition_info(self, recipe_name: str) -> Dict[str, Any]:
         """Get nutritional information for a recipe"""
-        recipe = self.get_recipe(recipe_name)
-        return recipe.get('nutrition', {})
+        position = self.index.position(recipe_name)
+        if position is None:
+            return {}
+        # Đọc thẳng một dòng của ma trận dinh dưỡng đã parse sẵn, không dựng cả bản ghi
+        # Bỏ chất không có trong dữ liệu (nan) thay vì trả về NaN
+        values = self.catalog.nutrition[position].tolist()
+        return {name: value for name, value in zip(NUTRIENTS, values) if not math.isnan(value)}
 
     def get_cooking_time(self, recipe_name: str) -> Dict[str, int]:
         """Get prep and cook time for a recipe"""
@@ -36,4 +53,4 @@ class DataService:
         return {
             'prep_time': recipe.get('prep_time', 0),
             'cook_time': recipe.get('cook_time', 0)
-        } 
\ No newline at end of file
+        } 
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Union
+
+from services.llm_client import UpstreamError
+from tools.recipe_catalog import normalize_name
+
+# Từ khóa -> (tool, input cố định hoặc None để dùng tên món trong câu hỏi)
+KEYWORD_TOOLS = [
+    (("duoi 500 calo", "it calo", "nhieu protein"), "nutrition_search", "calories<500, protein>=30"),
+    (("tong dinh duong", "thuc don"), "meal_nutrition", None),
+    (("dinh duong", "calo", "protein", "nutrition"), "nutrition_info", None),
+    (("nguyen lieu", "ingredient", "can gi"), "list_ingredients", None),
+    (("bao lau", "thoi gian", "how long"), "cooking_timer", None),
+    (("di cho", "can mua", "shopping"), "shopping_list", None),
+    (("cho 2 nguoi", "cho 4 nguoi", "cho 6 nguoi"), "portion_calculator", None),
+    (("goi y", "suggest", "recommend", "nen an gi"), "recipe_recommender", "time:30, servings:4"),
+]
+PANTRY_MARKERS = ("toi co", "i have", "con co")
+# Tool đã bao trọn câu hỏi: khớp rồi thì không xét các từ khóa sau (vd. "calo" của nutrition_info)
+EXCLUSIVE_TOOLS = {"shopping_list", "meal_nutrition", "nutrition_search"}
+NO_RECIPE_REPLY = "Xin lỗi, tôi không có công thức này. Bạn có muốn tôi gợi ý món khác không?"
+
+
+class FakeModelError(UpstreamError):
+    """Injected failure, stands in for a Gemini 503"""
+
+
+class FakeFunctionCall(NamedTuple):
+    name: str
+    args: Dict[str, Any]
+
+
+class FakePart(NamedTuple):
+    text: str = ""
+    function_call: Optional[FakeFunctionCall] = None
+
+
+class FakeContent(NamedTuple):
+    role: str
+    parts: List[FakePart]
+
+
+class FakeCandidate(NamedTuple):
+    content: FakeContent
+
+
+class FakeResponse:
+    def __init__(self, text: str, calls: Sequence[FakeFunctionCall] = ()):
+        self.text = text
+        parts = [FakePart(function_call=call) for call in calls] or [FakePart(text)]
+        self.candidates = [FakeCandidate(FakeContent("model", parts))]
+
+
+class FakeStream:
+    """Async iterator of response chunks, like a streamed Gemini response"""
+
+    def __init__(self, text: str, chunk_delay: float, chunk_words: int = 4):
+        words = text.split(" ")
+        self._chunks = [
+            " ".join(words[i:i + chunk_words]) + (" " if i + chunk_words < len(words) else "")
+            for i in range(0, len(words), chunk_words)
+        ]
+        self._chunk_delay = chunk_delay
+
+    async def __aiter__(self) -> AsyncIterator[FakeResponse]:
+        for chunk in self._chunks:
+            await asyncio.sleep(self._chunk_delay)
+            yield FakeResponse(chunk)
+
+
+def parse_latency(spec: Union[float, str]) -> Callable[[random.Random], float]:
+    """Build a latency sampler (seconds) from a spec.
+
+    Accepts a number or 'fixed:S', 'uniform:LOW,HIGH', 'exponential:MEAN',
+    'lognormal:MEDIAN,SIGMA'.
+    """
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, params = str(spec).partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    values = [float(value) for value in params.split(",")]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FakeModel:
+    """Offline stand-in for genai.GenerativeModel.
+
+    Analysis prompts get tool-call JSON chosen from keywords and the dish
+    names the model was given; final prompts get a reply built from the tool
+    result. A list of contents is treated as a function-calling conversation:
+    the same choice comes back as function calls, function responses as a
+    reply. Latency and failures are drawn from an RNG seeded by the prompt,
+    so the same prompt behaves the same way in every run.
+    """
+
+    def __init__(self, latency: Union[float, str] = 0.2, error_rate: float = 0.0,
+                 seed: int = 0, dishes: Iterable[str] = ()):
+        self.latency_spec = latency
+        self._sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.seed = seed
+        # Tên món dài trước để "Phở Bò Tái" không bị khớp thành "Phở Bò"
+        self._dishes = sorted(
+            ((normalize_name(name), name) for name in dishes),
+            key=lambda item: -len(item[0]),
+        )
+        self._seen: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def _rng(self, prompt: str) -> random.Random:
+        # Lần gọi thứ n với cùng một prompt luôn cho cùng độ trễ/lỗi, không phụ thuộc thứ tự chạy
+        digest = zlib.crc32(prompt.encode("utf-8"))
+        with self._lock:
+            self.calls += 1
+            occurrence = self._seen[digest] = self._seen.get(digest, 0) + 1
+        return random.Random(f"{self.seed}:{digest}:{occurrence}")
+
+    def _find_dish(self, text: str) -> Optional[str]:
+        padded = f" {text} "
+        for normalized, name in self._dishes:
+            if f" {normalized} " in padded:
+                return name
+        return None
+
+    def _analysis_calls(self, query: str) -> List[dict]:
+        text = normalize_name(query)
+        dish = self._find_dish(text)
+        if any(marker in text for marker in PANTRY_MARKERS):
+            items = text.split(" co ", 1)[-1].split(" thi ")[0]
+            return [{"tool": "pantry_recipes", "input": items}]
+
+        calls: List[dict] = []
+        for keywords, tool, fixed_input in KEYWORD_TOOLS:
+            if not any(keyword in text for keyword in keywords):
+                continue
+            if fixed_input is not None:
+                calls.append({"tool": tool, "input": fixed_input})
+            elif dish is not None:
+                servings = "".join(ch for ch in text.split(" cho ")[-1] if ch.isdigit()) or "4"
+                if tool == "portion_calculator":
+                    calls.append({"tool": tool, "input": f"{dish}, {servings}"})
+                elif tool in ("shopping_list", "meal_nutrition"):
+                    calls.append({"tool": tool, "input": f"{dish}:{servings}"})
+                else:
+                    calls.append({"tool": tool, "input": dish})
+            else:
+                continue
+            if tool in EXCLUSIVE_TOOLS:
+                break
+        if not calls and dish is not None:
+            calls.append({"tool": "recipe_finder", "input": dish})
+        return calls
+
+    def _reply(self, prompt: str) -> str:
+        if "Tool result:" in prompt:
+            result = prompt.split("Tool result:", 1)[1].split("REQUIREMENTS:", 1)[0].strip()
+            return f"Chef gợi ý: {' '.join(result.split()[:40])}"
+        calls = self._analysis_calls(prompt.rsplit("User query:", 1)[-1].strip())
+        if not calls:
+            return NO_RECIPE_REPLY
+        return json.dumps(calls[0] if len(calls) == 1 else calls, ensure_ascii=False)
+
+    def _conversation_reply(self, contents: Sequence[Any], tools: Any, tool_config: Any) -> FakeResponse:
+        """Reply to a function-calling conversation: call functions for a question, render their results"""
+        parts = contents[-1]["parts"]
+        results = [part["function_response"]["response"]["result"] for part in parts if "function_response" in part]
+        if results:
+            return FakeResponse(f"Chef gợi ý: {' '.join(' '.join(results).split()[:40])}")
+
+        mode = ((tool_config or {}).get("function_calling_config") or {}).get("mode", "AUTO")
+        declarations = {
+            declaration["name"]: list(declaration["parameters"]["properties"])
+            for tool in tools or () for declaration in tool["function_declarations"]
+        }
+        calls = [] if mode == "NONE" else self._analysis_calls(parts[-1]["text"])
+        function_calls = []
+        for call in calls:
+            params = declarations.get(call["tool"])
+            if params:
+                # Chuỗi input kiểu cũ được tách theo thứ tự tham số, như Tool.parse_input
+                values = call["input"].rsplit(",", len(params) - 1)
+                function_calls.append(FakeFunctionCall(call["tool"], {
+                    name: value.strip() for name, value in zip(params, values)
+                }))
+        if not function_calls:
+            return FakeResponse(NO_RECIPE_REPLY)
+        return FakeResponse("", function_calls)
+
+    def _respond(self, prompt: Any, tools: Any, tool_config: Any) -> FakeResponse:
+        if isinstance(prompt, str):
+            return FakeResponse(self._reply(prompt))
+        return self._conversation_reply(prompt, tools, tool_config)
+
+    @staticmethod
+    def _key(prompt: Any) -> str:
+        return prompt if isinstance(prompt, str) else json.dumps(prompt[-1], ensure_ascii=False, default=str)
+
+    def _fail(self, rng: random.Random) -> bool:
+        if rng.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return True
+        return False
+
+    def generate_content(self, prompt: Any, tools: Any = None, tool_config: Any = None) -> FakeResponse:
+        rng = self._rng(self._key(prompt))
+        time.sleep(max(self._sample_latency(rng), 0.0))
+        if self._fail(rng):
+            raise FakeModelError("injected model failure")
+        return self._respond(prompt, tools, tool_config)
+
+    async def generate_content_async(self, prompt: Any, stream: bool = False,
+                                     tools: Any = None, tool_config: Any = None):
+        """Like Gemini: prompt is a string, or a list of contents for function calling"""
+        rng = self._rng(self._key(prompt))
+        latency = max(self._sample_latency(rng), 0.0)
+        if stream:
+            # Chunk đầu tiên tới sau một nửa độ trễ, phần còn lại rải đều
+            await asyncio.sleep(latency / 2)
+            if self._fail(rng):
+                raise FakeModelError("injected model failure")
+            text = self._reply(prompt)
+            return FakeStream(text, latency / 2 / max(len(text.split()) // 4, 1))
+        await asyncio.sleep(latency)
+        if self._fail(rng):
+            raise FakeModelError("injected model failure")
+        return self._respond(prompt, tools, tool_config)
@@ -0,0 +1,87 @@
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+from models.tool import Tool
+from services.prompt_compiler import estimate_tokens, truncate_to_tokens
+
+# Kiểu Python của ToolArg -> kiểu trong schema khai báo hàm
+SCHEMA_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def function_declarations(tools: Sequence[Tool]) -> List[Dict[str, Any]]:
+    """Describe tools as function declarations the model can call natively"""
+    return [
+        {
+            "name": tool.name,
+            "description": tool.description,
+            "parameters": {
+                "type": "object",
+                "properties": {arg.name: {"type": SCHEMA_TYPES.get(arg.type, "string")} for arg in tool.args},
+                "required": [arg.name for arg in tool.args],
+            },
+        }
+        for tool in tools
+    ]
+
+
+def _parts(response: Any) -> Sequence[Any]:
+    candidates = getattr(response, "candidates", None)
+    return candidates[0].content.parts if candidates else ()
+
+
+def function_calls(response: Any) -> List[Tuple[str, Dict[str, Any]]]:
+    """The (name, args) function calls requested in a model response, in order"""
+    calls = []
+    for part in _parts(response):
+        call = getattr(part, "function_call", None)
+        if call is None or not call.name:
+            continue
+        # Số trong args của Gemini luôn là float; 4.0 -> 4 để tham số int nhận được
+        args = {
+            key: int(value) if isinstance(value, float) and value.is_integer() else value
+            for key, value in dict(call.args or {}).items()
+        }
+        calls.append((call.name, args))
+    return calls
+
+
+def response_text(response: Any) -> str:
+    """Text of a response, empty when it only holds function calls"""
+    try:
+        return response.text
+    except ValueError:
+        # Gemini báo lỗi khi đọc .text của response chỉ chứa function_call
+        return "".join(getattr(part, "text", "") or "" for part in _parts(response))
+
+
+def completion_text(response: Any) -> str:
+    """Everything the model generated, for token accounting"""
+    calls = function_calls(response)
+    return response_text(response) + (json.dumps(calls, ensure_ascii=False) if calls else "")
+
+
+def history_contents(history: List[dict], max_message_tokens: int) -> List[Dict[str, Any]]:
+    """Conversation history as model contents, each message capped to max_message_tokens"""
+    return [
+        {
+            "role": "user" if message.get("isUser") else "model",
+            "parts": [{"text": truncate_to_tokens(message.get("text", ""), max_message_tokens)}],
+        }
+        for message in history
+    ]
+
+
+def function_response_content(results: Sequence[Tuple[str, str]]) -> Dict[str, Any]:
+    """The turn that hands (function name, result) pairs back to the model"""
+    return {
+        "role": "user",
+        "parts": [{"function_response": {"name": name, "response": {"result": result}}} for name, result in results],
+    }
+
+
+def contents_tokens(contents: Sequence[Any]) -> int:
+    """Rough token estimate of a contents list, matching estimate_tokens for prompts"""
+    return sum(
+        estimate_tokens(json.dumps(content, ensure_ascii=False) if isinstance(content, dict) else str(content))
+        for content in contents
+    )
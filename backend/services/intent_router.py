@@ -0,0 +1,102 @@
+import re
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+from models.tool import ToolCall
+from tools.recipe_catalog import RecipeRecord, normalize_name
+
+# Các mẫu câu chạy trên câu hỏi đã chuẩn hóa (chữ thường, bỏ dấu tiếng Việt).
+# Thứ tự quan trọng: dinh dưỡng và nguyên liệu phải được xét trước "nấu X".
+ROUTE_PATTERNS: List[Tuple[str, str, List[str]]] = [
+    ("nutrition", "nutrition_info", [
+        r"^(?:gia tri |chat |thong tin )?dinh duong(?: cua| trong| cho)?(?: mon)? (?P<dish>.+)$",
+        r"^(?:calories|calo|protein)(?: of| in| for| cua| trong)?(?: mon)? (?P<dish>.+)$",
+        r"^nutrition(?:al)?(?: facts| info(?:rmation)?| values?)?(?: for| of| in)? (?P<dish>.+)$",
+        r"^how many calories (?:are )?(?:in|does) (?P<dish>.+?)(?: have)?$",
+        r"^(?:mon )?(?P<dish>.+?) (?:co )?bao nhieu calo(?:ries)?$",
+    ]),
+    ("ingredients", "list_ingredients", [
+        r"^(?:what are the )?ingredients (?:for|of|in|to make) (?P<dish>.+)$",
+        r"^what do i need to (?:make|cook) (?P<dish>.+)$",
+        r"^nguyen lieu(?: de| cho| lam| nau)*(?: mon)? (?P<dish>.+)$",
+        r"^(?:nau |lam )?(?:mon )?(?P<dish>.+?) can (?:nhung )?(?:nguyen lieu )?gi$",
+    ]),
+    ("timer", "cooking_timer", [
+        r"^how long (?:does it take |do i need )?to (?:cook|make) (?P<dish>.+)$",
+        r"^thoi gian (?:nau|lam)(?: mon)? (?P<dish>.+)$",
+        r"^(?:nau|lam)(?: mon)? (?P<dish>.+?) (?:mat|trong|het) bao lau$",
+    ]),
+    ("recipe", "recipe_finder", [
+        r"^(?:how (?:do i |to )?(?:make|cook|prepare)|recipe (?:for|of)|(?:i )?want to (?:cook|make)|cook|prepare|make) (?P<dish>.+)$",
+        r"^(?:toi )?(?:muon |can )?(?:cach|huong dan|cong thuc)(?: nau| lam)?(?: mon)? (?P<dish>.+)$",
+        r"^(?:toi )?muon (?:nau|lam)(?: mon)? (?P<dish>.+)$",
+        r"^(?:nau|lam) (?:mon )?(?P<dish>.+?)(?: nhu the nao| the nao| ra sao)?$",
+    ]),
+]
+
+# Từ đệm cuối câu không thuộc tên món
+_TRAILING_FILLER = re.compile(r"(?: (?:please|nhe|nha|vay|di|a|voi|duoc khong))+$")
+_PUNCTUATION = re.compile(r"[?!.,;:\"']+")
+
+
+class IntentRouter:
+    def __init__(self, lookup: Callable[[str], Optional[RecipeRecord]]):
+        """Route templated queries straight to a tool when the dish name matches exactly.
+
+        lookup must not match fuzzily: a partial or misspelled name is ambiguous
+        and goes to the LLM, whose tools can suggest the closest dishes.
+        """
+        self.lookup = lookup
+        self.routes: List[Tuple[str, str, List[Pattern]]] = [
+            (route, tool, [re.compile(pattern) for pattern in patterns])
+            for route, tool, patterns in ROUTE_PATTERNS
+        ]
+        self.hits: Dict[str, int] = {route: 0 for route, _, _ in ROUTE_PATTERNS}
+        self.misses: Dict[str, int] = {route: 0 for route, _, _ in ROUTE_PATTERNS}
+        self.hits["name"] = 0
+        self.fallbacks = 0
+
+    def _resolve(self, dish: str) -> Optional[RecipeRecord]:
+        dish = _TRAILING_FILLER.sub("", dish.strip())
+        return self.lookup(dish) if dish else None
+
+    def route(self, query: str) -> Optional[ToolCall]:
+        """Return a tool call for an unambiguous query, or None to fall back to the LLM"""
+        text = " ".join(_PUNCTUATION.sub(" ", normalize_name(query)).split())
+
+        matched_route = None
+        for route, tool, patterns in self.routes:
+            for pattern in patterns:
+                match = pattern.match(text)
+                if not match:
+                    continue
+                matched_route = matched_route or route
+                recipe = self._resolve(match.group("dish"))
+                if recipe is not None:
+                    self.hits[route] += 1
+                    return ToolCall(tool, recipe.recipe_name)
+
+        # Câu hỏi chỉ gồm đúng tên món -> trả công thức
+        recipe = self._resolve(text)
+        if recipe is not None:
+            self.hits["name"] += 1
+            return ToolCall("recipe_finder", recipe.recipe_name)
+
+        if matched_route is not None:
+            # Khớp mẫu câu nhưng không nhận ra tên món: để LLM xử lý
+            self.misses[matched_route] += 1
+        self.fallbacks += 1
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        """Return per-route hit/miss counters"""
+        routed = sum(self.hits.values())
+        total = routed + self.fallbacks
+        return {
+            "routes": {
+                route: {"hits": self.hits[route], "misses": self.misses.get(route, 0)}
+                for route in self.hits
+            },
+            "routed": routed,
+            "fallbacks": self.fallbacks,
+            "hit_rate": routed / total if total else 0.0,
+        }
@@ -0,0 +1,285 @@
+import asyncio
+import bisect
+import random
+import sys
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Mã HTTP của lỗi tạm thời phía upstream: đáng thử lại và tính vào circuit breaker
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the upstream while the circuit breaker is open"""
+
+
+class UpstreamError(RuntimeError):
+    """An upstream failure with an HTTP status in `code` (used by the offline fake model)"""
+    code = 503
+
+
+def _upstream_errors() -> Tuple[type, ...]:
+    # Không import SDK Gemini ở đây: chỉ dùng lớp lỗi khi SDK đã được load_model() nạp
+    google_errors = sys.modules.get("google.api_core.exceptions")
+    if google_errors is None:
+        return (UpstreamError,)
+    return (UpstreamError, google_errors.GoogleAPICallError)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection/OS errors and upstream 408/429/5xx are transient.
+
+    Anything else, such as a 400 from the API or a TypeError from our own
+    code, is not retried and does not count against the circuit breaker.
+    """
+    if isinstance(error, (asyncio.TimeoutError, OSError)):
+        return True
+    # Lỗi của google.api_core mang mã HTTP trong .code
+    return isinstance(error, _upstream_errors()) and getattr(error, "code", None) in RETRYABLE_CODES
+
+
+def is_unavailable(error: BaseException) -> bool:
+    """Whether a failed call means the upstream is unhealthy, so the reply should degrade"""
+    return isinstance(error, CircuitOpenError) or is_retryable(error)
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """Stop calling an upstream after consecutive transient failures.
+
+        After failure_threshold failures in a row the breaker opens and calls
+        fail fast for reset_timeout seconds. Then one probe call is let
+        through (half-open): success closes the breaker, failure reopens it.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; counts the call as rejected when not"""
+        if self.state == self.OPEN and self._clock() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opens += 1
+            self.state = self.OPEN
+            self.opened_at = self._clock()
+        self._probing = False
+
+    def release(self) -> None:
+        """Give the probe slot back when a call ended without a verdict (e.g. cancelled)"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 500):
+        """Latencies of the last `size` successful calls, for percentile estimates"""
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._sorted: list = []
+
+    def add(self, seconds: float) -> None:
+        if len(self._samples) == self._samples.maxlen:
+            oldest = self._samples[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._samples.append(seconds)
+        bisect.insort(self._sorted, seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._sorted:
+            return None
+        return self._sorted[min(int(q * len(self._sorted)), len(self._sorted) - 1)]
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+
+class LLMClient:
+    def __init__(self, deadline: float = 20.0, max_attempts: int = 3,
+                 backoff: float = 0.2, max_backoff: float = 2.0,
+                 hedge_quantile: Optional[float] = 0.95, hedge_min_delay: float = 0.2,
+                 hedge_min_samples: int = 20, hedge_max_ratio: float = 0.1,
+                 breaker: Optional[CircuitBreaker] = None, rng: Optional[random.Random] = None):
+        """Deadlines, hedging, retries and a circuit breaker around model calls.
+
+        Each call gets `deadline` seconds in total. An attempt still running
+        after the call site's hedge_quantile latency (at least
+        hedge_min_delay) gets a duplicate; the first success wins and the
+        other is cancelled. Hedges are capped at hedge_max_ratio of calls so
+        a slow upstream does not get double the load. Transient failures are
+        retried up to max_attempts with full-jitter exponential backoff.
+        While the breaker is open calls raise CircuitOpenError at once.
+        """
+        self.deadline = deadline
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_ratio = hedge_max_ratio
+        self.breaker = breaker or CircuitBreaker()
+        self._rng = rng or random.Random()
+        self._latency: Dict[str, LatencyWindow] = {}
+        # Bộ đếm theo call site, xuất ra /metrics và /stats
+        self.calls: Dict[str, int] = {}
+        self.hedges: Dict[str, int] = {}
+        self.hedge_wins: Dict[str, int] = {}
+        self.retries: Dict[str, int] = {}
+        self.deadlines: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+
+    @staticmethod
+    def _count(counter: Dict[str, int], call: str) -> None:
+        counter[call] = counter.get(call, 0) + 1
+
+    def hedge_delay(self, call: str) -> Optional[float]:
+        """Seconds to wait before hedging a call, None when it should not be hedged"""
+        window = self._latency.get(call)
+        if self.hedge_quantile is None or window is None or len(window) < self.hedge_min_samples:
+            return None
+        if sum(self.hedges.values()) >= self.hedge_max_ratio * sum(self.calls.values()):
+            return None
+        return max(self.hedge_min_delay, window.percentile(self.hedge_quantile))
+
+    async def _timed(self, call: str, request: Callable[[], Awaitable[T]]) -> T:
+        start = time.perf_counter()
+        result = await request()
+        self._latency.setdefault(call, LatencyWindow()).add(time.perf_counter() - start)
+        return result
+
+    async def _attempt(self, call: str, request: Callable[[], Awaitable[T]], hedge: bool) -> T:
+        primary = asyncio.ensure_future(self._timed(call, request))
+        pending = {primary}
+        try:
+            delay = self.hedge_delay(call) if hedge else None
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                # Lần gọi đầu đã chậm hơn p95: gửi thêm một bản, lấy bản nào xong trước
+                self._count(self.hedges, call)
+                pending.add(asyncio.ensure_future(self._timed(call, request)))
+            error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count(self.hedge_wins, call)
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, call: str, request: Callable[[], Awaitable[T]],
+                   deadline: Optional[float] = None, hedge: bool = True) -> T:
+        """Run request() under the deadline with hedging and retries.
+
+        request must start a new upstream call each time it is invoked.
+        Raises CircuitOpenError when the breaker is open, asyncio.TimeoutError
+        when the deadline passes, or the last error once retries run out.
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + (self.deadline if deadline is None else deadline)
+        self._count(self.calls, call)
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                self._count(self.rejected, call)
+                raise CircuitOpenError("LLM upstream is unavailable (circuit open)")
+            try:
+                result = await asyncio.wait_for(self._attempt(call, request, hedge), max(end - loop.time(), 0))
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                remaining = end - loop.time()
+                if isinstance(e, asyncio.TimeoutError) and remaining <= 0.01:
+                    self._count(self.deadlines, call)
+                    raise
+                # Full jitter: chờ ngẫu nhiên trong [0, backoff * 2^attempt] để các request không thử lại cùng lúc
+                pause = self._rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if attempt + 1 >= self.max_attempts or pause >= remaining:
+                    raise
+                self._count(self.retries, call)
+                await asyncio.sleep(pause)
+            else:
+                self.breaker.record_success()
+                return result
+        raise AssertionError("unreachable")
+
+    async def stream(self, call: str, request: Callable[[], Awaitable[Any]],
+                     deadline: Optional[float] = None) -> AsyncIterator[Any]:
+        """Open a streamed response through call() (never hedged) and yield its chunks.
+
+        The deadline covers the whole stream: each chunk is awaited only for
+        the time left, so a stalled upstream raises asyncio.TimeoutError
+        instead of hanging the reply.
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + (self.deadline if deadline is None else deadline)
+        response = await self.call(call, request, deadline=end - loop.time(), hedge=False)
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), max(end - loop.time(), 0))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                # Stream đứng giữa chừng cũng là dấu hiệu upstream không khỏe
+                self._count(self.deadlines, call)
+                self.breaker.record_failure()
+                raise
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        """Per call site counters, hedge thresholds and the breaker state"""
+        return {
+            "breaker": self.breaker.stats(),
+            "calls": dict(self.calls),
+            "hedges": dict(self.hedges),
+            "hedge_wins": dict(self.hedge_wins),
+            "retries": dict(self.retries),
+            "deadline_exceeded": dict(self.deadlines),
+            "rejected": dict(self.rejected),
+            "hedge_delay": {call: self.hedge_delay(call) for call in self._latency},
+        }
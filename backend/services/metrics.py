@@ -0,0 +1,218 @@
+import bisect
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Mốc histogram (giây), từ tra cứu cục bộ vài ms tới lời gọi LLM nhiều giây
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    # Cú pháp Prometheus: NaN, +Inf, -Inf (Python in ra nan/inf)
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def totals(self, label: str) -> Dict[str, float]:
+        """Values summed over every label except `label`"""
+        index = self.labels.index(label)
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for key, value in self._values.items():
+                totals[key[index]] = totals.get(key[index], 0.0) + value
+        return totals
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Mỗi nhãn: [số đếm theo bucket..., +Inf], tổng, số mẫu
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]], kind: str = "gauge"):
+        """A value read at scrape time from collect(), which yields (labels, value).
+
+        kind="counter" exposes monotonic totals kept elsewhere, e.g. cache hits.
+        """
+        super().__init__(name, help, labels)
+        self.collect = collect
+        self.kind = kind
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, self._key(labels))} {_format_value(value)}"
+            for labels, value in self.collect()
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Hold the service's metrics and render them in Prometheus text format"""
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str],
+              collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]], kind: str = "gauge") -> Gauge:
+        return self._register(Gauge(name, help, labels, collect, kind))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Stage timings of one request, reported as a Server-Timing header and a log line"""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans.append((name, seconds))
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1e3:.1f}" for name, seconds in self.spans)
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={seconds * 1e3:.1f}ms" for name, seconds in self.spans)
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace() -> Trace:
+    """Start collecting spans for the current request (task and the threads it hands work to)"""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Time a block into a histogram and into the current request's trace, if any"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add("-".join(labels.values()), elapsed)
@@ -0,0 +1,68 @@
+import collections
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Counter, List, Optional, Tuple
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        """Sample the stacks of all threads every `interval` seconds while running.
+
+        Output is in collapsed-stack format ("frame;frame;frame count"), which
+        flamegraph.pl and speedscope read directly.
+        """
+        self.interval = interval
+        self.stacks: Counter[str] = collections.Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.started is not None:
+            self.elapsed = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def top(self, limit: int = 10) -> List[Tuple[str, int]]:
+        """Most sampled leaf frames"""
+        leaves: Counter[str] = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def write(self, directory: str) -> str:
+        """Write the collapsed stacks to a new file in directory and return its path"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        return path
@@ -0,0 +1,123 @@
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from models.tool import Tool
+
+# Ước lượng thô ~4 ký tự mỗi token, đủ để giữ prompt trong ngân sách
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the token count of a text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text down to roughly max_tokens, marking the cut with an ellipsis"""
+    max_chars = max(max_tokens, 0) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - 1, 0)].rstrip() + "…"
+
+
+class CompiledPrompt(NamedTuple):
+    """A prompt split into its static, cacheable prefix and per-request suffix"""
+    prefix: str
+    suffix: str
+    prefix_tokens: int
+    suffix_tokens: int
+
+    @property
+    def text(self) -> str:
+        return self.prefix + self.suffix
+
+    @property
+    def tokens(self) -> int:
+        return self.prefix_tokens + self.suffix_tokens
+
+
+class PromptCompiler:
+    def __init__(self, template: str, token_budget: int = 2000,
+                 history_messages: int = 5, max_message_tokens: int = 200):
+        """Render template's static part once per tool registry and budget the rest.
+
+        template is formatted with a single {tools} field holding the tool
+        descriptions; history and query are appended per request.
+        """
+        self.template = template
+        self.token_budget = token_budget
+        self.history_messages = history_messages
+        self.max_message_tokens = max_message_tokens
+        self._prefixes: Dict[Tuple[Tuple[str, str], ...], Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_cached = 0
+        self.last_tokens_sent = 0
+        self.truncated = 0
+
+    def prefix(self, tools: Sequence[Tool]) -> Tuple[str, int]:
+        """Return the static prefix for a tool registry and its token estimate"""
+        key = tuple((tool.signature, tool.description) for tool in tools)
+        cached = self._prefixes.get(key)
+        if cached is None:
+            tools_desc = "\n".join(f"- {signature}: {description}" for signature, description in key)
+            text = self.template.format(tools=tools_desc)
+            cached = self._prefixes[key] = (text, estimate_tokens(text))
+        return cached
+
+    def _render_suffix(self, query: str, history: List[str]) -> str:
+        context_str = ""
+        if history:
+            context_str = "\nConversation history:\n" + "\n".join(history)
+        return f"\n{context_str}\n\nUser query: {query}\n"
+
+    def render(self, tools: Sequence[Tool], query: str,
+               context: Optional[List[dict]] = None) -> CompiledPrompt:
+        """Interpolate history and query after the static prefix, within the token budget"""
+        prefix, prefix_tokens = self.prefix(tools)
+        available = self.token_budget - prefix_tokens
+
+        history = [
+            f"{'User' if msg.get('isUser') else 'Chef'}: "
+            + truncate_to_tokens(msg.get('text', ''), self.max_message_tokens)
+            for msg in (context or [])[-self.history_messages:]
+        ]
+        suffix = self._render_suffix(query, history)
+        truncated = False
+        # Bỏ bớt tin nhắn cũ nhất cho đến khi vừa ngân sách
+        while history and estimate_tokens(suffix) > available:
+            history.pop(0)
+            suffix = self._render_suffix(query, history)
+            truncated = True
+        if estimate_tokens(suffix) > available:
+            overhead = estimate_tokens(self._render_suffix("", []))
+            suffix = self._render_suffix(truncate_to_tokens(query, available - overhead), [])
+            truncated = True
+
+        if truncated:
+            with self._lock:
+                self.truncated += 1
+        return CompiledPrompt(prefix, suffix, prefix_tokens, estimate_tokens(suffix))
+
+    def record(self, tokens_sent: int, tokens_cached: int = 0) -> None:
+        """Count the prompt tokens actually sent for one request"""
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += tokens_sent
+            self.tokens_cached += tokens_cached
+            self.last_tokens_sent = tokens_sent
+
+    def stats(self) -> Dict[str, float]:
+        """Return prompt token counters"""
+        return {
+            "requests": self.requests,
+            "tokens_sent": self.tokens_sent,
+            "tokens_sent_avg": self.tokens_sent / self.requests if self.requests else 0.0,
+            "tokens_sent_last": self.last_tokens_sent,
+            "tokens_cached": self.tokens_cached,
+            "truncated": self.truncated,
+            "token_budget": self.token_budget,
+            "prefixes": len(self._prefixes),
+        }
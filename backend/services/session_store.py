@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+def _message_size(message: dict) -> int:
+    """Approximate bytes held by one stored message"""
+    return sys.getsizeof(message) + sys.getsizeof(message["text"])
+
+
+class _Session:
+    __slots__ = ("messages", "last_access", "size")
+
+    def __init__(self, max_messages: int, now: float):
+        self.messages: Deque[dict] = deque(maxlen=max_messages)
+        self.last_access = now
+        self.size = sys.getsizeof(self.messages)
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 10000, ttl: float = 3600, max_turns: int = 5,
+                 clock: Callable[[], float] = time.monotonic):
+        """Keep the last max_turns turns per session, evicting idle and least recently used sessions"""
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self._clock = clock
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def new_session_id() -> str:
+        """Generate an id for a client that did not send one"""
+        return uuid.uuid4().hex
+
+    def _expire(self, now: float) -> None:
+        # Phiên ít dùng nhất nằm đầu OrderedDict nên chỉ cần quét từ đầu
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.ttl:
+                break
+            self._drop(session_id)
+            self.expirations += 1
+
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+
+    def append(self, session_id: str, is_user: bool, text: str) -> None:
+        """Append one message to a session, creating the session if needed"""
+        message = {"isUser": is_user, "text": text}
+        size = _message_size(message)
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = _Session(2 * self.max_turns, now)
+                self._sessions[session_id] = session
+                self._bytes += session.size
+                while len(self._sessions) > self.max_sessions:
+                    self._drop(next(iter(self._sessions)))
+                    self.evictions += 1
+
+            # Bộ đệm vòng: tin nhắn cũ nhất bị đẩy ra khi đầy
+            if len(session.messages) == session.messages.maxlen:
+                dropped = _message_size(session.messages[0])
+                session.size -= dropped
+                self._bytes -= dropped
+            session.messages.append(message)
+            session.size += size
+            self._bytes += size
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+
+    def history(self, session_id: str, limit: Optional[int] = None) -> List[dict]:
+        """Return the most recent messages of a session, oldest first"""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            messages = list(session.messages)
+        return messages[-limit:] if limit else messages
+
+    def clear(self, session_id: str) -> None:
+        """Forget one session"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return live-session and memory gauges"""
+        with self._lock:
+            self._expire(self._clock())
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "approx_bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_turns": self.max_turns,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SQLiteSessionStore:
+    def __init__(self, path: str, max_sessions: int = 10000, ttl: float = 3600, max_turns: int = 5,
+                 sweep_interval: float = 30, clock: Callable[[], float] = time.time):
+        """SessionStore with the same interface, kept in a SQLite file shared by worker processes.
+
+        WAL mode lets readers in other workers run while one writes. Nothing
+        is opened here: each process and thread opens its own connection
+        (and creates the tables) on first use, so no connection is carried
+        across fork. Calls block on disk and on other writers, so async
+        code should run them in a threadpool. Idle and surplus sessions are
+        swept at most every sweep_interval seconds rather than on every call.
+        """
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        self.evictions = 0
+        self.expirations = 0
+
+    new_session_id = staticmethod(SessionStore.new_session_id)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Kết nối SQLite không được dùng chung giữa các tiến trình sau fork: mở lười trong từng tiến trình
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_access REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "is_user INTEGER NOT NULL, text TEXT NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+            local.db, local.pid = db, os.getpid()
+        return local.db
+
+    def _sweep(self, db: sqlite3.Connection, now: float) -> None:
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        expired = db.execute("DELETE FROM sessions WHERE last_access < ?", (now - self.ttl,)).rowcount
+        surplus = db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+        if surplus > 0:
+            db.execute(
+                "DELETE FROM sessions WHERE session_id IN "
+                "(SELECT session_id FROM sessions ORDER BY last_access LIMIT ?)", (surplus,)
+            )
+            self.evictions += surplus
+        if expired or surplus > 0:
+            db.execute("DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM sessions)")
+        self.expirations += expired
+
+    def append(self, session_id: str, is_user: bool, text: str) -> None:
+        """Append one message to a session, creating the session if needed"""
+        db = self._connect()
+        now = self._clock()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now),
+            )
+            db.execute(
+                "INSERT INTO messages (session_id, is_user, text) VALUES (?, ?, ?)",
+                (session_id, int(is_user), text),
+            )
+            # Chỉ giữ 2 * max_turns tin nhắn mới nhất của phiên
+            db.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id <= ("
+                "SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (session_id, session_id, 2 * self.max_turns),
+            )
+            self._sweep(db, now)
+
+    def history(self, session_id: str, limit: Optional[int] = None) -> List[dict]:
+        """Return the most recent messages of a session, oldest first"""
+        db = self._connect()
+        now = self._clock()
+        row = db.execute("SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None or now - row[0] >= self.ttl:
+            return []
+        db.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+        rows = db.execute(
+            "SELECT is_user, text FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit or 2 * self.max_turns),
+        ).fetchall()
+        return [{"isUser": bool(is_user), "text": text} for is_user, text in reversed(rows)]
+
+    def clear(self, session_id: str) -> None:
+        """Forget one session"""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return live-session and storage gauges; evictions count this process's sweeps only"""
+        db = self._connect()
+        page_count = db.execute("PRAGMA page_count").fetchone()[0]
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": db.execute(
+                "SELECT COUNT(*) FROM sessions WHERE last_access >= ?", (self._clock() - self.ttl,)
+            ).fetchone()[0],
+            "approx_bytes": page_count * page_size,
+            "max_sessions": self.max_sessions,
+            "max_turns": self.max_turns,
+            "ttl": self.ttl,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
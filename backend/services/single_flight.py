@@ -0,0 +1,71 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        """Let concurrent callers with the same key share one in-flight call.
+
+        The first caller (leader) starts the call as a task; callers that
+        arrive while it runs (followers) await the same task. Each waiter has
+        its own timeout, errors reach every waiter, and the task is cancelled
+        once nobody is waiting for it any more.
+        """
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def _done(self, key: Hashable, flight: _Flight, task: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]],
+                 timeout: Optional[float] = None) -> T:
+        """Await call() for key, or the call already running for it"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(lambda task: self._done(key, flight, task))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Gỡ ngay để người gọi mới không nhận phải task đã hủy
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return leader/follower counters and the share of calls that were coalesced"""
+        total = self.leaders + self.followers
+        return {
+            "inflight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_ratio": self.followers / total if total else 0.0,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
@@ -0,0 +1,47 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+
+class StartupTimer:
+    def __init__(self, started: Optional[float] = None,
+                 clock: Callable[[], float] = time.perf_counter):
+        """Record how long each startup phase takes, in milliseconds"""
+        self._clock = clock
+        self.started = clock() if started is None else started
+        self._last = self.started
+        self.phases: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def mark(self, name: str) -> float:
+        """Close a sequential phase that started at the previous mark"""
+        now = self._clock()
+        with self._lock:
+            elapsed = self.phases[name] = (now - self._last) * 1e3
+            self._last = now
+        return elapsed
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase that runs outside the import sequence, such as a lazy load"""
+        start = self._clock()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = (self._clock() - start) * 1e3
+
+    def ready(self) -> float:
+        """Mark the end of startup and return its total duration"""
+        self.ready_ms = (self._clock() - self.started) * 1e3
+        return self.ready_ms
+
+    def stats(self) -> Dict[str, object]:
+        """Return phase durations and the time until the app was ready"""
+        with self._lock:
+            return {
+                "phases_ms": {name: round(ms, 1) for name, ms in self.phases.items()},
+                "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+            }
@@ -1,68 +1,219 @@
-import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Tuple
 import re
-from sklearn.preprocessing import MinMaxScaler
-import numpy as np
 import os
+import math
+import threading
+import time
+
+from tools.ingredient_index import IngredientIndex, ingredient_name
+from tools.name_matcher import NameMatcher
+from tools.nutrition import NutritionTable, parse_constraints
+from tools.quantities import QuantityTable, format_quantity
+from tools.recipe_catalog import NUTRIENTS, RecipeCatalog, RecipeRecord, file_checksum, format_nutrient
+from tools.recipe_index import RecipeIndex
+from tools.recommender import RecipeRecommender, ScoringWeights
+
+# Nhãn hiển thị của từng chất, giống nutrition_info
+NUTRIENT_LABELS = (('calories', 'Calories'), ('protein', 'Protein'), ('carbs', 'Carbohydrates'), ('fat', 'Chất béo'))
+
+class RecipeData(NamedTuple):
+    """One version of the catalogue together with every lookup structure built from it"""
+    catalog: RecipeCatalog
+    index: RecipeIndex
+    recommender: RecipeRecommender
+    ingredient_index: IngredientIndex
+    matcher: NameMatcher
+    quantities: QuantityTable
+    nutrition: NutritionTable
+    version: int
+
+    @classmethod
+    def build(cls, catalog: RecipeCatalog, recommender_weights: Optional[ScoringWeights] = None,
+              version: int = 1) -> "RecipeData":
+        return cls(
+            catalog=catalog,
+            # Xây chỉ mục tên món một lần để tra cứu O(1)
+            index=RecipeIndex(catalog),
+            # Các cột số dùng để chấm điểm gợi ý được giữ sẵn dưới dạng mảng NumPy
+            recommender=RecipeRecommender.from_catalog(catalog, recommender_weights),
+            # Chỉ mục ngược nguyên liệu -> món cho câu hỏi "có X, Y thì nấu gì"
+            ingredient_index=IngredientIndex(catalog),
+            # Chỉ mục trigram tên món để hiểu tên gõ sai hoặc thiếu chữ
+            matcher=NameMatcher(catalog),
+            # Định lượng nguyên liệu đã parse sẵn thành mảng để nhân số phần một lần
+            quantities=QuantityTable(catalog),
+            # Ma trận dinh dưỡng món x chất để cộng thực đơn và lọc theo điều kiện bằng mask
+            nutrition=NutritionTable.from_catalog(catalog),
+            version=version,
+        )
 
 class CookingTools:
-    def __init__(self):
+    def __init__(self, recommender_weights: Optional[ScoringWeights] = None,
+                 catalog: Optional[RecipeCatalog] = None):
         """Initialize cooking tools with recipe data"""
         # Sử dụng đường dẫn tương đối từ vị trí hiện tại của file
         current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.data_file = os.path.join(current_dir, 'data', 'recipes.csv')
+        self.recommender_weights = recommender_weights
+        self._file_stat = self._stat_data_file()
         
         try:
-            self.df = pd.read_csv(self.data_file)
-            print(f"✅ Loaded recipes database from {self.data_file}")
-            # Chuẩn hóa các giá trị số để tính toán độ tương đồng
-            self.scaler = MinMaxScaler()
-            if not self.df.empty:
-                self.df['normalized_time'] = self.scaler.fit_transform(
-                    self.df[['cook_time']].values
-                )
-                # Chuyển đổi độ khó thành số
-                difficulty_map = {'Dễ': 1, 'Trung bình': 2, 'Khó': 3}
-                self.df['difficulty_score'] = self.df['difficulty'].map(difficulty_map)
-                self.df['normalized_difficulty'] = self.scaler.fit_transform(
-                    self.df[['difficulty_score']].values
-                )
+            # Ưu tiên snapshot đã biên dịch sẵn, nếu thiếu hoặc cũ thì đọc CSV
+            catalog = catalog or RecipeCatalog.load(self.data_file)
+            print(f"✅ Loaded recipes database from {catalog.source}")
         except Exception as e:
             print(f"❌ Error loading recipes database: {str(e)}")
-            self.df = pd.DataFrame()
+            catalog = RecipeCatalog.empty()
+
+        # Mọi cấu trúc tra cứu nằm trong một RecipeData bất biến; reload() thay cả bộ bằng một phép gán
+        self.data = RecipeData.build(catalog, recommender_weights)
+        self.loaded_at = time.time()
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+        self.reload_failures = 0
+        self.last_reload_ms: Optional[float] = None
+
+    @property
+    def catalog(self) -> RecipeCatalog:
+        return self.data.catalog
+
+    @property
+    def index(self) -> RecipeIndex:
+        return self.data.index
+
+    @property
+    def recommender(self) -> RecipeRecommender:
+        return self.data.recommender
+
+    @property
+    def ingredient_index(self) -> IngredientIndex:
+        return self.data.ingredient_index
+
+    @property
+    def version(self) -> int:
+        return self.data.version
+
+    def _stat_data_file(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.data_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def data_changed(self) -> bool:
+        """Check whether recipes.csv differs from the loaded catalogue.
+
+        Only stats the file unless its mtime or size moved; then the checksum
+        decides, so touching the file without editing it does not rebuild.
+        The new stat is only remembered once the file is known to be loaded,
+        so a failed reload is retried on the next poll.
+        """
+        stat = self._stat_data_file()
+        if stat is None or stat == self._file_stat:
+            return False
+        if file_checksum(self.data_file) != self.catalog.checksum:
+            return True
+        self._file_stat = stat
+        return False
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the catalogue and its indexes from recipes.csv and swap them in.
+
+        Runs on the caller's thread and returns False when the file is
+        unchanged. Requests already running keep the RecipeData they started
+        with; new ones see the new version. On failure the old data stays.
+        """
+        with self._reload_lock:
+            if not force and not self.data_changed():
+                return False
+            start = time.perf_counter()
+            # Stat trước khi đọc: file đổi tiếp trong lúc nạp thì lần poll sau vẫn thấy
+            stat = self._stat_data_file()
+            try:
+                catalog = RecipeCatalog.load(self.data_file)
+                if not len(catalog):
+                    raise ValueError(f"{self.data_file} has no recipes")
+                data = RecipeData.build(catalog, self.recommender_weights, self.data.version + 1)
+            except Exception:
+                self.reload_failures += 1
+                raise
+            self.data = data
+            self._file_stat = stat
+            self.loaded_at = time.time()
+            self.reloads += 1
+            self.last_reload_ms = (time.perf_counter() - start) * 1e3
+            print(f"🔄 Reloaded recipes database v{data.version}: {len(catalog)} recipes in {self.last_reload_ms:.0f}ms")
+            return True
+
+    def reload_stats(self) -> Dict[str, Any]:
+        """Return the catalogue version and reload counters"""
+        data = self.data
+        return {
+            "version": data.version,
+            "recipes": len(data.catalog),
+            "checksum": data.catalog.checksum,
+            "source": data.catalog.source,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "last_reload_ms": self.last_reload_ms,
+        }
+
+    def find_recipe(self, name: str) -> Optional[RecipeRecord]:
+        """Look up a recipe by name, ignoring case, spacing and diacritics.
+
+        When there is no exact match, a close misspelling ("pho bo tai",
+        "buter chicken") resolves to its recipe if exactly one name is close.
+        """
+        data = self.data
+        position = self._locate(data, name)
+        return None if position is None else data.index.record(position)
+
+    def find_exact(self, name: str) -> Optional[RecipeRecord]:
+        """Look up a recipe by its exact name (ignoring case, spacing and diacritics), never fuzzily"""
+        return self.data.index.lookup(name)
+
+    @staticmethod
+    def _locate(data: RecipeData, name: str) -> Optional[int]:
+        position = data.index.position(name)
+        if position is None:
+            position = data.matcher.best(name)
+        return position
+
+    def suggestions(self, name: str) -> str:
+        """Câu gợi ý tối đa 3 món có tên gần giống, hoặc chuỗi rỗng"""
+        data = self.data
+        names = [data.index.record(match.position).recipe_name for match in data.matcher.search(name)]
+        if not names:
+            return ""
+        return f"\n\nCó phải bạn muốn tìm: {', '.join(names)}?"
         
     def recipe_finder(self, query: str) -> str:
         """Find recipes based on exact name match"""
-        if self.df.empty:
+        if not len(self.catalog):
             return "Xin lỗi, không thể tải dữ liệu công thức nấu ăn."
             
-        # Convert query to lowercase for case-insensitive search
-        query = query.lower()
+        # Tra cứu theo tên đã chuẩn hóa (không phân biệt hoa thường, dấu)
+        recipe = self.find_recipe(query)
         
-        # Search for exact matches in recipe_name
-        matches = self.df[
-            self.df['recipe_name'].str.lower() == query
-        ]
-        
-        if matches.empty:
-            return f"Xin lỗi, tôi không tìm thấy món {query} trong cơ sở dữ liệu của mình. Tôi chỉ có thể cung cấp thông tin về các món có trong danh sách."
+        if recipe is None:
+            return f"Xin lỗi, tôi không tìm thấy món {query} trong cơ sở dữ liệu của mình. Tôi chỉ có thể cung cấp thông tin về các món có trong danh sách." + self.suggestions(query)
             
         # Format the matching recipe
-        recipe = matches.iloc[0]
-        ingredients = recipe['ingredients'].replace(';', '\n- ')
-        instructions = recipe['instructions'].replace(';', '\n')
+        ingredients = '\n- '.join(recipe.ingredients)
+        instructions = '\n'.join(recipe.instructions)
         
         return (
-            f"Đây là công thức nấu món {recipe['recipe_name']}:\n\n" +
-            f"Phong cách: {recipe['cuisine']}\n" +
-            f"Độ khó: {recipe['difficulty']}\n" +
-            f"Thời gian chuẩn bị: {recipe['prep_time']} phút\n" +
-            f"Thời gian nấu: {recipe['cook_time']} phút\n" +
-            f"Phục vụ: {recipe['servings']} người\n\n" +
+            f"Đây là công thức nấu món {recipe.recipe_name}:\n\n" +
+            f"Phong cách: {recipe.cuisine}\n" +
+            f"Độ khó: {recipe.difficulty}\n" +
+            f"Thời gian chuẩn bị: {recipe.prep_time} phút\n" +
+            f"Thời gian nấu: {recipe.cook_time} phút\n" +
+            f"Phục vụ: {recipe.servings} người\n\n" +
             f"Nguyên liệu cần có:\n- {ingredients}\n\n" +
             "Các bước thực hiện:\n" +
             f"{instructions}\n\n" +
-            f"Mẹo: {recipe['tips']}"
+            f"Mẹo: {recipe.tips}"
         )
 
     def ingredient_substitute(self, ingredient: str) -> str:
@@ -88,31 +239,25 @@ class CookingTools:
 
     def portion_calculator(self, recipe_name: str, desired_servings: int) -> str:
         """Calculate ingredient portions for desired number of servings"""
+        data = self.data
         # Find the recipe
-        recipe = self.df[self.df['recipe_name'].str.lower() == recipe_name.lower()]
-        if recipe.empty:
-            return "Recipe not found."
-            
-        # Get original servings and ingredients
-        original_servings = recipe.iloc[0]['servings']
-        ingredients = recipe.iloc[0]['ingredients'].split(';')
-        
-        # Calculate multiplier
-        multiplier = desired_servings / original_servings
-        
-        # Adjust quantities
+        position = self._locate(data, recipe_name)
+        if position is None:
+            return "Recipe not found." + self.suggestions(recipe_name)
+        if desired_servings <= 0:
+            return "Số người ăn phải lớn hơn 0."
+
+        # Định lượng đã parse khi nạp dữ liệu: nhân cả món với hệ số trong một phép tính
+        recipe = data.index.record(position)
+        amounts = data.quantities.scale(position, desired_servings)
+        units = data.quantities.unit_names(position)
+
         adjusted_ingredients = []
-        for ingredient in ingredients:
-            # Try to find and adjust numeric quantities
-            match = re.search(r'(\d+\.?\d*)', ingredient)
-            if match:
-                original_qty = float(match.group(1))
-                new_qty = original_qty * multiplier
-                adjusted = ingredient.replace(match.group(1), str(round(new_qty, 1)))
-                adjusted_ingredients.append(adjusted)
-            else:
-                adjusted_ingredients.append(ingredient)
-        
+        for ingredient, amount, unit in zip(recipe.ingredients, amounts.tolist(), units):
+            quantity = format_quantity(amount, unit)
+            # Nguyên liệu không ghi định lượng giữ nguyên như trong công thức
+            adjusted_ingredients.append(f"{ingredient_name(ingredient)}:{quantity}" if quantity else ingredient)
+
         ingredients_text = ', '.join(adjusted_ingredients)
         return (
             f"Adjusted recipe for {desired_servings} servings" + "\n" +
@@ -120,62 +265,171 @@ class CookingTools:
             f"{ingredients_text}"
         )
 
+    def _parse_menu(self, data: RecipeData, menu: str,
+                    default_servings: Callable[[int], int]) -> Tuple[List[Tuple[int, str, int]], List[str]]:
+        """Split 'Phở Bò:10, Bún Bò Huế:20' into (position, name, servings) and unknown dish names.
+
+        A dish without ':N' gets default_servings(position). Raises ValueError
+        when a number of servings is not positive.
+        """
+        dishes = []
+        unknown = []
+        for entry in re.split(r'[,;\n]', menu):
+            name, _, servings = entry.rpartition(':')
+            if not name or not servings.strip().isdigit():
+                name, servings = entry, ''
+            if not name.strip():
+                continue
+            position = self._locate(data, name)
+            if position is None:
+                unknown.append(name.strip())
+                continue
+            recipe_name = data.catalog.recipe_names[position]
+            count = int(servings) if servings.strip() else default_servings(position)
+            if count <= 0:
+                raise ValueError(f"Số phần của món {recipe_name} phải lớn hơn 0.")
+            dishes.append((position, recipe_name, count))
+        return dishes, unknown
+
+    def shopping_list(self, menu: str) -> str:
+        """Danh sách đi chợ gộp cho thực đơn nhiều món, mỗi món một số phần"""
+        if not len(self.catalog):
+            return "Xin lỗi, không thể tải dữ liệu công thức nấu ăn."
+
+        # Thiếu số phần thì dùng số phần gốc của món
+        data = self.data
+        try:
+            dishes, unknown = self._parse_menu(data, menu, lambda position: int(data.catalog.servings[position]))
+        except ValueError as e:
+            return str(e)
+        if not dishes:
+            return f"Xin lỗi, tôi không tìm thấy món nào trong thực đơn: {menu}." + self.suggestions(menu)
+
+        items = data.quantities.shopping_list([(position, count) for position, _, count in dishes])
+        result = f"Danh sách đi chợ cho {len(dishes)} món ({sum(count for _, _, count in dishes)} phần):\n"
+        result += ''.join(f"- {name}: {count} phần\n" for _, name, count in dishes)
+        result += "\nCần mua:\n"
+        for item in items:
+            quantity = format_quantity(item.amount, item.unit, whole=True)
+            result += f"- {item.ingredient}: {quantity or 'tùy khẩu vị'}\n"
+        if unknown:
+            result += f"\nKhông tìm thấy món: {', '.join(unknown)}"
+        return result.rstrip()
+
     def cooking_timer(self, recipe_name: str) -> str:
         """Get timing information for a recipe"""
-        recipe = self.df[self.df['recipe_name'].str.lower() == recipe_name.lower()]
-        if recipe.empty:
-            return f"Xin lỗi, tôi không tìm thấy món {recipe_name} trong cơ sở dữ liệu của mình."
+        r = self.find_recipe(recipe_name)
+        if r is None:
+            return f"Xin lỗi, tôi không tìm thấy món {recipe_name} trong cơ sở dữ liệu của mình." + self.suggestions(recipe_name)
             
-        r = recipe.iloc[0]
-        instructions = r['instructions'].replace(';', '\n')
+        instructions = '\n'.join(r.instructions)
         
         return (
-            f"Thông tin thời gian nấu món {r['recipe_name']}:\n\n" +
-            f"Thời gian chuẩn bị: {r['prep_time']} phút\n" +
-            f"Thời gian nấu: {r['cook_time']} phút\n" +
-            f"Tổng thời gian: {r['prep_time'] + r['cook_time']} phút\n\n" +
+            f"Thông tin thời gian nấu món {r.recipe_name}:\n\n" +
+            f"Thời gian chuẩn bị: {r.prep_time} phút\n" +
+            f"Thời gian nấu: {r.cook_time} phút\n" +
+            f"Tổng thời gian: {r.prep_time + r.cook_time} phút\n\n" +
             "Các bước thực hiện:\n" +
             f"{instructions}"
         )
 
     def nutrition_info(self, recipe_name: str) -> str:
         """Get nutritional information for a recipe"""
-        recipe = self.df[self.df['recipe_name'].str.lower() == recipe_name.lower()]
-        if recipe.empty:
-            return f"Xin lỗi, tôi không tìm thấy món {recipe_name} trong cơ sở dữ liệu của mình."
+        r = self.find_recipe(recipe_name)
+        if r is None:
+            return f"Xin lỗi, tôi không tìm thấy món {recipe_name} trong cơ sở dữ liệu của mình." + self.suggestions(recipe_name)
             
-        r = recipe.iloc[0]
-        nutrition = dict(item.split(':') for item in r['nutrition'].split(';'))
+        # Giá trị dinh dưỡng đã được parse thành số khi nạp dữ liệu
+        nutrition = {name: format_nutrient(name, value) for name, value in r.nutrition.items()}
         
         return (
-            f"Thông tin dinh dưỡng cho món {r['recipe_name']} (cho mỗi phần ăn):\n\n" +
+            f"Thông tin dinh dưỡng cho món {r.recipe_name} (cho mỗi phần ăn):\n\n" +
             f"Calories: {nutrition['calories']}\n" +
             f"Protein: {nutrition['protein']}\n" +
             f"Carbohydrates: {nutrition['carbs']}\n" +
             f"Chất béo: {nutrition['fat']}\n\n" +
-            f"Món ăn này đủ cho {r['servings']} người ăn."
+            f"Món ăn này đủ cho {r.servings} người ăn."
         )
 
+    @staticmethod
+    def _nutrition_line(values: List[float]) -> str:
+        nutrition = dict(zip(NUTRIENTS, values))
+        return ", ".join(
+            f"{label}: {format_nutrient(name, round(nutrition[name], 1))}"
+            for name, label in NUTRIENT_LABELS if not math.isnan(nutrition[name])
+        ) or "chưa có dữ liệu"
+
+    def meal_nutrition(self, menu: str) -> str:
+        """Tổng dinh dưỡng của một thực đơn nhiều món, mỗi món một số phần ăn"""
+        if not len(self.catalog):
+            return "Xin lỗi, không thể tải dữ liệu công thức nấu ăn."
+
+        # Thiếu số phần thì tính 1 phần ăn
+        data = self.data
+        try:
+            dishes, unknown = self._parse_menu(data, menu, lambda position: 1)
+        except ValueError as e:
+            return str(e)
+        if not dishes:
+            return f"Xin lỗi, tôi không tìm thấy món nào trong thực đơn: {menu}." + self.suggestions(menu)
+
+        rows, totals = data.nutrition.meal([(position, count) for position, _, count in dishes])
+        result = f"Dinh dưỡng của thực đơn {len(dishes)} món ({sum(count for _, _, count in dishes)} phần ăn):\n\n"
+        rows = rows.tolist()
+        for (_, name, count), row in zip(dishes, rows):
+            result += f"- {name} x{count}: {self._nutrition_line(row)}\n"
+        result += f"\nTổng cộng: {self._nutrition_line(totals.tolist())}"
+        missing = [name for (_, name, _), row in zip(dishes, rows) if any(map(math.isnan, row))]
+        if missing:
+            result += f"\n(Thiếu một phần dữ liệu dinh dưỡng của: {', '.join(missing)})"
+        if unknown:
+            result += f"\n\nKhông tìm thấy món: {', '.join(unknown)}"
+        return result
+
+    def nutrition_search(self, constraints: str) -> str:
+        """Tìm món theo điều kiện dinh dưỡng mỗi phần ăn, vd. 'calories<500, protein>=30'"""
+        if not len(self.catalog):
+            return "Xin lỗi, không thể tải dữ liệu công thức nấu ăn."
+
+        data = self.data
+        try:
+            ranges, options = parse_constraints(constraints)
+            if not ranges:
+                raise ValueError("chưa có điều kiện nào")
+            positions, total = data.nutrition.search(ranges, int(options.get('k', 5)), options.get('sort'))
+        except ValueError as e:
+            return (f"Xin lỗi, {str(e)}.\n\nVui lòng nhập theo định dạng: calories<500, protein>=30 "
+                    "(có thể thêm carbs, fat, k:N, sort:protein)")
+
+        if not len(positions):
+            return f"Xin lỗi, tôi không tìm thấy món nào thỏa điều kiện: {constraints}."
+        result = f"Có {total} món thỏa điều kiện ({constraints}), đây là {len(positions)} món phù hợp nhất (mỗi phần ăn):\n\n"
+        for position, values in zip(positions.tolist(), data.nutrition.matrix[positions].tolist()):
+            result += f"🍳 {data.catalog.recipe_names[position]}\n   - {self._nutrition_line(values)}\n"
+        return result.rstrip()
+
     def list_ingredients(self, recipe_name: str) -> str:
         """Liệt kê nguyên liệu cần thiết cho một món ăn"""
-        if self.df.empty:
+        if not len(self.catalog):
             return "Xin lỗi, không thể tải dữ liệu công thức nấu ăn."
             
-        # Tìm món ăn trong database bằng tên chính xác
-        recipe = self.df[self.df['recipe_name'].str.lower() == recipe_name.lower()]
+        # Tìm món ăn qua chỉ mục tên đã chuẩn hóa
+        recipe = self.find_recipe(recipe_name)
         
-        if recipe.empty:
-            return f"Xin lỗi, tôi không tìm thấy món {recipe_name} trong cơ sở dữ liệu của mình."
+        if recipe is None:
+            return f"Xin lỗi, tôi không tìm thấy món {recipe_name} trong cơ sở dữ liệu của mình." + self.suggestions(recipe_name)
         
         # Lấy và định dạng thông tin nguyên liệu
-        ingredients = recipe.iloc[0]['ingredients'].replace(';', '\n- ')
-        return f"Để nấu món {recipe_name}, bạn cần những nguyên liệu sau:\n- {ingredients}"
+        ingredients = '\n- '.join(recipe.ingredients)
+        return f"Để nấu món {recipe.recipe_name}, bạn cần những nguyên liệu sau:\n- {ingredients}"
 
     def recipe_recommender(self, preferences: str) -> str:
         """Gợi ý món ăn dựa trên sở thích của người dùng"""
-        if self.df.empty:
+        if not len(self.catalog):
             return "Xin lỗi, không thể tải dữ liệu công thức nấu ăn."
 
+        # Dùng một phiên bản dữ liệu cho cả lượt, kể cả khi reload() chạy giữa chừng
+        data = self.data
         try:
             # Parse preferences from input string
             prefs = {}
@@ -183,49 +437,67 @@ class CookingTools:
                 key, value = pref.split(':')
                 prefs[key.strip().lower()] = value.strip().lower()
 
-            # Tính điểm phù hợp cho mỗi công thức
-            scores = []
-            for _, recipe in self.df.iterrows():
-                score = 0
-
-                # Đánh giá thời gian nấu
-                if 'time' in prefs:
-                    desired_time = float(prefs['time'])
-                    normalized_desired_time = self.scaler.transform(np.array([[desired_time]]))[0][0]
-                    time_diff = abs(recipe['normalized_time'] - normalized_desired_time)
-                    score += (1 - time_diff)  # Càng gần càng tốt
-
-                # Đánh giá độ khó
-                if 'difficulty' in prefs:
-                    difficulty_map = {'dễ': 1, 'trung bình': 2, 'khó': 3}
-                    if prefs['difficulty'] in difficulty_map:
-                        if recipe['difficulty'].lower() == prefs['difficulty']:
-                            score += 1
-
-                # Đánh giá số người ăn
-                if 'servings' in prefs:
-                    desired_servings = int(prefs['servings'])
-                    if recipe['servings'] == desired_servings:
-                        score += 1
-                    elif abs(recipe['servings'] - desired_servings) <= 2:
-                        score += 0.5
-
-                scores.append(score)
-
-            # Lấy 5 món có điểm cao nhất
-            self.df['match_score'] = scores
-            top_matches = self.df.nlargest(5, 'match_score')
+            k = int(prefs.get('k', 5))
+            if k <= 0:
+                raise ValueError("k phải là số nguyên dương")
+
+            # Chấm điểm toàn bộ công thức trong một lượt vector hóa, không ghi vào dữ liệu dùng chung
+            top_positions = data.recommender.top_k(
+                k=k,
+                time=float(prefs['time']) if 'time' in prefs else None,
+                difficulty=prefs.get('difficulty'),
+                servings=int(prefs['servings']) if 'servings' in prefs else None,
+            )
+
+            if not len(top_positions):
+                return f"Xin lỗi, tôi không tìm thấy món nào phù hợp với yêu cầu: {preferences}."
 
             # Format kết quả
-            result = "Dựa trên yêu cầu của bạn, đây là 5 món ăn phù hợp nhất:\n\n"
-            for idx, recipe in top_matches.iterrows():
-                result += f"🍳 {recipe['recipe_name']}\n"
-                result += f"   - Độ khó: {recipe['difficulty']}\n"
-                result += f"   - Thời gian nấu: {recipe['cook_time']} phút\n"
-                result += f"   - Số người ăn: {recipe['servings']} người\n"
-                result += f"   - Phong cách: {recipe['cuisine']}\n\n"
+            result = f"Dựa trên yêu cầu của bạn, đây là {len(top_positions)} món ăn phù hợp nhất:\n\n"
+            for position in top_positions:
+                recipe = data.index.record(position)
+                result += f"🍳 {recipe.recipe_name}\n"
+                result += f"   - Độ khó: {recipe.difficulty}\n"
+                result += f"   - Thời gian nấu: {recipe.cook_time} phút\n"
+                result += f"   - Số người ăn: {recipe.servings} người\n"
+                result += f"   - Phong cách: {recipe.cuisine}\n\n"
 
             return result
 
         except Exception as e:
-            return f"Xin lỗi, có lỗi xảy ra khi tìm món ăn phù hợp: {str(e)}\n\nVui lòng nhập theo định dạng: time:30, difficulty:dễ, servings:4" 
\ No newline at end of file
+            return f"Xin lỗi, có lỗi xảy ra khi tìm món ăn phù hợp: {str(e)}\n\nVui lòng nhập theo định dạng: time:30, difficulty:dễ, servings:4" 
+
+    def pantry_recipes(self, pantry: str) -> str:
+        """Gợi ý món nấu được từ những nguyên liệu người dùng đang có"""
+        if not len(self.catalog):
+            return "Xin lỗi, không thể tải dữ liệu công thức nấu ăn."
+
+        # Nguyên liệu cách nhau bởi dấu phẩy/chấm phẩy/"và", tùy chọn k:N ở cuối
+        k = 5
+        items = []
+        for item in re.split(r'[,;\n]|\s+(?:và|and)\s+', pantry):
+            key, _, value = item.partition(':')
+            if key.strip().lower() == 'k':
+                if not (value.strip().isdigit() and int(value) > 0):
+                    return ("Xin lỗi, có lỗi xảy ra khi tìm món ăn phù hợp: k phải là số nguyên dương\n\n"
+                            "Vui lòng nhập theo định dạng: trứng, cà chua, hành lá, k:5")
+                k = int(value)
+            elif item.strip():
+                items.append(item.strip())
+
+        data = self.data
+        matches, unknown = data.ingredient_index.match_pantry(items, k)
+        if not matches:
+            return f"Xin lỗi, tôi không tìm thấy món nào nấu được với: {', '.join(items) or pantry}."
+
+        result = f"Với những nguyên liệu bạn có, đây là {len(matches)} món phù hợp nhất:\n\n"
+        for match in matches:
+            recipe = data.index.record(match.position)
+            result += f"🍳 {recipe.recipe_name} (có {match.matched}/{match.total} nguyên liệu)\n"
+            if match.missing:
+                result += f"   - Còn thiếu: {', '.join(match.missing)}\n"
+            result += f"   - Thời gian nấu: {recipe.cook_time} phút\n\n"
+        if unknown:
+            result += f"Không tìm thấy nguyên liệu: {', '.join(unknown)}"
+        return result.rstrip()
+
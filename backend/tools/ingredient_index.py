@@ -0,0 +1,154 @@
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+
+import numpy as np
+
+from tools.recipe_catalog import RecipeCatalog, fold_text, normalize_name
+
+
+def ingredient_name(item: str) -> str:
+    """Return the display name of a 'name:qty' ingredient item"""
+    return item.partition(':')[0].strip()
+
+
+# Giữ dấu: bỏ dấu thì "cá" và "cà" trùng nhau, "cá" sẽ khớp nhầm "cà chua"
+_fold = fold_text
+
+
+def _phrase_matches(term: str, words: Dict[str, Set[str]], keys: Dict[str, str]) -> List[str]:
+    # Ứng viên chứa đủ các từ, sau đó kiểm tra các từ đứng liền nhau
+    candidates = set.intersection(*(words.get(word, set()) for word in term.split()))
+    padded = f" {term} "
+    return sorted(name for name in candidates if padded in f" {keys[name]} ")
+
+
+class PantryMatch(NamedTuple):
+    """A recipe ranked by how many of its ingredients the pantry covers"""
+    position: int
+    matched: int
+    total: int
+    coverage: float
+    missing: Tuple[str, ...]
+
+
+class IngredientIndex:
+    def __init__(self, catalog: RecipeCatalog):
+        """Build an inverted index from normalized ingredient names to recipe positions"""
+        self.catalog = catalog
+        postings: Dict[str, List[int]] = {}
+        counts = np.zeros(len(catalog), dtype=np.int32)
+        # Tên nguyên liệu lặp lại rất nhiều giữa các món nên chỉ chuẩn hóa mỗi tên một lần
+        normalized: Dict[str, str] = {}
+        for position, items in enumerate(catalog.ingredients):
+            names = set()
+            for item in items:
+                raw = ingredient_name(item)
+                name = normalized.get(raw)
+                if name is None:
+                    name = normalized[raw] = _fold(raw)
+                if name:
+                    names.add(name)
+            for name in names:
+                postings.setdefault(name, []).append(position)
+            counts[position] = len(names)
+
+        # Danh sách món của mỗi nguyên liệu là mảng int32 đã sắp xếp
+        self.postings: Dict[str, np.ndarray] = {
+            name: np.array(positions, dtype=np.int32) for name, positions in postings.items()
+        }
+        self.ingredient_counts = counts
+        # Nhân với nghịch đảo nhanh hơn chia ở mỗi truy vấn
+        self._inverse_counts = 1.0 / np.maximum(counts, 1)
+        for array in (self.ingredient_counts, self._inverse_counts):
+            array.flags.writeable = False
+        self._normalized = normalized
+        # Từ -> các tên nguyên liệu chứa từ đó, để "hành" khớp "hành lá", "hành tây";
+        # thêm bản không dấu cho người dùng gõ không dấu
+        self._names = {name: name for name in self.postings}
+        self._plain_names = {name: normalize_name(name) for name in self.postings}
+        self._plain: Dict[str, Set[str]] = {}
+        self._words: Dict[str, Set[str]] = {}
+        self._plain_words: Dict[str, Set[str]] = {}
+        for name, plain in self._plain_names.items():
+            self._plain.setdefault(plain, set()).add(name)
+            for word in name.split():
+                self._words.setdefault(word, set()).add(name)
+            for word in plain.split():
+                self._plain_words.setdefault(word, set()).add(name)
+
+    def resolve(self, term: str) -> List[str]:
+        """Return the ingredient names a user term refers to.
+
+        An exact name wins; otherwise every name containing the term as a
+        whole-word phrase matches ('hành' -> 'hành lá', 'hành tây'), never a
+        substring of another word. Terms typed without diacritics are matched
+        against the names with diacritics stripped.
+        """
+        term = _fold(term)
+        if not term:
+            return []
+        if term in self.postings:
+            return [term]
+        plain = normalize_name(term)
+        if plain != term:
+            return _phrase_matches(term, self._words, self._names)
+        if plain in self._plain:
+            return sorted(self._plain[plain])
+        return _phrase_matches(plain, self._plain_words, self._plain_names)
+
+    def recipes_with(self, term: str) -> np.ndarray:
+        """Return the sorted positions of recipes using an ingredient"""
+        arrays = [self.postings[name] for name in self.resolve(term)]
+        if not arrays:
+            return np.empty(0, dtype=np.int32)
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.unique(np.concatenate(arrays))
+
+    def match_pantry(self, pantry: Iterable[str], k: int = 5) -> Tuple[List[PantryMatch], List[str]]:
+        """Rank recipes by the share of their ingredients found in the pantry.
+
+        Returns the k best matches (coverage, then matched count, then
+        catalogue order) and the pantry terms that match no ingredient.
+        """
+        owned: Set[str] = set()
+        unknown = []
+        for term in pantry:
+            names = self.resolve(term)
+            if names:
+                owned.update(names)
+            elif term.strip():
+                unknown.append(term.strip())
+
+        k = min(max(int(k), 0), len(self.catalog))
+        if not owned or k == 0:
+            return [], unknown
+
+        # Đếm số nguyên liệu đã có của từng món bằng một lần bincount trên các posting
+        matched = np.bincount(
+            np.concatenate([self.postings[name] for name in owned]),
+            minlength=len(self.catalog),
+        )
+        # Chỉ chấm điểm các món có ít nhất một nguyên liệu đã có
+        candidates = np.flatnonzero(matched)
+        coverage = matched[candidates] * self._inverse_counts[candidates]
+        if candidates.size > k:
+            threshold = np.partition(coverage, candidates.size - k)[candidates.size - k]
+            # Giữ cả các món bằng điểm ở biên rồi sắp xếp lại để kết quả ổn định
+            keep = coverage >= threshold
+            candidates, coverage = candidates[keep], coverage[keep]
+        order = np.lexsort((candidates, -matched[candidates], -coverage))[:k]
+
+        matches = []
+        for position, score in zip(candidates[order], coverage[order]):
+            missing = tuple(
+                ingredient_name(item) for item in self.catalog.ingredients[position]
+                if self._normalized.get(ingredient_name(item)) not in owned
+            )
+            matches.append(PantryMatch(
+                int(position), int(matched[position]), int(self.ingredient_counts[position]),
+                float(score), missing,
+            ))
+        return matches, unknown
+
+    def __len__(self) -> int:
+        return len(self.postings)
@@ -0,0 +1,77 @@
+from typing import Dict, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+from tools.recipe_catalog import RecipeCatalog, normalize_name
+
+# Điểm tối thiểu để tự chọn món gần đúng, và khoảng cách tối thiểu với món đứng thứ hai
+MATCH_THRESHOLD = 0.6
+MATCH_MARGIN = 0.1
+# Gợi ý dưới mức này thường chỉ trùng vài chữ cái, không đáng đưa ra
+SUGGESTION_THRESHOLD = 0.3
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a normalized name, padded so word starts weigh more"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameMatch(NamedTuple):
+    position: int
+    score: float
+
+
+class NameMatcher:
+    def __init__(self, catalog: RecipeCatalog):
+        """Trigram index over normalized recipe names for typo-tolerant lookup.
+
+        Scores are Dice coefficients of the trigram sets, so "pho bo tai" and
+        "phobo" both land near "Phở Bò". Names that normalize identically are
+        indexed once, at their first position, like RecipeIndex.
+        """
+        first: Dict[str, int] = {}
+        for position, name in enumerate(catalog.normalized_names):
+            first.setdefault(name, position)
+        self._positions = np.fromiter(first.values(), dtype=np.int64, count=len(first))
+
+        postings: Dict[str, List[int]] = {}
+        sizes = []
+        for slot, name in enumerate(first):
+            grams = trigrams(name)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(slot)
+        self._sizes = np.array(sizes, dtype=np.float64)
+        self.postings = {gram: np.array(slots, dtype=np.int32) for gram, slots in postings.items()}
+
+    def search(self, query: str, k: int = 3, min_score: float = SUGGESTION_THRESHOLD) -> List[NameMatch]:
+        """Return up to k names closest to the query, best first"""
+        grams = trigrams(normalize_name(query))
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits or k <= 0:
+            return []
+
+        # Đếm trigram chung chỉ trên các tên có ít nhất một trigram trùng
+        shared = np.bincount(np.concatenate(hits), minlength=len(self._sizes))
+        slots = np.flatnonzero(shared)
+        scores = 2.0 * shared[slots] / (len(grams) + self._sizes[slots])
+        keep = scores >= min_score
+        slots, scores = slots[keep], scores[keep]
+        if len(slots) > k:
+            # argpartition chọn tùy ý giữa các điểm bằng nhau ở biên: giữ hết rồi phân định theo thứ tự catalogue
+            threshold = np.partition(-scores, k - 1)[k - 1]
+            keep = -scores <= threshold
+            slots, scores = slots[keep], scores[keep]
+        order = np.lexsort((slots, -scores))[:k]
+        return [NameMatch(int(self._positions[slots[i]]), float(scores[i])) for i in order]
+
+    def best(self, query: str, threshold: float = MATCH_THRESHOLD,
+             margin: float = MATCH_MARGIN) -> Optional[int]:
+        """Position of the single close match, or None when nothing is close or the query is ambiguous"""
+        matches = self.search(query, k=2)
+        if not matches or matches[0].score < threshold:
+            return None
+        if len(matches) > 1 and matches[0].score - matches[1].score < margin:
+            return None
+        return matches[0].position
@@ -0,0 +1,134 @@
+import re
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.recipe_catalog import NUTRIENTS, RecipeCatalog, normalize_name
+
+# Tên chất dinh dưỡng người dùng/LLM hay viết (đã bỏ dấu) -> cột trong NUTRIENTS
+NUTRIENT_ALIASES = {
+    'calories': 'calories', 'calorie': 'calories', 'calo': 'calories', 'kcal': 'calories', 'cal': 'calories',
+    'protein': 'protein', 'dam': 'protein', 'chat dam': 'protein',
+    'carbs': 'carbs', 'carb': 'carbs', 'carbohydrate': 'carbs', 'carbohydrates': 'carbs', 'tinh bot': 'carbs',
+    'fat': 'fat', 'beo': 'fat', 'chat beo': 'fat',
+}
+_CONSTRAINT = re.compile(
+    r'^(?P<name>[a-z ]+?)\s*(?:(?P<op><=|>=|<|>|=)\s*(?P<value>\d+(?:\.\d+)?)'
+    r'|:\s*(?P<low>\d+(?:\.\d+)?)\s*-\s*(?P<high>\d+(?:\.\d+)?))\s*[a-z]*$'
+)
+
+NutrientRanges = Dict[str, Tuple[float, float]]
+
+
+def parse_constraints(text: str) -> Tuple[NutrientRanges, Dict[str, str]]:
+    """Parse 'calories<500, protein>=30' into inclusive (low, high) ranges per nutrient.
+
+    Also accepts 'carbs:40-60' and Vietnamese names ('đạm', 'chất béo').
+    Items that are not constraints, such as 'k:10', are returned as options.
+    Raises ValueError on an unknown nutrient, a malformed item or a non-positive k.
+    """
+    ranges: NutrientRanges = {}
+    options: Dict[str, str] = {}
+    for item in re.split(r'[,;\n]|\s+(?:và|and)\s+', text):
+        item = normalize_name(item)
+        if not item:
+            continue
+        match = _CONSTRAINT.match(item)
+        if match is None or match.group('name').strip() not in NUTRIENT_ALIASES:
+            key, _, value = item.partition(':')
+            if key.strip() in ('k', 'sort') and value.strip():
+                if key.strip() == 'k' and not (value.strip().isdigit() and int(value) > 0):
+                    raise ValueError(f"k phải là số nguyên dương: {item!r}")
+                options[key.strip()] = value.strip()
+                continue
+            raise ValueError(f"không hiểu điều kiện {item!r}")
+        nutrient = NUTRIENT_ALIASES[match.group('name').strip()]
+        low, high = ranges.get(nutrient, (-np.inf, np.inf))
+        if match.group('op') is None:
+            low, high = max(low, float(match.group('low'))), min(high, float(match.group('high')))
+        else:
+            op, value = match.group('op'), float(match.group('value'))
+            # Điều kiện chặt đổi thành khoảng đóng bằng số thực liền kề
+            if op in ('<', '<='):
+                high = min(high, value if op == '<=' else float(np.nextafter(value, -np.inf)))
+            if op in ('>', '>='):
+                low = max(low, value if op == '>=' else float(np.nextafter(value, np.inf)))
+            if op == '=':
+                low, high = max(low, value), min(high, value)
+        ranges[nutrient] = (low, high)
+    return ranges, options
+
+
+class NutritionTable:
+    def __init__(self, nutrition: np.ndarray):
+        """Per-serving nutrition as a read-only recipes x NUTRIENTS matrix (nan when missing)"""
+        self.matrix = np.asarray(nutrition, dtype=np.float64).reshape(-1, len(NUTRIENTS))
+        self.matrix.flags.writeable = False
+        self._columns = {name: i for i, name in enumerate(NUTRIENTS)}
+
+    @classmethod
+    def from_catalog(cls, catalog: RecipeCatalog) -> "NutritionTable":
+        # Cột nutrition đã được parse thành số khi nạp dữ liệu (hoặc map thẳng từ snapshot)
+        return cls(catalog.nutrition)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def meal(self, menu: Sequence[Tuple[int, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Nutrition of each (recipe position, servings) in a menu and the column totals.
+
+        Missing values count as 0 in the totals; check rows for nan.
+        """
+        if not len(menu):
+            empty = np.empty((0, len(NUTRIENTS)))
+            return empty, np.zeros(len(NUTRIENTS))
+        positions = np.array([position for position, _ in menu], dtype=np.int64)
+        servings = np.array([servings for _, servings in menu], dtype=np.float64)
+        rows = self.matrix[positions] * servings[:, None]
+        return rows, np.nansum(rows, axis=0)
+
+    def mask(self, ranges: NutrientRanges) -> np.ndarray:
+        """Boolean mask of recipes whose per-serving values fall inside every range"""
+        keep = np.ones(len(self), dtype=bool)
+        for nutrient, (low, high) in ranges.items():
+            column = self.matrix[:, self._columns[nutrient]]
+            # So sánh với nan luôn False: món thiếu dữ liệu bị loại khi có điều kiện trên chất đó
+            if low > -np.inf:
+                keep &= column >= low
+            if high < np.inf:
+                keep &= column <= high
+        return keep
+
+    def search(self, ranges: NutrientRanges, k: int = 5,
+               sort: Optional[str] = None) -> Tuple[np.ndarray, int]:
+        """Return up to k matching positions, best first, and the number of matches.
+
+        Sorted by `sort` ('protein' = most first, '-calories' = fewest first);
+        by default the most of the first nutrient with a lower bound, else
+        the least of the first one with an upper bound. Ties keep catalogue order.
+        """
+        matches = np.flatnonzero(self.mask(ranges))
+        total = int(matches.size)
+        k = min(max(int(k), 0), total)
+        if k == 0:
+            return np.empty(0, dtype=np.intp), total
+
+        if sort is None:
+            lower = [name for name, (low, _) in ranges.items() if low > -np.inf]
+            sort = lower[0] if lower else (f"-{next(iter(ranges))}" if ranges else None)
+        if sort is None:
+            return matches[:k], total
+        descending = not sort.startswith('-')
+        nutrient = NUTRIENT_ALIASES.get(normalize_name(sort.lstrip('-+')))
+        if nutrient is None:
+            raise ValueError(f"không sắp xếp được theo {sort!r}")
+
+        values = self.matrix[matches, self._columns[nutrient]]
+        keys = np.nan_to_num(-values if descending else values, nan=np.inf)
+        if matches.size > k:
+            # Chỉ sắp xếp phần đầu: giữ các món bằng điểm ở biên để thứ tự ổn định
+            threshold = np.partition(keys, k - 1)[k - 1]
+            keep = keys <= threshold
+            matches, keys = matches[keep], keys[keep]
+        order = np.lexsort((matches, keys))[:k]
+        return matches[order], total
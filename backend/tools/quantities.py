@@ -0,0 +1,168 @@
+import math
+import re
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from tools.ingredient_index import _fold
+from tools.recipe_catalog import RecipeCatalog
+
+# Đơn vị gặp trong dữ liệu -> (đơn vị chuẩn, hệ số); đơn vị không có ở đây giữ nguyên với hệ số 1
+UNIT_ALIASES: Dict[str, Tuple[str, float]] = {
+    'g': ('g', 1.0), 'gr': ('g', 1.0), 'gram': ('g', 1.0), 'kg': ('g', 1000.0),
+    'ml': ('ml', 1.0), 'l': ('ml', 1000.0), 'lít': ('ml', 1000.0),
+    'quả': ('quả', 1.0), 'trái': ('quả', 1.0),
+    'clove': ('cloves', 1.0),
+}
+# Đơn vị đo được hiển thị liền số và đổi lên đơn vị lớn khi đủ 1000
+LARGE_UNITS = {'g': 'kg', 'ml': 'l'}
+MEASURED_UNITS = {'g', 'kg', 'ml', 'l'}
+_QUANTITY = re.compile(r'^(\d+(?:[.,]\d+)?)(?:\s*/\s*(\d+))?\s*(.*)$')
+
+
+def parse_quantity(text: str) -> Tuple[float, str]:
+    """Parse '2kg', '3 trái', '1/2 muỗng' into (amount in the canonical unit, canonical unit).
+
+    Returns (nan, '') when the text has no leading number.
+    """
+    match = _QUANTITY.match(text.strip())
+    if not match:
+        return math.nan, ''
+    amount = float(match.group(1).replace(',', '.'))
+    if match.group(2):
+        amount /= float(match.group(2)) or 1.0
+    unit = _fold(match.group(3))
+    unit, factor = UNIT_ALIASES.get(unit, (unit, 1.0))
+    return amount * factor, unit
+
+
+def _number(value: float) -> str:
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+
+def format_quantity(amount: float, unit: str, whole: bool = False) -> str:
+    """Format an amount in a canonical unit, e.g. 2500 g -> '2.5kg', 3 quả -> '3 quả'.
+
+    whole=True rounds counted units (quả, củ, tép...) up, for a shopping list.
+    """
+    if math.isnan(amount):
+        return ''
+    if unit in LARGE_UNITS and amount >= 1000:
+        amount, unit = amount / 1000, LARGE_UNITS[unit]
+    if whole and unit not in MEASURED_UNITS:
+        # Không mua được 2.3 quả: làm tròn lên, bỏ sai số dấu phẩy động
+        amount = math.ceil(round(amount, 6))
+    if not unit:
+        return _number(amount)
+    return f"{_number(amount)}{unit}" if unit in MEASURED_UNITS else f"{_number(amount)} {unit}"
+
+
+class ShoppingItem(NamedTuple):
+    """One line of a shopping list: total amount of an ingredient in one unit"""
+    ingredient: str
+    amount: float  # nan khi công thức không ghi định lượng
+    unit: str
+    dishes: int
+
+
+class QuantityTable:
+    def __init__(self, catalog: RecipeCatalog):
+        """Parse every 'name:qty' ingredient once into (recipe, ingredient, quantity, unit) arrays.
+
+        Rows of a recipe are contiguous and in the order of its ingredient
+        list; offsets[p]:offsets[p + 1] are the rows of recipe p. Quantities
+        are in the canonical unit (g, ml, quả...), nan when not given.
+        """
+        self.names: List[str] = []
+        self.units: List[str] = ['']
+        name_ids: Dict[str, int] = {}
+        unit_ids: Dict[str, int] = {'': 0}
+        # Định lượng lặp lại rất nhiều ("200g", "2 quả") nên mỗi chuỗi chỉ parse một lần
+        parsed: Dict[str, Tuple[float, int]] = {}
+        ingredients: List[int] = []
+        quantities: List[float] = []
+        units: List[int] = []
+        counts = np.zeros(len(catalog), dtype=np.int64)
+        for position, items in enumerate(catalog.ingredients):
+            for item in items:
+                raw, _, amount = item.partition(':')
+                raw = raw.strip()
+                key = _fold(raw)
+                if not key:
+                    continue
+                ingredient = name_ids.get(key)
+                if ingredient is None:
+                    ingredient = name_ids[key] = len(self.names)
+                    self.names.append(raw)
+                quantity = parsed.get(amount)
+                if quantity is None:
+                    value, unit = parse_quantity(amount)
+                    if unit not in unit_ids:
+                        unit_ids[unit] = len(self.units)
+                        self.units.append(unit)
+                    quantity = parsed[amount] = (value, unit_ids[unit])
+                ingredients.append(ingredient)
+                quantities.append(quantity[0])
+                units.append(quantity[1])
+                counts[position] += 1
+
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.recipe = np.repeat(np.arange(len(catalog), dtype=np.int32), counts)
+        self.ingredient = np.array(ingredients, dtype=np.int32)
+        self.quantity = np.array(quantities, dtype=np.float64)
+        self.unit = np.array(units, dtype=np.int16)
+        # Số phần gốc của từng món; món ghi 0 phần coi như 1 để không chia cho 0
+        self.servings = np.maximum(np.asarray(catalog.servings, dtype=np.float64), 1.0)
+        for array in (self.offsets, self.recipe, self.ingredient, self.quantity, self.unit, self.servings):
+            array.flags.writeable = False
+
+    def rows(self, position: int) -> slice:
+        return slice(int(self.offsets[position]), int(self.offsets[position + 1]))
+
+    def scale(self, position: int, servings: float) -> np.ndarray:
+        """Quantities of one recipe's ingredients for a number of servings, in list order"""
+        return self.quantity[self.rows(position)] * (servings / self.servings[position])
+
+    def unit_names(self, position: int) -> List[str]:
+        return [self.units[unit] for unit in self.unit[self.rows(position)].tolist()]
+
+    def shopping_list(self, menu: Sequence[Tuple[int, float]]) -> List[ShoppingItem]:
+        """Total ingredients for a menu of (recipe position, servings), merged by ingredient and unit.
+
+        All rows of the menu are gathered, scaled and summed with array
+        operations, so the cost does not grow with Python loops per dish.
+        The same dish may appear more than once; its servings add up.
+        """
+        if not len(menu):
+            return []
+        positions = np.array([position for position, _ in menu], dtype=np.int64)
+        factors = np.array([servings for _, servings in menu], dtype=np.float64) / self.servings[positions]
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        # Gộp các đoạn [start, end) của từng món thành một mảng chỉ số dòng
+        shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        rows = np.arange(int(lengths.sum()), dtype=np.int64) + shifts
+        amounts = self.quantity[rows] * np.repeat(factors, lengths)
+
+        keys = self.ingredient[rows].astype(np.int64) * len(self.units) + self.unit[rows]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        known = ~np.isnan(amounts)
+        totals = np.bincount(inverse, weights=np.where(known, amounts, 0.0), minlength=len(unique))
+        quantified = np.bincount(inverse, weights=known, minlength=len(unique))
+        dishes = np.bincount(inverse, minlength=len(unique))
+
+        items = [
+            ShoppingItem(
+                self.names[key // len(self.units)],
+                total if has_amount else math.nan,
+                self.units[key % len(self.units)],
+                count,
+            )
+            for key, total, has_amount, count in zip(
+                unique.tolist(), totals.tolist(), (quantified > 0).tolist(), dishes.tolist())
+        ]
+        items.sort(key=lambda item: (_fold(item.ingredient), item.unit))
+        return items
+
+    def __len__(self) -> int:
+        return len(self.quantity)
@@ -0,0 +1,383 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import unicodedata
+from collections import abc
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+NUTRIENT_UNITS = {'calories': '', 'protein': 'g', 'carbs': 'g', 'fat': 'g'}
+
+# Độ khó trong dữ liệu là tiếng Anh, người dùng thường gõ tiếng Việt
+DIFFICULTY_LEVELS = {
+    'de': 1, 'easy': 1, '1': 1,
+    'trung binh': 2, 'medium': 2, '2': 2,
+    'kho': 3, 'hard': 3, '3': 3,
+}
+
+SNAPSHOT_MAGIC = b'RCPSNAP\x01'
+SNAPSHOT_VERSION = 1
+_ALIGNMENT = 64
+_NUTRIENT_AMOUNT = re.compile(r'([a-z_]+)\s*:\s*(\d+(?:\.\d+)?)')
+# Khối dấu kết hợp U+0300-U+036F chứa toàn bộ dấu thanh và dấu phụ tiếng Việt sau NFD
+_COMBINING_MARKS = dict.fromkeys(range(0x0300, 0x0370))
+
+
+def normalize_name(text: str) -> str:
+    """Normalize a dish name: lowercase, strip Vietnamese diacritics, collapse spaces"""
+    # 'đ' không tách dấu được bằng NFD nên phải thay thủ công
+    decomposed = unicodedata.normalize('NFD', str(text).lower().replace('đ', 'd'))
+    return ' '.join(decomposed.translate(_COMBINING_MARKS).split())
+
+
+def fold_text(text: str) -> str:
+    """Lowercase and collapse spaces but keep diacritics ('cá' and 'cà' stay apart); for cache keys"""
+    return ' '.join(unicodedata.normalize('NFC', str(text)).lower().split())
+
+
+@lru_cache(maxsize=64)
+def difficulty_level(label: str) -> int:
+    """Map a difficulty label (Vietnamese, English or 1-3) to a level, 0 if unknown"""
+    return DIFFICULTY_LEVELS.get(normalize_name(label), 0)
+
+
+def parse_nutrition(text: str) -> List[float]:
+    """Parse 'calories:450;protein:35g;...' into values ordered like NUTRIENTS"""
+    values = dict(_NUTRIENT_AMOUNT.findall(str(text)))
+    return [float(values.get(name, 'nan')) for name in NUTRIENTS]
+
+
+def format_nutrient(name: str, value: float) -> str:
+    """Format a nutrient amount with its unit, e.g. '35g'; 'không rõ' when it is missing (nan)"""
+    if math.isnan(value):
+        return 'không rõ'
+    return f"{value:g}{NUTRIENT_UNITS.get(name, '')}"
+
+
+def file_checksum(path: str) -> str:
+    """SHA-256 of a file, used to detect a stale snapshot"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_snapshot_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + '.snapshot'
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or stale"""
+
+
+class RecipeRecord(NamedTuple):
+    """Lightweight, read-only view of one recipe row"""
+    recipe_name: str
+    cuisine: str
+    difficulty: str
+    prep_time: int
+    cook_time: int
+    servings: int
+    ingredients: Tuple[str, ...]
+    instructions: Tuple[str, ...]
+    nutrition: Dict[str, float]
+    tips: str
+
+
+class _StringColumn(abc.Sequence):
+    """Strings decoded on access from a UTF-8 blob and an offsets array"""
+
+    def __init__(self, data: memoryview, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        i %= len(self)
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        data, bounds = self._data, self._offsets.tolist()
+        for start, end in zip(bounds, bounds[1:]):
+            yield str(data[start:end], 'utf-8')
+
+
+class _ListColumn(abc.Sequence):
+    """Per-recipe tuples of strings, stored flattened with two offset arrays"""
+
+    def __init__(self, items: _StringColumn, list_offsets: np.ndarray):
+        self._items = items
+        self._list_offsets = list_offsets
+
+    def __len__(self) -> int:
+        return len(self._list_offsets) - 1
+
+    def __getitem__(self, i: int) -> Tuple[str, ...]:
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        i %= len(self)
+        return tuple(self._items[j] for j in range(self._list_offsets[i], self._list_offsets[i + 1]))
+
+
+class RecipeCatalog:
+    TEXT_COLUMNS = ('recipe_name', 'cuisine', 'difficulty', 'tips', 'normalized_name')
+    LIST_COLUMNS = ('ingredients', 'instructions')
+    NUMBER_COLUMNS = ('prep_time', 'cook_time', 'servings', 'difficulty_level')
+
+    def __init__(self, columns: Mapping[str, Any], source: str = '', checksum: Optional[str] = None):
+        """Column-oriented, read-only recipe data shared by the tools and services"""
+        self.recipe_names: Sequence[str] = columns['recipe_name']
+        self.cuisines: Sequence[str] = columns['cuisine']
+        self.difficulties: Sequence[str] = columns['difficulty']
+        self.tips: Sequence[str] = columns['tips']
+        self.normalized_names: Sequence[str] = columns['normalized_name']
+        self.ingredients: Sequence[Tuple[str, ...]] = columns['ingredients']
+        self.instructions: Sequence[Tuple[str, ...]] = columns['instructions']
+        self.prep_times: np.ndarray = columns['prep_time']
+        self.cook_times: np.ndarray = columns['cook_time']
+        self.servings: np.ndarray = columns['servings']
+        self.difficulty_levels: np.ndarray = columns['difficulty_level']
+        self.nutrition: np.ndarray = columns['nutrition']
+        self.source = source
+        self.checksum = checksum
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]], source: str = '',
+                  checksum: Optional[str] = None) -> "RecipeCatalog":
+        """Build a catalogue from CSV-shaped rows, pre-splitting and parsing every column"""
+        columns: Dict[str, list] = {name: [] for name in
+                                    cls.TEXT_COLUMNS + cls.LIST_COLUMNS + cls.NUMBER_COLUMNS + ('nutrition',)}
+        for row in rows:
+            for name in ('recipe_name', 'cuisine', 'difficulty', 'tips'):
+                columns[name].append(str(row[name]))
+            columns['normalized_name'].append(normalize_name(row['recipe_name']))
+            for name in cls.LIST_COLUMNS:
+                columns[name].append(tuple(map(str.strip, str(row[name]).split(';'))))
+            for name in ('prep_time', 'cook_time', 'servings'):
+                columns[name].append(int(row[name]))
+            columns['difficulty_level'].append(difficulty_level(row['difficulty']))
+            columns['nutrition'].append(parse_nutrition(row['nutrition']))
+
+        for name in ('prep_time', 'cook_time', 'servings'):
+            columns[name] = np.array(columns[name], dtype=np.int32)
+        columns['difficulty_level'] = np.array(columns['difficulty_level'], dtype=np.int8)
+        columns['nutrition'] = np.array(columns['nutrition'], dtype=np.float64).reshape(-1, len(NUTRIENTS))
+        return cls(columns, source, checksum)
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "RecipeCatalog":
+        """Parse recipes.csv"""
+        with open(csv_path, encoding='utf-8', newline='') as f:
+            return cls.from_rows(csv.DictReader(f), source=csv_path, checksum=file_checksum(csv_path))
+
+    @classmethod
+    def from_dataframe(cls, df) -> "RecipeCatalog":
+        """Build a catalogue from a pandas DataFrame with the recipes.csv columns"""
+        return cls.from_rows(df.to_dict('records'), source='dataframe')
+
+    @classmethod
+    def empty(cls) -> "RecipeCatalog":
+        return cls.from_rows([], source='empty')
+
+    @classmethod
+    def from_snapshot(cls, snapshot_path: str, expected_checksum: Optional[str] = None) -> "RecipeCatalog":
+        """Memory-map a snapshot; arrays and strings are read in place without copying"""
+        try:
+            with open(snapshot_path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"cannot open {snapshot_path}: {e}")
+
+        error = None
+        try:
+            header, columns = cls._map_snapshot(buffer, expected_checksum)
+        except SnapshotError as e:
+            error = str(e)
+        except (struct.error, ValueError, KeyError, TypeError, IndexError, AttributeError) as e:
+            # File bị cắt cụt/hỏng: json.JSONDecodeError và UnicodeDecodeError cũng là ValueError
+            error = f"corrupt snapshot: {e!r}"
+        if error is not None:
+            # Ra khỏi except thì traceback và các view trỏ vào mmap đã được giải phóng, đóng được mmap
+            buffer.close()
+            raise SnapshotError(error)
+
+        catalog = cls(columns, source=snapshot_path, checksum=header.get('checksum'))
+        catalog._buffer = buffer  # giữ mmap sống cùng catalog
+        return catalog
+
+    @classmethod
+    def _map_snapshot(cls, buffer: mmap.mmap, expected_checksum: Optional[str]) -> Tuple[dict, Dict[str, Any]]:
+        """Decode the header and map every array, checking each one lies inside the file"""
+        if buffer[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise SnapshotError("not a recipe snapshot")
+        (header_size,) = struct.unpack_from('<I', buffer, len(SNAPSHOT_MAGIC))
+        header_start = len(SNAPSHOT_MAGIC) + 4
+        if header_start + header_size > len(buffer):
+            raise SnapshotError("snapshot header is truncated")
+        header = json.loads(bytes(buffer[header_start:header_start + header_size]))
+        if header.get('version') != SNAPSHOT_VERSION or tuple(header.get('nutrients', ())) != NUTRIENTS:
+            raise SnapshotError("snapshot format version mismatch")
+        if expected_checksum is not None and header.get('checksum') != expected_checksum:
+            raise SnapshotError("snapshot is stale (recipes.csv changed)")
+
+        base = _align(header_start + header_size)
+        view = memoryview(buffer)
+        arrays: Dict[str, Any] = {}
+        for name, spec in header['arrays'].items():
+            start = base + int(spec['offset'])
+            if spec['dtype'] == 'bytes':
+                size = int(spec['shape'][0])
+            else:
+                dtype = np.dtype(spec['dtype'])
+                count = int(np.prod(spec['shape']))
+                size = count * dtype.itemsize
+            if spec['offset'] < 0 or size < 0 or start + size > len(buffer):
+                raise SnapshotError(f"array {name} lies outside the snapshot (truncated file?)")
+            if spec['dtype'] == 'bytes':
+                arrays[name] = view[start:start + size]
+            else:
+                arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=start).reshape(spec['shape'])
+
+        count = int(header['count'])
+        columns: Dict[str, Any] = {}
+        for name in cls.TEXT_COLUMNS + cls.LIST_COLUMNS:
+            # Chỉ kiểm tra hai đầu của offsets: đủ bắt file cắt cụt mà không phải quét cả mảng
+            data, offsets = arrays[f'{name}.data'], arrays[f'{name}.offsets']
+            if offsets.ndim != 1 or len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != len(data):
+                raise SnapshotError(f"column {name} has inconsistent offsets")
+            columns[name] = _StringColumn(data, offsets)
+        for name in cls.LIST_COLUMNS:
+            lists = arrays[f'{name}.lists']
+            if len(lists) != count + 1 or lists[0] != 0 or lists[-1] != len(columns[name]):
+                raise SnapshotError(f"column {name} has inconsistent list offsets")
+            columns[name] = _ListColumn(columns[name], lists)
+        for name in cls.NUMBER_COLUMNS + ('nutrition',):
+            columns[name] = arrays[name]
+        for name, column in columns.items():
+            if len(column) != count:
+                raise SnapshotError(f"column {name} has {len(column)} rows, expected {count}")
+        return header, columns
+
+    @classmethod
+    def load(cls, csv_path: str, snapshot_path: Optional[str] = None) -> "RecipeCatalog":
+        """Load the snapshot next to csv_path when it is fresh, else parse the CSV"""
+        snapshot_path = snapshot_path or default_snapshot_path(csv_path)
+        if os.path.exists(snapshot_path):
+            checksum = file_checksum(csv_path) if os.path.exists(csv_path) else None
+            try:
+                return cls.from_snapshot(snapshot_path, expected_checksum=checksum)
+            except SnapshotError as e:
+                print(f"⚠️ Ignoring recipe snapshot {snapshot_path}: {str(e)}")
+        return cls.from_csv(csv_path)
+
+    def write_snapshot(self, snapshot_path: str) -> None:
+        """Write the catalogue as a snapshot file (atomically replaced)"""
+        arrays: Dict[str, Any] = {}
+        for name in self.TEXT_COLUMNS:
+            arrays[f'{name}.data'], arrays[f'{name}.offsets'] = _encode_strings(getattr(self, _ATTRIBUTES[name]))
+        for name in self.LIST_COLUMNS:
+            lists = getattr(self, name)
+            flat = [item for items in lists for item in items]
+            arrays[f'{name}.data'], arrays[f'{name}.offsets'] = _encode_strings(flat)
+            arrays[f'{name}.lists'] = np.concatenate(
+                [[0], np.cumsum([len(items) for items in lists], dtype=np.int64)]
+            ).astype(np.int64)
+        for name in self.NUMBER_COLUMNS:
+            arrays[name] = np.ascontiguousarray(getattr(self, _ATTRIBUTES[name]))
+        arrays['nutrition'] = np.ascontiguousarray(self.nutrition, dtype=np.float64)
+
+        specs: Dict[str, dict] = {}
+        offset = 0
+        for name, value in arrays.items():
+            offset = _align(offset)
+            if isinstance(value, bytes):
+                specs[name] = {'dtype': 'bytes', 'shape': [len(value)], 'offset': offset}
+                offset += len(value)
+            else:
+                specs[name] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'offset': offset}
+                offset += value.nbytes
+
+        header = json.dumps({
+            'version': SNAPSHOT_VERSION,
+            'checksum': self.checksum,
+            'count': len(self),
+            'nutrients': list(NUTRIENTS),
+            'arrays': specs,
+        }).encode('utf-8')
+        base = _align(len(SNAPSHOT_MAGIC) + 4 + len(header))
+
+        tmp_path = snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC + struct.pack('<I', len(header)) + header)
+            for name, value in arrays.items():
+                f.seek(base + specs[name]['offset'])
+                f.write(value if isinstance(value, bytes) else value.tobytes())
+        os.replace(tmp_path, snapshot_path)
+
+    def record(self, position: int) -> RecipeRecord:
+        """Assemble the recipe at a row position"""
+        return RecipeRecord(
+            self.recipe_names[position],
+            self.cuisines[position],
+            self.difficulties[position],
+            int(self.prep_times[position]),
+            int(self.cook_times[position]),
+            int(self.servings[position]),
+            self.ingredients[position],
+            self.instructions[position],
+            dict(zip(NUTRIENTS, self.nutrition[position].tolist())),
+            self.tips[position],
+        )
+
+    def __len__(self) -> int:
+        return len(self.prep_times)
+
+
+_ATTRIBUTES = {
+    'recipe_name': 'recipe_names', 'cuisine': 'cuisines', 'difficulty': 'difficulties',
+    'tips': 'tips', 'normalized_name': 'normalized_names',
+    'prep_time': 'prep_times', 'cook_time': 'cook_times', 'servings': 'servings',
+    'difficulty_level': 'difficulty_levels',
+}
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _encode_strings(values: Iterable[str]) -> Tuple[bytes, np.ndarray]:
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return b''.join(encoded), offsets
+
+
+def build_snapshot(csv_path: str, snapshot_path: Optional[str] = None) -> str:
+    """Compile recipes.csv into a snapshot file and return its path"""
+    snapshot_path = snapshot_path or default_snapshot_path(csv_path)
+    RecipeCatalog.from_csv(csv_path).write_snapshot(snapshot_path)
+    return snapshot_path
+
+
+if __name__ == '__main__':
+    default_csv = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'recipes.csv')
+    parser = argparse.ArgumentParser(description="Compile recipes.csv into a memory-mappable snapshot")
+    parser.add_argument('--csv', default=default_csv)
+    parser.add_argument('--out', default=None, help='snapshot path (default: next to the CSV)')
+    args = parser.parse_args()
+    path = build_snapshot(args.csv, args.out)
+    print(f"✅ Wrote recipe snapshot {path} ({os.path.getsize(path)} bytes)")
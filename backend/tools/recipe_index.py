@@ -0,0 +1,37 @@
+from typing import Dict, Iterator, Optional
+
+from tools.recipe_catalog import RecipeCatalog, RecipeRecord, normalize_name
+
+
+class RecipeIndex:
+    def __init__(self, catalog: RecipeCatalog):
+        """Build a hash index from normalized recipe names to row positions"""
+        self.catalog = catalog
+        self._positions: Dict[str, int] = {}
+        for position, name in enumerate(catalog.normalized_names):
+            # Giữ bản ghi đầu tiên khi trùng tên, giống hành vi iloc[0] trước đây
+            self._positions.setdefault(name, position)
+
+    def position(self, name: str) -> Optional[int]:
+        """Return the row position of a recipe, or None if it is unknown"""
+        return self._positions.get(normalize_name(name))
+
+    def record(self, position: int) -> RecipeRecord:
+        """Return the recipe record stored at a row position"""
+        return self.catalog.record(position)
+
+    def lookup(self, name: str) -> Optional[RecipeRecord]:
+        """Return the recipe record for a name in O(1), or None if it is unknown"""
+        position = self.position(name)
+        if position is None:
+            return None
+        return self.catalog.record(position)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_name(name) in self._positions
+
+    def __len__(self) -> int:
+        return len(self.catalog)
+
+    def __iter__(self) -> Iterator[RecipeRecord]:
+        return (self.catalog.record(position) for position in range(len(self.catalog)))
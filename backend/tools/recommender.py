@@ -0,0 +1,89 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from tools.recipe_catalog import RecipeCatalog, difficulty_level
+
+
+class ScoringWeights(NamedTuple):
+    """Weights of each preference in the match score"""
+    time: float = 1.0
+    difficulty: float = 1.0
+    servings: float = 1.0
+    servings_near: float = 0.5
+    servings_tolerance: int = 2
+
+
+class RecipeRecommender:
+    def __init__(self, cook_times: np.ndarray, difficulties: np.ndarray,
+                 servings: np.ndarray, weights: Optional[ScoringWeights] = None):
+        """Keep the scoring columns as read-only NumPy arrays"""
+        self.cook_times = np.asarray(cook_times, dtype=np.float64)
+        self.difficulties = np.asarray(difficulties, dtype=np.int8)
+        self.servings = np.asarray(servings, dtype=np.int32)
+        self.weights = weights or ScoringWeights()
+
+        # Chuẩn hóa min-max thời gian nấu một lần khi khởi tạo
+        if self.cook_times.size:
+            self._time_min = float(self.cook_times.min())
+            time_range = float(self.cook_times.max()) - self._time_min
+        else:
+            self._time_min, time_range = 0.0, 0.0
+        self._time_range = time_range or 1.0
+        self.normalized_times = (self.cook_times - self._time_min) / self._time_range
+
+        for array in (self.cook_times, self.difficulties, self.servings, self.normalized_times):
+            array.flags.writeable = False
+
+    @classmethod
+    def from_catalog(cls, catalog: RecipeCatalog,
+                     weights: Optional[ScoringWeights] = None) -> "RecipeRecommender":
+        """Build the scoring engine over a catalogue's numeric columns"""
+        return cls(catalog.cook_times, catalog.difficulty_levels, catalog.servings, weights)
+
+    def __len__(self) -> int:
+        return self.cook_times.size
+
+    def scores(self, time: Optional[float] = None, difficulty: Optional[str] = None,
+               servings: Optional[int] = None,
+               weights: Optional[ScoringWeights] = None) -> np.ndarray:
+        """Score every recipe against the preferences in one vectorized pass"""
+        weights = weights or self.weights
+        scores = np.zeros(len(self), dtype=np.float64)
+
+        if time is not None:
+            # Càng gần thời gian mong muốn càng tốt
+            desired = (float(time) - self._time_min) / self._time_range
+            scores += weights.time * (1.0 - np.abs(self.normalized_times - desired))
+
+        if difficulty is not None:
+            level = difficulty_level(difficulty)
+            if level:
+                scores += weights.difficulty * (self.difficulties == level)
+
+        if servings is not None:
+            gap = np.abs(self.servings - int(servings))
+            scores += np.where(
+                gap == 0, weights.servings,
+                np.where(gap <= weights.servings_tolerance, weights.servings_near, 0.0)
+            )
+
+        return scores
+
+    def top_k(self, k: int = 5, **preferences) -> np.ndarray:
+        """Return row positions of the k best matches, best first.
+
+        Ties keep catalogue order, like DataFrame.nlargest(keep='first').
+        """
+        scores = self.scores(**preferences)
+        k = min(max(int(k), 0), scores.size)
+        if k == 0:
+            return np.empty(0, dtype=np.intp)
+
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        threshold = scores[candidates].min()
+        # argpartition chọn ngẫu nhiên giữa các điểm bằng nhau ở biên, nên lấy lại theo thứ tự
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:k - above.size]
+        picked = np.concatenate([above, ties])
+        return picked[np.lexsort((picked, -scores[picked]))]
@@ -18,6 +18,7 @@ const ChatUI = () => {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [sessionId, setSessionId] = useState(null);
   const messagesEndRef = useRef(null);
 
   const scrollToBottom = () => {
@@ -93,9 +94,11 @@ const ChatUI = () => {
 
     try {
       const response = await axios.post(`${API_URL}/chat`, {
-        message: userMessage
+        message: userMessage,
+        session_id: sessionId
       });
 
+      setSessionId(response.data.session_id);
       setMessages(prev => [...prev, { text: response.data.reply, isUser: false }]);
     } catch (error) {
       console.error('Error:', error);